@@ -1,12 +1,14 @@
-import numpy as np
-import networkx as nx
 import math
 import random
 
-# Set seed for reproducibility
+from lazy_imports import lazy_import
+
+# NumPy and NetworkX are only loaded once a graph is built or the RNGs are seeded
+np = lazy_import("numpy")
+nx = lazy_import("networkx")
+
+# Seed for reproducibility, applied by seed_rngs() rather than at import time
 RANDOM_SEED = 42  # You can change this value if needed
-random.seed(RANDOM_SEED)
-np.random.seed(RANDOM_SEED)
 
 # Constants for Dynamic Time Simulation
 Q_LIMIT = 100  # Maximum number of queued events allowed
@@ -48,6 +50,17 @@ def initialize():
     time_next_event[2] = 1.0e30  # Large value indicating no departure initially
 
 
+def seed_rngs(seed=RANDOM_SEED):
+    """
+    Seed the global `random` and `np.random` generators used throughout the simulation.
+
+    Parameters:
+    seed (int): Seed applied to both generators.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+
+
 def expon(mean):
     """Generate an exponentially distributed random variable."""
     return -mean * math.log(random.random())  # Uses the inverse transform method
@@ -135,6 +148,8 @@ def initialize_simulation(quantum_grid_size, dynamic_params):
 
 
 if __name__ == "__main__":
+    seed_rngs()
+
     # Example initialization parameters
     quantum_grid_size = (3, 3)  # Define a 3x3 quantum network grid
     dynamic_params = {
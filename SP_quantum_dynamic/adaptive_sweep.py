@@ -0,0 +1,178 @@
+import math
+import multiprocessing
+
+from blocking_estimator import wilson_interval
+from Initialisation import RANDOM_SEED
+from result_cache import DEFAULT_CACHE_PATH, cached_run, init_pool_worker
+from simulation_NEW_1 import calculate_blocking_rate
+from sweep_pipeline import SWEEP_PARAMETERS, _record_key, default_sweeps, load_dataset, save_dataset
+
+
+def _key(record):
+    """Identity of an adaptive point: the dataset key plus the seed (records of compute_sweeps have none)."""
+    return _record_key(record) + (record.get("seed"),)
+
+
+def _coordinate(sweep, value, fixed_interarrival, fixed_service):
+    """Position of a sweep value on the plotted axis: p, or the log of the traffic load."""
+    if sweep == "probability":
+        return value
+    if sweep == "interarrival":
+        return math.log(fixed_service / value)
+    return math.log(value / fixed_interarrival)
+
+
+def _midpoint(sweep, a, b):
+    """Value half-way between a and b on the plotted axis (geometric mean on the log-load axes)."""
+    return (a + b) / 2 if sweep == "probability" else math.sqrt(a * b)
+
+
+def interval_score(a, b, span, z=1.96):
+    """
+    Refinement priority of the interval between two evaluated points.
+
+    The change of the blocking rate across the interval (large at the knee of the curve) plus the width of the
+    endpoints' Wilson intervals, weighted by the interval's share of the axis so that noisy but flat regions
+    are refined a few times, not indefinitely.
+
+    Parameters:
+    a, b (dict): Points with "x", "total_requests" and "successful_requests".
+    span (float): Length of the swept axis.
+    """
+    uncertainty = 0.0
+    for point in (a, b):
+        lower, upper = wilson_interval(point["total_requests"] - point["successful_requests"],
+                                       point["total_requests"], z)
+        uncertainty += (upper - lower) / 2
+    change = abs(a["blocking_rate"] - b["blocking_rate"])
+    return change + uncertainty * abs(b["x"] - a["x"]) / span
+
+
+def adaptive_sweeps(dataset_path, graph_size=(6, 6), request_values=(1000, 10000, 100000),
+                    fixed_interarrival=5.0, fixed_service=3.0, fixed_probability=0.5, sweeps=None,
+                    initial_points=5, budget=2000000, min_spacing=None, tolerance=0.01, processes=None,
+                    cache_path=DEFAULT_CACHE_PATH, seed=RANDOM_SEED):
+    """
+    Adaptive alternative to compute_sweeps: start every curve on a coarse grid and keep bisecting the intervals
+    where the blocking rate changes fastest or is least certain (see interval_score) until the compute budget
+    is spent.
+
+    Each round the highest-scoring intervals over all curves are bisected and their midpoints simulated in
+    parallel on a process pool. Every run goes through the ResultCache, and points already in the dataset are
+    reused as they are, so repeating or extending a sweep only pays for new points. Only records of the same
+    operating point (graph size, the fixed parameters not being swept) and seed are reused. Records are written
+    to the dataset in the compute_sweeps format plus their seed, so render_report plots them unchanged.
+
+    Parameters:
+    dataset_path (str): JSON dataset the records are stored in.
+    graph_size, request_values, fixed_interarrival, fixed_service, fixed_probability: as for compute_sweeps.
+    sweeps (dict): {sweep name: values}; only min and max of the values are used (the swept range),
+                   defaults to default_sweeps().
+    initial_points (int): Points of the initial grid of every curve.
+    budget (int): Total number of simulated requests (cache hits are free); the initial grid is always run.
+    min_spacing (float): Intervals narrower than this on the plotted axis are not split, defaults to 1/64 of it.
+    tolerance (float): Intervals scoring below this are not split.
+    processes (int): Pool size, defaults to the number of CPUs.
+    cache_path (str): ResultCache file shared by the workers.
+    seed (int): Seed of every run (part of the cache key).
+
+    Returns:
+    dict: spent (simulated requests), points (new records), cached (cache hits), rounds.
+    """
+    if sweeps is None:
+        sweeps = default_sweeps()
+    fixed = {"mean_interarrival": float(fixed_interarrival), "mean_service": float(fixed_service),
+             "entanglement_prob": float(fixed_probability)}
+
+    records = load_dataset(dataset_path)
+    done = {_key(r): r for r in records}
+
+    curves = {}  # (sweep, max_requests) -> {"points": [...], "span": ..., "min_spacing": ...}
+    pending = []
+    for sweep, values in sweeps.items():
+        low, high = float(min(values)), float(max(values))
+        x_low = _coordinate(sweep, low, fixed_interarrival, fixed_service)
+        x_high = _coordinate(sweep, high, fixed_interarrival, fixed_service)
+        span = abs(x_high - x_low) or 1.0
+        for max_requests in request_values:
+            curve = {"points": [], "span": span, "min_spacing": min_spacing or span / 64}
+            curves[(sweep, int(max_requests))] = curve
+            # earlier results of this curve seed the grid
+            for record in records:
+                same_point = all(round(record[k], 9) == round(v, 9) for k, v in fixed.items()
+                                 if k != SWEEP_PARAMETERS[sweep])
+                if record["sweep"] == sweep and record["max_requests"] == int(max_requests) and \
+                        list(record["graph_size"]) == list(graph_size) and same_point and record.get("seed") == seed:
+                    value = record[SWEEP_PARAMETERS[sweep]]
+                    if low <= value <= high:
+                        curve["points"].append(dict(record, x=_coordinate(sweep, value, fixed_interarrival,
+                                                                          fixed_service)))
+            steps = [i / (initial_points - 1) for i in range(initial_points)]
+            if sweep == "probability":
+                grid = [low + (high - low) * step for step in steps]
+            else:
+                grid = [low * (high / low) ** step for step in steps]  # evenly spaced in log load
+            pending.extend((sweep, int(max_requests), value) for value in grid)
+
+    spent = 0
+    cached = 0
+    new_points = 0
+    rounds = 0
+    with multiprocessing.Pool(processes, initializer=init_pool_worker, initargs=(cache_path,)) as pool:
+        while pending:
+            tasks, to_run = [], []
+            for sweep, max_requests, value in pending:
+                params = dict(fixed, graph_size=tuple(graph_size), max_requests=max_requests)
+                params[SWEEP_PARAMETERS[sweep]] = float(value)
+                record = {"sweep": sweep, "graph_size": list(graph_size), "max_requests": max_requests,
+                          **{k: params[k] for k in fixed}, "seed": seed}
+                if _key(record) in done:
+                    continue
+                tasks.append((params, seed))
+                to_run.append(record)
+
+            for record, (stats, hit) in zip(to_run, pool.map(cached_run, tasks)):
+                record["total_requests"] = stats["total_requests"]
+                record["successful_requests"] = stats["successful_requests"]
+                record["blocking_rate"] = calculate_blocking_rate(stats["total_requests"],
+                                                                  stats["successful_requests"])
+                records.append(record)
+                done[_key(record)] = record
+                curve = curves[(record["sweep"], record["max_requests"])]
+                value = record[SWEEP_PARAMETERS[record["sweep"]]]
+                curve["points"].append(dict(record, x=_coordinate(record["sweep"], value, fixed_interarrival,
+                                                                  fixed_service)))
+                new_points += 1
+                if hit:
+                    cached += 1
+                else:
+                    spent += record["max_requests"]
+            save_dataset(dataset_path, records)
+            rounds += 1
+
+            pending = _next_points(curves, budget - spent, processes or multiprocessing.cpu_count(), tolerance)
+
+    return {"spent": spent, "points": new_points, "cached": cached, "rounds": rounds}
+
+
+def _next_points(curves, remaining, batch, tolerance):
+    """Midpoints of the best-scoring splittable intervals that fit in the remaining budget."""
+    candidates = []
+    for (sweep, max_requests), curve in curves.items():
+        points = sorted(curve["points"], key=lambda p: p["x"])
+        for a, b in zip(points[:-1], points[1:]):
+            if abs(b["x"] - a["x"]) < 2 * curve["min_spacing"]:
+                continue
+            score = interval_score(a, b, curve["span"])
+            if score >= tolerance:
+                parameter = SWEEP_PARAMETERS[sweep]
+                candidates.append((score, sweep, max_requests, _midpoint(sweep, a[parameter], b[parameter])))
+
+    chosen = []
+    for score, sweep, max_requests, value in sorted(candidates, reverse=True):
+        if len(chosen) == batch:
+            break
+        if max_requests <= remaining:
+            chosen.append((sweep, max_requests, value))
+            remaining -= max_requests
+    return chosen
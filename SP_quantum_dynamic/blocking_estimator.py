@@ -0,0 +1,180 @@
+import math
+import random
+import time
+
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+MIN_USERS, MAX_USERS = 3, 4  # dynamic_simulation draws random.randint(3, 4) users per request
+OCCUPANCY_LIMIT = 0.3  # above this expected fraction of busy nodes the independent-collision approximation is unreliable
+
+# Success probabilities measured with SP_protocol only depend on the grid and p, not on the load,
+# so they are shared by every sweep point with the same (graph_size, entanglement_prob, samples, timesteps)
+_success_cache = {}
+
+
+def erlang_b(load, servers):
+    """
+    Erlang-B blocking probability of an M/M/c/c loss system.
+
+    Parameters:
+    load (float): Offered load mean_service / mean_interarrival (in Erlangs).
+    servers (int): Number of servers c.
+
+    Returns:
+    float: Probability an arriving request finds all servers busy.
+    """
+    b = 1.0
+    for c in range(1, servers + 1):
+        b = load * b / (c + load * b)  # numerically stable recursion
+    return b
+
+
+def wilson_interval(successes, n, z=1.96):
+    """Wilson score interval for a binomial proportion."""
+    if n == 0:
+        return 0.0, 1.0
+    p_hat = successes / n
+    denom = 1 + z ** 2 / n
+    centre = (p_hat + z ** 2 / (2 * n)) / denom
+    half = z * math.sqrt(p_hat * (1 - p_hat) / n + z ** 2 / (4 * n ** 2)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def no_collision_probability(num_nodes, active_requests):
+    """
+    Probability that a new request's users avoid every node held by `active_requests` admitted requests.
+
+    Users are a uniform random subset of the grid, so for M busy nodes the probability is C(N-M, u)/C(N, u).
+    Each active request holds 3 or 4 users with equal probability, i.e. M = 3*j + Binomial(j, 1/2).
+    """
+    total = 0.0
+    for extra in range(active_requests + 1):
+        busy = MIN_USERS * active_requests + extra
+        weight = math.comb(active_requests, extra) / 2 ** active_requests
+        for users in range(MIN_USERS, MAX_USERS + 1):
+            if busy + users <= num_nodes:
+                total += weight * math.comb(num_nodes - busy, users) / math.comb(num_nodes, users) / 2
+    return total
+
+
+def loss_system_blocking(load, num_nodes, success_prob, servers):
+    """
+    Blocking rate of the dynamic operation modelled as a birth-death loss system.
+
+    State j is the number of admitted (entangled) requests. An arrival in state j is admitted with probability
+    a_j = success_prob * P(no node collision | j) for j < servers, and each admitted request departs at rate
+    1/mean_service. With success_prob = 1 and no collisions this is exactly erlang_b(load, servers).
+
+    Parameters:
+    load (float): mean_service / mean_interarrival.
+    num_nodes (int): Number of nodes in the grid.
+    success_prob (float): Probability SP_protocol generates the GHZ state for a request.
+    servers (int): Maximum number of concurrent requests.
+
+    Returns:
+    tuple: (blocking rate, expected fraction of busy nodes)
+    """
+    admit = [success_prob * no_collision_probability(num_nodes, j) for j in range(servers)] + [0.0]
+
+    weights = [1.0]
+    for j in range(servers):
+        weights.append(weights[-1] * load * admit[j] / (j + 1))
+    norm = sum(weights)
+    pi = [w / norm for w in weights]
+
+    admitted = sum(p * a for p, a in zip(pi, admit))  # PASTA: arrivals see time averages
+    occupancy = sum(j * p for j, p in enumerate(pi)) * (MIN_USERS + MAX_USERS) / 2 / num_nodes
+    return 1 - admitted, occupancy
+
+
+def measure_success_probability(graph_size, entanglement_prob, samples=30, timesteps=1000):
+    """
+    Estimate the per-request SP_protocol success probability from a small sample of random requests.
+
+    Returns:
+    tuple: (number of successes, number of samples), cached per (graph_size, entanglement_prob, samples, timesteps).
+    """
+    key = (tuple(graph_size), round(entanglement_prob, 9), samples, timesteps)
+    if key in _success_cache:
+        return _success_cache[key]
+
+    import Initialisation
+    from simulation_NEW_1 import SP_protocol
+
+    G = Initialisation.initialize_quantum_network(*graph_size, p=entanglement_prob)
+    nodes = list(G.nodes)
+    successes = 0
+    for _ in range(samples):
+        users = random.sample(nodes, k=random.randint(MIN_USERS, MAX_USERS))
+        _, gen_time, _ = SP_protocol(G, users, timesteps=timesteps, reps=1)
+        successes += int(np.all(gen_time > 0))
+
+    _success_cache[key] = (successes, samples)
+    return successes, samples
+
+
+def estimate_blocking_rate(graph_size=(3, 3), mean_interarrival=10.0, mean_service=3.0, entanglement_prob=0.1,
+                           max_concurrent=5, samples=30, timesteps=1000, tolerance=0.02, z=1.96):
+    """
+    Approximate the blocking rate of dynamic_simulation without simulating the event calendar.
+
+    Parameters:
+        graph_size (tuple): Dimensions of the quantum network grid (rows, cols).
+        mean_interarrival (float): Mean time between request arrivals.
+        mean_service (float): Mean service time of an admitted request.
+        entanglement_prob (float): Link generation probability p.
+        max_concurrent (int): Maximum number of concurrent entangled requests.
+        samples (int): Number of SP_protocol runs used to measure the success probability.
+        timesteps (int): SP_protocol timeout, as used by dynamic_simulation.
+        tolerance (float): Maximum acceptable width of the blocking interval before full simulation is advised.
+        z (float): Normal quantile for the success-probability confidence interval.
+
+    Returns:
+        dict: blocking_rate, lower, upper, success_prob, needs_simulation, elapsed_ms.
+        The bounds propagate the Wilson interval of the measured success probability (blocking is monotone in it).
+        needs_simulation is True when the bounds are wider than `tolerance` or the grid is so crowded that
+        the independent-collision approximation breaks down.
+    """
+    start = time.perf_counter()
+    num_nodes = graph_size[0] * graph_size[1]
+    load = mean_service / mean_interarrival
+
+    successes, n = measure_success_probability(graph_size, entanglement_prob, samples, timesteps)
+    p_low, p_high = wilson_interval(successes, n, z)
+    p_hat = successes / n if n else 0.0
+
+    blocking, occupancy = loss_system_blocking(load, num_nodes, p_hat, max_concurrent)
+    upper, _ = loss_system_blocking(load, num_nodes, p_low, max_concurrent)
+    lower, _ = loss_system_blocking(load, num_nodes, p_high, max_concurrent)
+
+    return {
+        "blocking_rate": blocking,
+        "lower": lower,
+        "upper": upper,
+        "success_prob": p_hat,
+        "occupancy": occupancy,
+        "needs_simulation": (upper - lower) > tolerance or occupancy > OCCUPANCY_LIMIT,
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
+    }
+
+
+def triage_sweep(points, tolerance=0.02, **kwargs):
+    """
+    Run estimate_blocking_rate for every sweep point and flag those that need a full simulation.
+
+    Parameters:
+    points (iterable): dicts of dynamic_simulation keyword arguments (graph_size, mean_interarrival,
+                       mean_service, entanglement_prob; others are ignored).
+    tolerance (float): See estimate_blocking_rate.
+
+    Returns:
+    list: (point, estimate) pairs in input order.
+    """
+    keys = ("graph_size", "mean_interarrival", "mean_service", "entanglement_prob")
+    results = []
+    for point in points:
+        params = {k: point[k] for k in keys if k in point}
+        results.append((point, estimate_blocking_rate(tolerance=tolerance, **params, **kwargs)))
+    return results
@@ -0,0 +1,194 @@
+import argparse
+import math
+import multiprocessing
+import sys
+
+from blocking_estimator import wilson_interval
+from Initialisation import RANDOM_SEED
+from result_cache import DEFAULT_CACHE_PATH, cached_run, init_pool_worker
+
+
+def _classify(point, target, z):
+    """-1 if the blocking rate is confidently below the target, 1 if confidently above, 0 if undecided."""
+    lower, upper = wilson_interval(point["total_requests"] - point["successful_requests"], point["total_requests"],
+                                   z)
+    point["lower"], point["upper"] = lower, upper
+    if upper < target:
+        return -1
+    if lower > target:
+        return 1
+    return 0
+
+
+def _crossing(points, target):
+    """Load at which the blocking rate crosses the target, interpolated linearly in log load."""
+    points = sorted(points, key=lambda p: p["load"])
+    for a, b in zip(points[:-1], points[1:]):
+        if a["blocking_rate"] <= target <= b["blocking_rate"] and b["blocking_rate"] > a["blocking_rate"]:
+            fraction = (target - a["blocking_rate"]) / (b["blocking_rate"] - a["blocking_rate"])
+            return math.exp(math.log(a["load"]) + fraction * (math.log(b["load"]) - math.log(a["load"])))
+    return None
+
+
+def max_sustainable_load(graph_size=(6, 6), entanglement_prob=0.5, target_blocking=0.1, mean_service=3.0,
+                         load_range=(0.05, 5.0), Qc=1, loss_dB=None, initial_requests=500, max_requests=50000,
+                         growth=2.0, relative_tolerance=0.05, budget=1000000, points=None, z=1.96, processes=None,
+                         cache_path=DEFAULT_CACHE_PATH, seed=RANDOM_SEED):
+    """
+    Highest traffic load (mean_service / mean_interarrival) whose blocking rate stays below `target_blocking`,
+    found by parallel stochastic bisection over dynamic_simulation instead of a full sweep.
+
+    Every round simulates `points` loads spread evenly (in log load) over the current bracket in parallel and
+    classifies each by the Wilson interval of its blocking rate: confidently below the target, confidently
+    above, or undecided. The bracket shrinks to the highest load below and the lowest load above, and the
+    request count of the runs grows by `growth` per round (up to `max_requests`), so the early, coarse rounds
+    are cheap and the long runs are only spent near the answer. Runs go through the ResultCache, so repeated
+    queries only pay for new points.
+
+    Parameters:
+    graph_size (tuple): Grid dimensions.
+    entanglement_prob (float): Link generation probability.
+    target_blocking (float): Blocking rate that must not be exceeded.
+    mean_service (float): Mean holding time; the load is varied through mean_interarrival.
+    load_range (tuple): Initial bracket of loads.
+    Qc, loss_dB: as for dynamic_simulation.
+    initial_requests (int): Requests per run in the first round.
+    max_requests (int): Upper limit of the requests per run.
+    growth (float): Factor the requests per run grow by each round.
+    relative_tolerance (float): Stop once upper / lower - 1 of the bracket is below this.
+    budget (int): Total simulated requests (cache hits are free); no round is started that would exceed it.
+    points (int): Loads evaluated per round, defaults to the pool size (at least 2).
+    z (float): Normal quantile of the Wilson intervals.
+    processes (int): Pool size, defaults to the number of CPUs.
+    cache_path (str): ResultCache file shared by the workers.
+    seed (int): Seed of every run; the same seed at every load gives common random numbers, which keeps the
+                estimated curve monotone and the bisection stable.
+
+    Returns:
+    dict: load (interpolated crossing of the target), lower (highest load confidently below the target, i.e.
+          the sustainable load at confidence z), upper (lowest load confidently above it; inf if none in the
+          range), mean_interarrival at load, converged, spent (simulated requests), rounds and evaluations
+          (every simulated point). lower is 0 if no load of the range was confidently below the target.
+          infeasible is True if even the lightest load of the range is confidently above the target; load and
+          lower are then 0 and upper is load_range[0]. resolved is False if neither a sustainable load nor
+          infeasibility was shown: load is then only an estimate between load_range[0] and upper, or 0 if the
+          budget did not cover a single round.
+    """
+    points = points or max(2, processes or multiprocessing.cpu_count())
+    lower, upper = float(load_range[0]), float(load_range[1])
+    fixed = {"graph_size": tuple(graph_size), "entanglement_prob": float(entanglement_prob),
+             "mean_service": float(mean_service), "Qc": Qc, "loss_dB": loss_dB}
+
+    requests = int(initial_requests)
+    evaluations = []
+    spent = 0
+    rounds = 0
+    below, above = None, None  # highest load confidently below / lowest load confidently above the target
+    converged = False
+    infeasible = False
+    with multiprocessing.Pool(processes, initializer=init_pool_worker, initargs=(cache_path,)) as pool:
+        while True:
+            if rounds == 0:  # the ends of the range are part of the first round
+                steps = [i / (points - 1) for i in range(points)]
+            else:
+                steps = [(i + 1) / (points + 1) for i in range(points)]
+            loads = [lower * (upper / lower) ** step for step in steps]
+            if spent + requests * len(loads) > budget:
+                break
+
+            tasks = [(dict(fixed, mean_interarrival=mean_service / load, max_requests=requests), seed)
+                     for load in loads]
+            round_points = []
+            for load, (stats, hit) in zip(loads, pool.map(cached_run, tasks)):
+                point = {"load": load, "max_requests": requests, "total_requests": stats["total_requests"],
+                         "successful_requests": stats["successful_requests"],
+                         "blocking_rate": stats["blocking_rate"]}
+                point["side"] = _classify(point, target_blocking, z)
+                round_points.append(point)
+                if not hit:
+                    spent += requests
+            evaluations.extend(round_points)
+            rounds += 1
+
+            for point in round_points:
+                if point["side"] > 0 and (above is None or point["load"] < above):
+                    above = point["load"]
+            if below is not None and above is not None and below >= above:
+                below = None  # contradicted by a longer run, rebuild it from this round
+                lower = float(load_range[0])
+            for point in round_points:
+                if point["side"] < 0 and (above is None or point["load"] < above) and \
+                        (below is None or point["load"] > below):
+                    below = point["load"]
+            if rounds == 1 and below is None and round_points[0]["side"] > 0:
+                infeasible = True
+                break  # even the lightest load blocks too much
+            if rounds == 1 and above is None and round_points[-1]["side"] < 0:
+                break  # the whole range is sustainable
+            lower = below if below is not None else lower
+            upper = above if above is not None else upper
+
+            if below is not None and above is not None and above / below - 1 <= relative_tolerance:
+                converged = True
+                break
+            if requests >= max_requests and not any(p["side"] for p in round_points):
+                break  # the remaining bracket cannot be resolved at max_requests
+            requests = min(int(max_requests), int(math.ceil(requests * growth)))
+
+    resolved = infeasible or below is not None
+    # the crossing is interpolated from the longest runs, falling back to the middle of the bracket; without a
+    # load confidently below the target the bracket starts at the lightest load of the range
+    floor = below if below is not None else float(load_range[0])
+    longest = max((p["max_requests"] for p in evaluations), default=0)
+    estimate = _crossing([p for p in evaluations if p["max_requests"] == longest], target_blocking)
+    if infeasible or not evaluations:
+        estimate = 0.0
+    elif estimate is None or estimate < floor or (above is not None and estimate > above):
+        estimate = floor if above is None else math.sqrt(floor * above)
+    if below is None:
+        below = 0.0
+    return {
+        "load": estimate,
+        "lower": below,
+        "upper": above if above is not None else math.inf,
+        "mean_interarrival": mean_service / estimate if estimate else math.inf,
+        "converged": converged,
+        "infeasible": infeasible,
+        "resolved": resolved,
+        "spent": spent,
+        "rounds": rounds,
+        "evaluations": evaluations,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maximum sustainable traffic load for a target blocking rate")
+    parser.add_argument("target", type=float, help="target blocking rate, e.g. 0.05")
+    parser.add_argument("--grid", type=int, nargs=2, default=(6, 6), metavar=("ROWS", "COLS"))
+    parser.add_argument("-p", "--entanglement-prob", type=float, default=0.5)
+    parser.add_argument("--mean-service", type=float, default=3.0)
+    parser.add_argument("--Qc", type=int, default=1)
+    parser.add_argument("--max-requests", type=int, default=50000)
+    parser.add_argument("--budget", type=int, default=1000000, help="total simulated requests")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    result = max_sustainable_load(tuple(args.grid), args.entanglement_prob, args.target, args.mean_service,
+                                  Qc=args.Qc, max_requests=args.max_requests, budget=args.budget,
+                                  processes=args.processes)
+    if result["infeasible"]:
+        print(f"Target {args.target} is infeasible: even the lightest load {result['upper']:.3f} blocks more "
+              f"({result['spent']} simulated requests)")
+        sys.exit(1)
+    if not result["rounds"]:
+        print(f"Not resolved: a budget of {args.budget} simulated requests does not cover one round")
+        sys.exit(1)
+    if not result["resolved"]:
+        print(f"Not resolved: no load was confidently below the target; estimated max load {result['load']:.3f}, "
+              f"exceeded from {result['upper']:.3f} ({result['spent']} simulated requests in {result['rounds']} "
+              f"rounds)")
+        sys.exit(1)
+    print(f"Max load {result['load']:.3f} (sustainable with confidence up to {result['lower']:.3f}, "
+          f"exceeded from {result['upper']:.3f}), mean_interarrival {result['mean_interarrival']:.3f}, "
+          f"{result['spent']} simulated requests in {result['rounds']} rounds"
+          f"{'' if result['converged'] else ', not converged'}")
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+
+# Budget (seconds) for `import simulation_NEW_1` in a fresh interpreter, i.e. what every new pool worker pays
+COLD_START_BUDGET = 0.25
+HEAVY_MODULES = ("networkx", "numpy", "matplotlib")
+
+_PROBE = (
+    "import time, sys\n"
+    "t0 = time.perf_counter()\n"
+    "import {module}\n"
+    "t1 = time.perf_counter()\n"
+    "from lazy_imports import is_loaded\n"
+    "print(t1 - t0)\n"
+    "print(','.join(m for m in {heavy!r} if is_loaded(m)))\n"
+)
+
+
+def measure_cold_start(module="simulation_NEW_1", runs=5):
+    """
+    Measure the time to import `module` in a fresh Python process.
+
+    Parameters:
+    module (str): Module to import (resolved relative to this directory).
+    runs (int): Number of fresh interpreters to start; the best time is reported to filter out OS noise.
+
+    Returns:
+    dict: best and all import times (s), and which heavy modules ended up executed by the import.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [here, env.get("PYTHONPATH")]))
+    probe = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+
+    times = []
+    loaded = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", probe], cwd=here, env=env, capture_output=True, text=True, check=True
+        ).stdout.splitlines()
+        times.append(float(out[0]))
+        loaded = [m for m in out[1].split(",") if m] if len(out) > 1 else []
+
+    return {"best": min(times), "times": times, "heavy_loaded": loaded}
+
+
+def check_cold_start(module="simulation_NEW_1", budget=COLD_START_BUDGET, runs=5):
+    """
+    Check that importing `module` stays within `budget` seconds and does not execute any heavy module.
+
+    Returns:
+    bool: True if the budget is met.
+    """
+    result = measure_cold_start(module, runs)
+    ok = result["best"] <= budget and not result["heavy_loaded"]
+    print(f"Cold start of {module}: {result['best'] * 1000:.1f} ms (budget {budget * 1000:.0f} ms)")
+    if result["heavy_loaded"]:
+        print(f"Heavy modules executed at import: {', '.join(result['heavy_loaded'])}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_cold_start() else 1)
@@ -0,0 +1,309 @@
+import argparse
+import math
+import multiprocessing
+import os
+
+from Initialisation import RANDOM_SEED
+from lazy_imports import lazy_import
+from result_cache import DEFAULT_CACHE_PATH, cached_run, init_pool_worker
+from simulation_NEW_1 import calculate_blocking_rate
+
+np = lazy_import("numpy")
+
+# Explored dimensions: (low, high, scale). "int" values are uniform integers, "log" is uniform in log space.
+# load is mean_service / mean_interarrival, with mean_service fixed at MEAN_SERVICE.
+DEFAULT_SPACE = {
+    "grid_size": (3, 8, "int"),
+    "entanglement_prob": (0.1, 1.0, "linear"),
+    "Qc": (1, 5, "int"),
+    "loss_dB": (0.0, 1.0, "linear"),
+    "load": (0.1, 3.0, "log"),
+}
+MEAN_SERVICE = 3.0
+DEFAULT_STORE_PATH = os.path.join("results", "design.npz")
+
+
+def latin_hypercube(n, dimensions, rng):
+    """
+    n points in [0, 1)^dimensions, exactly one point in each of the n equal slices of every axis.
+
+    Returns:
+    ndarray: shape (n, dimensions)
+    """
+    slices = np.argsort(rng.random((dimensions, n)), axis=1).T  # independent permutation per axis
+    return (slices + rng.random((n, dimensions))) / n
+
+
+def sobol(n, dimensions, seed=None):
+    """
+    Scrambled Sobol points in [0, 1)^dimensions (needs scipy). n is best a power of two.
+
+    Returns:
+    ndarray: shape (n, dimensions)
+    """
+    try:
+        from scipy.stats import qmc
+    except ImportError:
+        raise ImportError("Sobol sampling needs scipy (scipy.stats.qmc), use method='lhs' instead") from None
+    return qmc.Sobol(d=dimensions, scramble=True, seed=seed).random(n)
+
+
+def from_unit(unit, space=None):
+    """
+    Map unit-cube points to configurations.
+
+    Returns:
+    list: One {dimension: value} dict per row of `unit`.
+    """
+    space = space or DEFAULT_SPACE
+    configs = []
+    for row in np.atleast_2d(unit):
+        config = {}
+        for u, (name, (low, high, scale)) in zip(row, space.items()):
+            if scale == "int":
+                config[name] = int(min(high, low + math.floor(u * (high - low + 1))))
+            elif scale == "log":
+                config[name] = float(low * (high / low) ** u)
+            else:
+                config[name] = float(low + (high - low) * u)
+        configs.append(config)
+    return configs
+
+
+def to_unit(configs, space=None):
+    """Inverse of from_unit (integers map to the centre of their slice)."""
+    space = space or DEFAULT_SPACE
+    if isinstance(configs, dict):
+        configs = [configs]
+    unit = np.empty((len(configs), len(space)))
+    for i, config in enumerate(configs):
+        for j, (name, (low, high, scale)) in enumerate(space.items()):
+            value = config[name]
+            if scale == "int":
+                unit[i, j] = (value - low + 0.5) / (high - low + 1)
+            elif scale == "log":
+                unit[i, j] = math.log(value / low) / math.log(high / low)
+            else:
+                unit[i, j] = (value - low) / (high - low) if high > low else 0.5
+    return unit
+
+
+def design(n, space=None, method="lhs", seed=None):
+    """
+    Space-filling experiment design.
+
+    Parameters:
+    n (int): Number of configurations.
+    space (dict): {dimension: (low, high, scale)}, defaults to DEFAULT_SPACE.
+    method (str): "lhs" (Latin hypercube) or "sobol".
+    seed (int): Seed of the sampler.
+
+    Returns:
+    list: Configurations, see from_unit.
+    """
+    space = space or DEFAULT_SPACE
+    if method == "lhs":
+        unit = latin_hypercube(n, len(space), np.random.default_rng(seed))
+    elif method == "sobol":
+        unit = sobol(n, len(space), seed)
+    else:
+        raise ValueError(f"Unknown design method {method!r}, expected 'lhs' or 'sobol'")
+    return from_unit(unit, space)
+
+
+def simulation_params(config, max_requests):
+    """dynamic_simulation keyword arguments for a configuration."""
+    params = {
+        "graph_size": (config.get("grid_size", 3), config.get("grid_size", 3)),
+        "entanglement_prob": config.get("entanglement_prob", 0.1),
+        "Qc": config.get("Qc", 1),
+        "loss_dB": config.get("loss_dB"),
+        "mean_service": MEAN_SERVICE,
+        "mean_interarrival": MEAN_SERVICE / config.get("load", MEAN_SERVICE / 10.0),
+        "max_requests": max_requests,
+    }
+    return params
+
+
+def load_store(store_path=DEFAULT_STORE_PATH):
+    """
+    Load the columnar result store.
+
+    Returns:
+    dict: {column: 1-d array}, empty if the store does not exist yet.
+    """
+    if not os.path.exists(store_path):
+        return {}
+    with np.load(store_path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def append_store(store_path, rows, key=None):
+    """
+    Append rows (dicts with the same keys) to the store, rewriting the .npz file atomically.
+
+    If `key` (column names) is given, stored rows with the same values in those columns as one of the new rows
+    are replaced by it, so re-running a design does not add duplicate observations.
+    """
+    columns = load_store(store_path)
+    if key and columns:
+        new_keys = {tuple(float(row[name]) for name in key) for row in rows}
+        keep = np.array([stored not in new_keys for stored in zip(*(columns[name].tolist() for name in key))],
+                        dtype=bool)
+        columns = {name: values[keep] for name, values in columns.items()}
+    for name in rows[0]:
+        new = np.asarray([row[name] for row in rows], dtype=float)
+        columns[name] = np.concatenate([columns[name], new]) if name in columns else new
+    directory = os.path.dirname(os.path.abspath(store_path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = store_path + ".tmp.npz"
+    np.savez(tmp_path, **columns)
+    os.replace(tmp_path, store_path)
+
+
+def run_design(n, store_path=DEFAULT_STORE_PATH, space=None, method="lhs", max_requests=1000, processes=None,
+               seed=RANDOM_SEED, cache_path=DEFAULT_CACHE_PATH):
+    """
+    Sample `n` configurations and run dynamic_simulation for them in parallel, appending to the column store.
+
+    Runs go through the ResultCache (one per pool worker), so repeating a design only simulates new points, and
+    rows already in the store for the same configuration, seed and max_requests are replaced instead of repeated.
+
+    Returns:
+    dict: The store's columns after appending.
+    """
+    space = space or DEFAULT_SPACE
+    configs = design(n, space, method, seed)
+    tasks = [(simulation_params(config, max_requests), seed) for config in configs]
+
+    with multiprocessing.Pool(processes, initializer=init_pool_worker, initargs=(cache_path,)) as pool:
+        results = pool.map(cached_run, tasks)
+
+    rows = []
+    for config, (params, _), (stats, _) in zip(configs, tasks, results):
+        generation_time = stats["quantiles"]["generation_time"]
+        rows.append({
+            **{name: config[name] for name in space},
+            "mean_interarrival": params["mean_interarrival"],
+            "mean_service": params["mean_service"],
+            "max_requests": max_requests,
+            "seed": seed,
+            "total_requests": stats["total_requests"],
+            "successful_requests": stats["successful_requests"],
+            "blocking_rate": calculate_blocking_rate(stats["total_requests"], stats["successful_requests"]),
+            "generation_time_p50": generation_time["p50"],
+            "generation_time_p95": generation_time["p95"],
+        })
+    append_store(store_path, rows, key=(*space, "seed", "max_requests"))
+    return load_store(store_path)
+
+
+class GPSurrogate:
+    """
+    Gaussian-process regression in NumPy for instant queries of untested configurations.
+
+    Squared-exponential kernel with one length scale per dimension on unit-cube inputs. The length scales and
+    signal variance are chosen by maximising the log marginal likelihood over a small grid (isotropic first,
+    then per dimension). Every observation has its own noise variance (binomial variance of the blocking rate).
+
+    Parameters:
+    space (dict): Design space the inputs are taken from, defaults to DEFAULT_SPACE.
+    """
+
+    LENGTH_SCALES = (0.1, 0.2, 0.35, 0.5, 0.75, 1.0, 1.5, 3.0)
+
+    def __init__(self, space=None):
+        self.space = space or DEFAULT_SPACE
+
+    def _kernel(self, a, b, length_scales, variance):
+        d = (a[:, None, :] - b[None, :, :]) / length_scales
+        return variance * np.exp(-0.5 * np.sum(d * d, axis=2))
+
+    def _log_likelihood(self, length_scales, variance):
+        K = self._kernel(self.X, self.X, length_scales, variance) + np.diag(self.noise)
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            return -math.inf
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, self.y))
+        return float(-0.5 * self.y @ alpha - np.log(np.diag(L)).sum())
+
+    def fit(self, X, y, noise):
+        """
+        Parameters:
+        X (ndarray): (n, d) unit-cube inputs.
+        y (ndarray): Observed values.
+        noise (ndarray): Observation noise variances.
+        """
+        self.X = np.asarray(X, dtype=float)
+        self.mean = float(np.mean(y))
+        self.y = np.asarray(y, dtype=float) - self.mean
+        self.noise = np.asarray(noise, dtype=float) + 1e-8
+        variance = max(float(np.var(self.y)), 1e-6)
+        d = self.X.shape[1]
+
+        best = max(self.LENGTH_SCALES, key=lambda l: self._log_likelihood(np.full(d, l), variance))
+        length_scales = np.full(d, best)
+        for j in range(d):  # coordinate search per dimension
+            def likelihood(l, j=j):
+                trial = length_scales.copy()
+                trial[j] = l
+                return self._log_likelihood(trial, variance)
+            length_scales[j] = max(self.LENGTH_SCALES, key=likelihood)
+        self.variance = max((variance * f for f in (0.5, 1.0, 2.0)),
+                            key=lambda v: self._log_likelihood(length_scales, v))
+        self.length_scales = length_scales
+
+        K = self._kernel(self.X, self.X, length_scales, self.variance) + np.diag(self.noise)
+        self._L = np.linalg.cholesky(K)
+        self._alpha = np.linalg.solve(self._L.T, np.linalg.solve(self._L, self.y))
+        return self
+
+    def predict(self, X):
+        """
+        Returns:
+        tuple: (mean, standard deviation) arrays at the unit-cube inputs X.
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        K_star = self._kernel(X, self.X, self.length_scales, self.variance)
+        mean = self.mean + K_star @ self._alpha
+        v = np.linalg.solve(self._L, K_star.T)
+        variance = np.maximum(self.variance - np.sum(v * v, axis=0), 0.0)
+        return mean, np.sqrt(variance)
+
+    def query(self, **config):
+        """Predicted blocking rate (clipped to [0, 1]) and its standard deviation for one configuration."""
+        mean, std = self.predict(to_unit(config, self.space))
+        return float(np.clip(mean[0], 0.0, 1.0)), float(std[0])
+
+
+def fit_surrogate(store_path=DEFAULT_STORE_PATH, space=None, target="blocking_rate"):
+    """Fit a GPSurrogate to `target` over all rows of the column store."""
+    space = space or DEFAULT_SPACE
+    columns = load_store(store_path)
+    if not columns:
+        raise ValueError(f"No results in {store_path}, run run_design first")
+    X = to_unit([{name: columns[name][i] for name in space} for i in range(len(columns[target]))], space)
+    y = columns[target]
+    if target == "blocking_rate":
+        n = np.maximum(columns["total_requests"], 1)
+        noise = np.maximum(y * (1 - y), 1.0 / n) / n  # binomial variance, floored for rates of 0 or 1
+    else:
+        noise = np.full(len(y), 1e-4 * max(float(np.var(y)), 1e-12))
+    return GPSurrogate(space).fit(X, y, noise)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Space-filling exploration of dynamic_simulation parameters")
+    parser.add_argument("n", type=int, help="number of configurations")
+    parser.add_argument("--method", choices=("lhs", "sobol"), default="lhs")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH)
+    parser.add_argument("--max-requests", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    columns = run_design(args.n, args.store, method=args.method, max_requests=args.max_requests,
+                         processes=args.processes)
+    surrogate = fit_surrogate(args.store)
+    print(f"{len(columns['blocking_rate'])} configurations in {args.store}, "
+          f"GP length scales {np.round(surrogate.length_scales, 2).tolist()}")
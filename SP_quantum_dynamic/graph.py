@@ -1,6 +1,6 @@
-import networkx as nx
+from lazy_imports import lazy_import
 
-from networkx.generators import *
+nx = lazy_import("networkx")  # loaded on first use, keeps `import graph` cheap
 
 
 def network(n, m):
@@ -50,9 +50,8 @@ def update_graph_usage(G, reps):
     G         - Networkx graph G(V,E) which defines the topology of the network. see graphs.py for more details
     reps - Total number of repetitions used to calculate usage fraction for each node (usage_count/reps)
     """
-    for node in G.nodes:
-        usage_count = G.nodes[node]["usage_count"]
-        G.nodes[node]["usage_fraction"] = usage_count / reps
+    for _, data in G.nodes(data=True):  # one pass over the node attribute dicts, no per-node lookups
+        data["usage_fraction"] = data["usage_count"] / reps
 
 
 def update_graph_params(G, p=None, Qc=None):
@@ -126,16 +125,24 @@ def update_usage_from_subgraph(G, J):
     """
     Updates usage parameters in G using the ones from subgraph J
 
+    Nodes of G outside J did no work for this request and get zero usage, as if J held every node of G. Only
+    the nodes written by the previous update (G.graph["usage_nodes"]) can still hold usage, so only those are
+    reset; the first update resets every node outside J.
+
     Input Pararmeters:
     G  - Networkx graph G(V,E) which defines the topology of the network. see graphs.py for more details
     J - Networkx graph which has the usage values
     """
-    for node in J.nodes:
-        G.nodes[node]["usage_count"] = J.nodes[node]["usage_count"]
-        G.nodes[node]["usage_fraction"] = J.nodes[node]["usage_fraction"]
+    previous = G.graph.get("usage_nodes")
+    for node in (G if previous is None else previous):
+        if node not in J and node in G:
+            G.nodes[node].update(usage_count=0, usage_fraction=0.0)
+    for node, data in J.nodes(data=True):
+        G.nodes[node].update(usage_count=data["usage_count"], usage_fraction=data["usage_fraction"])
+    G.graph["usage_nodes"] = list(J)
 
 
-def remove_nodes(G: nx.Graph, min_usage, excluded_nodes=None):
+def remove_nodes(G: "nx.Graph", min_usage, excluded_nodes=None):
     """
     Removes nodes from graph G that has a usage fraction under given min_usage, doesn't remove any nodes if given in excluded_nodes list.
 
@@ -147,13 +154,11 @@ def remove_nodes(G: nx.Graph, min_usage, excluded_nodes=None):
     Outputs:
     count - number of removed nodes
     """
-    if excluded_nodes is None:
-        excluded_nodes = []
+    excluded = set(excluded_nodes) if excluded_nodes is not None else set()
 
-    count = 0
-    for node, usage in nx.get_node_attributes(G, "usage_fraction").items():
-        if (usage < min_usage) and (node not in excluded_nodes):
-            G.remove_node(node)
-            count += 1
+    # only nodes that carry a usage_fraction are candidates, as before; removed in one batch
+    to_remove = [node for node, data in G.nodes(data=True)
+                 if "usage_fraction" in data and data["usage_fraction"] < min_usage and node not in excluded]
+    G.remove_nodes_from(to_remove)
 
-    return count
\ No newline at end of file
+    return len(to_remove)
\ No newline at end of file
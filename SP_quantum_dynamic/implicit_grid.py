@@ -0,0 +1,307 @@
+import random
+from collections import deque
+
+from lazy_imports import lazy_import
+from simulation_NEW_1 import calculate_blocking_rate
+
+np = lazy_import("numpy")
+
+
+class ImplicitGrid:
+    """
+    rows x columns grid network without per-node Python objects.
+
+    Nodes are integers row * columns + column and neighbours are derived arithmetically from the coordinates.
+    Edges get an integer id (2 * node for the edge to the right, 2 * node + 1 for the edge below), so link
+    state can be held in small arrays for the edges of active requests only. Memory does not grow with the
+    number of nodes, which makes 1000 x 1000 (10^6 node) networks feasible.
+
+    Parameters:
+    rows (int), columns (int): Grid dimensions.
+    p (float): Link generation probability per edge and timestep.
+    Qc (int): Decoherence time of a link, in timesteps.
+    """
+
+    def __init__(self, rows, columns, p=0.1, Qc=1):
+        self.rows = rows
+        self.columns = columns
+        self.p = p
+        self.Qc = Qc
+        self.num_nodes = rows * columns
+
+    def coords(self, node):
+        return divmod(node, self.columns)
+
+    def node(self, row, column):
+        return row * self.columns + column
+
+    def neighbours(self, node):
+        row, column = divmod(node, self.columns)
+        if row > 0:
+            yield node - self.columns
+        if column > 0:
+            yield node - 1
+        if column < self.columns - 1:
+            yield node + 1
+        if row < self.rows - 1:
+            yield node + self.columns
+
+    def edge_id(self, u, v):
+        """Integer id of the edge between neighbouring nodes u and v."""
+        if u > v:
+            u, v = v, u
+        return 2 * u if v == u + 1 else 2 * u + 1
+
+    def sample_users(self, k, rng=random, radius=None):
+        """
+        Sample k distinct nodes without materialising a node list (rejection on random indices).
+
+        If radius is given, users[1:] are drawn within Chebyshev distance `radius` of users[0] (the centre),
+        modelling requests between nearby users in a large network.
+        """
+        centre = rng.randrange(self.num_nodes)
+        users = [centre]
+        if radius is None:
+            while len(users) < k:
+                node = rng.randrange(self.num_nodes)
+                if node not in users:
+                    users.append(node)
+            return users
+
+        row, column = divmod(centre, self.columns)
+        r0, r1 = max(0, row - radius), min(self.rows - 1, row + radius)
+        c0, c1 = max(0, column - radius), min(self.columns - 1, column + radius)
+        if (r1 - r0 + 1) * (c1 - c0 + 1) < k:
+            raise ValueError("radius too small for the number of users")
+        while len(users) < k:
+            node = self.node(rng.randint(r0, r1), rng.randint(c0, c1))
+            if node not in users:
+                users.append(node)
+        return users
+
+    def _l_path(self, u, v, rows_first):
+        (r, c), (r1, c1) = self.coords(u), self.coords(v)
+        path = [u]
+        legs = ((r1, None), (None, c1)) if rows_first else ((None, c1), (r1, None))
+        for target_row, target_column in legs:
+            while target_row is not None and r != target_row:
+                r += 1 if target_row > r else -1
+                path.append(self.node(r, c))
+            while target_column is not None and c != target_column:
+                c += 1 if target_column > c else -1
+                path.append(self.node(r, c))
+        return path
+
+    def path_edges(self, path):
+        return [self.edge_id(a, b) for a, b in zip(path[:-1], path[1:])]
+
+    def free_path(self, u, v, used):
+        """
+        Shortest path from u to v over the edges not in `used` (BFS on the implicit grid), None if there is none.
+        The search stops as soon as v is reached, so it only visits nodes up to the path length from u.
+        """
+        if all(self.edge_id(u, w) in used for w in self.neighbours(u)) or \
+                all(self.edge_id(v, w) in used for w in self.neighbours(v)):
+            return None  # cut off at an end, saves searching the whole grid
+        parent = {u: None}
+        queue = deque([u])
+        while queue:
+            node = queue.popleft()
+            for w in self.neighbours(node):
+                if w in parent or self.edge_id(node, w) in used:
+                    continue
+                parent[w] = node
+                if w == v:
+                    path = [v]
+                    while parent[path[-1]] is not None:
+                        path.append(parent[path[-1]])
+                    return path[::-1]
+                queue.append(w)
+        return None
+
+    def star_paths(self, users):
+        """
+        The star of _get_star: per destination a shortest path from users[0] over the edges not used by earlier
+        destinations, or a shortest path sharing edges if no such path exists.
+
+        An L-shaped (Manhattan) path avoiding the used edges is taken directly, it is a shortest path already;
+        otherwise the path is searched with free_path.
+
+        Returns:
+        list: Per destination, the list of nodes along its path.
+        """
+        centre = users[0]
+        used = set()
+        paths = []
+        for destination in users[1:]:
+            options = [self._l_path(centre, destination, rows_first) for rows_first in (True, False)]
+            path = next((p for p in options if used.isdisjoint(self.path_edges(p))), None)
+            if path is None:
+                path = self.free_path(centre, destination, used) or options[0]
+            used.update(self.path_edges(path))
+            paths.append(path)
+        return paths
+
+
+def _live_path(adjacency, live, source, target):
+    """Shortest path (list of local edge indices) from source to target over live links, None if there is none."""
+    parent = {source: None}
+    queue = deque([source])
+    while queue:
+        node = queue.popleft()
+        for w, e in adjacency[node]:
+            if w in parent or not live[e]:
+                continue
+            parent[w] = (node, e)
+            if w == target:
+                edges = []
+                while parent[w] is not None:
+                    w, e = parent[w]
+                    edges.append(e)
+                return edges
+            queue.append(w)
+    return None
+
+
+def run_star_protocol(grid, users, timesteps, rng):
+    """
+    SP protocol on an ImplicitGrid (the model of SP_protocol with _SD_protocol), with link state held only for
+    the edges of this request's star.
+
+    Every timestep the live links and the destination qubits age and decohere after Qc timesteps, and each
+    free edge of the star generates a link with probability p, vectorised over the star's edges. Every
+    destination not holding a qubit is then routed over the live links of the star (shortest path); the links
+    of the path are consumed and the destination holds its qubit for Qc timesteps. The request succeeds once
+    all destinations hold a qubit at the same time.
+
+    Returns:
+    int: Timesteps until all destinations were entangled, -1 if `timesteps` was reached first.
+    """
+    centre = users[0]
+    paths = grid.star_paths(users)
+    edge_ids = sorted({e for path in paths for e in grid.path_edges(path)})
+    index = {e: i for i, e in enumerate(edge_ids)}
+    adjacency = {}
+    for path in paths:
+        for a, b in zip(path[:-1], path[1:]):
+            e = index[grid.edge_id(a, b)]
+            adjacency.setdefault(a, set()).add((b, e))
+            adjacency.setdefault(b, set()).add((a, e))
+    # branches that only meet at the centre leave a destination a single route, its own path
+    branch_nodes = [set(path[1:]) for path in paths]
+    simple = sum(len(nodes) for nodes in branch_nodes) == len(set().union(*branch_nodes))
+    path_index = [np.array([index[e] for e in grid.path_edges(path)]) for path in paths]
+
+    live = np.zeros(len(edge_ids), dtype=bool)
+    age = np.zeros(len(edge_ids), dtype=np.int32)
+    expiry = [0] * len(paths)  # timestep the destination's qubit decoheres (0: none held)
+    for t in range(1, timesteps + 1):
+        age[live] += 1
+        live &= age < grid.Qc
+        fresh = ~live & (rng.random(len(edge_ids)) < grid.p)
+        live |= fresh
+        age[fresh] = 0
+
+        for i, destination in enumerate(users[1:]):
+            if expiry[i] > t:
+                continue  # still holds its qubit
+            if simple:
+                edges = path_index[i] if live[path_index[i]].all() else None
+            else:
+                edges = _live_path(adjacency, live, centre, destination)
+            if edges is not None:
+                live[edges] = False  # links consumed by entanglement swapping
+                expiry[i] = t + grid.Qc
+        if all(e > t for e in expiry):
+            return t
+    return -1
+
+
+def scale_simulation(graph_size=(1000, 1000), mean_interarrival=10.0, mean_service=3.0, max_requests=100,
+                     entanglement_prob=0.1, Qc=1, timesteps=1000, max_concurrent=5, radius=None, seed=None):
+    """
+    dynamic_simulation for very large grids: same arrivals, admission rules and blocking statistics, but on an
+    ImplicitGrid, with busy users in a set and link state only for the request being served. As in
+    dynamic_simulation, each departure event releases the earliest admitted active request.
+
+    Parameters:
+        graph_size (tuple): Dimensions of the grid (rows, cols).
+        mean_interarrival (float), mean_service (float): Means of the exponential interarrival/holding times.
+        max_requests (int): Number of requests to simulate.
+        entanglement_prob (float): Link generation probability p.
+        Qc (int): Link decoherence time in timesteps.
+        timesteps (int): SP protocol timeout.
+        max_concurrent (int): Maximum number of concurrently entangled requests.
+        radius (int): If given, users of a request are drawn within this distance of its centre.
+        seed (int): Seed of the random streams. If None they are drawn from the global random / np.random state,
+                    so Initialisation.seed_rngs() makes the run reproducible, as for dynamic_simulation.
+
+    Returns:
+        dict: total_requests, successful_requests, blocking_rate, events (arrivals + departures), sim_time.
+    """
+    if seed is None:
+        rng = random.Random(random.getrandbits(64))
+        np_rng = np.random.default_rng(np.random.randint(2 ** 63, dtype=np.int64))
+    else:
+        rng = random.Random(seed)
+        np_rng = np.random.default_rng(seed)
+    grid = ImplicitGrid(*graph_size, p=entanglement_prob, Qc=Qc)
+
+    busy = set()
+    active = deque()  # (departure time, users) of the admitted requests, in admission order
+    sim_clock = 0.0
+    successful_requests = 0
+    events = 0
+
+    for _ in range(max_requests):
+        sim_clock += rng.expovariate(1.0 / mean_interarrival)
+        events += 1
+        while active and min(departure for departure, _ in active) <= sim_clock:
+            _, users = active.popleft()
+            busy.difference_update(users)
+            events += 1
+
+        users = grid.sample_users(rng.randint(3, 4), rng, radius)
+        if len(active) >= max_concurrent or not busy.isdisjoint(users):
+            continue
+        if run_star_protocol(grid, users, timesteps, np_rng) > 0:
+            successful_requests += 1
+            busy.update(users)
+            active.append((sim_clock + rng.expovariate(1.0 / mean_service), users))
+
+    total_requests = max_requests
+    return {
+        "total_requests": total_requests,
+        "successful_requests": successful_requests,
+        "blocking_rate": calculate_blocking_rate(total_requests, successful_requests),
+        "events": events,
+        "sim_time": sim_clock,
+    }
+
+
+def compare_with_dynamic(graph_size=(4, 4), mean_interarrival=5.0, mean_service=3.0, max_requests=2000,
+                         entanglement_prob=0.5, Qc=1, seeds=(1, 2, 3), z=4.0):
+    """
+    Check on a small grid that scale_simulation and dynamic_simulation model the same network: their pooled
+    blocking rates over `seeds` must agree within `z` standard errors (two-proportion z-test).
+
+    Returns:
+    dict: blocking rate of both, the z statistic and "match".
+    """
+    from simulation_NEW_1 import dynamic_simulation
+
+    blocked = {"scale": 0, "dynamic": 0}
+    for seed in seeds:
+        stats = scale_simulation(graph_size, mean_interarrival, mean_service, max_requests, entanglement_prob, Qc=Qc,
+                                 seed=seed)
+        blocked["scale"] += stats["total_requests"] - stats["successful_requests"]
+        stats = dynamic_simulation(graph_size, mean_interarrival, mean_service, max_requests,
+                                   entanglement_prob=entanglement_prob, Qc=Qc, seed=seed, detailed_stats=True)
+        blocked["dynamic"] += stats["total_requests"] - stats["successful_requests"]
+
+    n = max_requests * len(seeds)
+    rates = {name: count / n for name, count in blocked.items()}
+    pooled = (blocked["scale"] + blocked["dynamic"]) / (2 * n)
+    error = (pooled * (1 - pooled) * 2 / n) ** 0.5
+    score = abs(rates["scale"] - rates["dynamic"]) / error if error > 0 else 0.0
+    return {"scale": rates["scale"], "dynamic": rates["dynamic"], "z": score, "match": score <= z}
@@ -0,0 +1,380 @@
+"""
+Array kernels for the inner loops of the SP protocol: routing on the entangled subgraph, edge consumption and
+link generation. They run on a CSR adjacency and a boolean link-state array instead of NetworkX graphs.
+LinkState keeps that array across timesteps and expires links and qubits with a timing wheel.
+
+The kernels are compiled with Numba when it is installed; otherwise the same functions run as plain Python
+over NumPy arrays. HAVE_NUMBA tells which one is in use. Numba is only imported (and a kernel only compiled) on
+the first call of that kernel, so importing this module stays cheap.
+"""
+import functools
+import importlib.util
+
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+HAVE_NUMBA = importlib.util.find_spec("numba") is not None  # checked without importing it
+
+
+def njit(function):
+    """
+    Compile `function` with numba.njit(cache=True) on its first call, or run it as plain Python if Numba is not
+    installed. Kernels must not call each other, the wrapper is not callable from compiled code.
+    """
+    compiled = None
+
+    @functools.wraps(function)
+    def kernel(*args):
+        nonlocal compiled
+        if compiled is None:
+            if HAVE_NUMBA:
+                import numba
+
+                compiled = numba.njit(cache=True)(function)
+            else:  # pure NumPy fallback, same code without compilation
+                compiled = function
+        return compiled(*args)
+
+    return kernel
+
+UNVISITED = -2
+NONE = -1
+
+
+@njit
+def bidirectional_path(indptr, indices, edge_of, alive, source, target, pred, succ, fringes, path):
+    """
+    Shortest path between source and target over the edges with alive[edge] set.
+
+    This mirrors networkx's bidirectional BFS (_bidirectional_pred_succ) step by step: it expands the smaller
+    fringe, visits neighbours in adjacency order and stops at the first node seen from both sides. Given the
+    same adjacency order it therefore returns exactly the path nx.shortest_path returns on the entangled subgraph.
+
+    Parameters:
+    indptr, indices, edge_of: CSR adjacency (neighbour and edge id of every adjacency slot).
+    alive: bool array, link state per edge.
+    pred, succ: int scratch arrays of length num_nodes.
+    fringes: int scratch array of shape (4, num_nodes).
+    path: int output array of length num_nodes.
+
+    Returns:
+    int: Number of nodes written to `path`, 0 if there is no path.
+    """
+    pred[:] = UNVISITED
+    succ[:] = UNVISITED
+    if source == target:
+        path[0] = source
+        return 1
+    pred[source] = NONE
+    succ[target] = NONE
+
+    forward, reverse, next_forward, next_reverse = 0, 1, 2, 3
+    fringes[forward, 0] = source
+    fringes[reverse, 0] = target
+    forward_count = 1
+    reverse_count = 1
+    meet = -1
+
+    while forward_count > 0 and reverse_count > 0 and meet < 0:
+        if forward_count <= reverse_count:
+            count = 0
+            for a in range(forward_count):
+                v = fringes[forward, a]
+                for k in range(indptr[v], indptr[v + 1]):
+                    if not alive[edge_of[k]]:
+                        continue
+                    w = indices[k]
+                    if pred[w] == UNVISITED:
+                        fringes[next_forward, count] = w
+                        count += 1
+                        pred[w] = v
+                    if succ[w] != UNVISITED:
+                        meet = w
+                        break
+                if meet >= 0:
+                    break
+            forward, next_forward = next_forward, forward
+            forward_count = count
+        else:
+            count = 0
+            for a in range(reverse_count):
+                v = fringes[reverse, a]
+                for k in range(indptr[v], indptr[v + 1]):
+                    if not alive[edge_of[k]]:
+                        continue
+                    w = indices[k]
+                    if succ[w] == UNVISITED:
+                        succ[w] = v
+                        fringes[next_reverse, count] = w
+                        count += 1
+                    if pred[w] != UNVISITED:
+                        meet = w
+                        break
+                if meet >= 0:
+                    break
+            reverse, next_reverse = next_reverse, reverse
+            reverse_count = count
+
+    if meet < 0:
+        return 0
+
+    # source ... meet from pred (collected backwards), then meet ... target from succ
+    length = 0
+    w = meet
+    while w != NONE:
+        path[length] = w
+        length += 1
+        w = pred[w]
+    for i in range(length // 2):
+        path[i], path[length - 1 - i] = path[length - 1 - i], path[i]
+    w = succ[meet]
+    while w != NONE:
+        path[length] = w
+        length += 1
+        w = succ[w]
+    return length
+
+
+@njit
+def consume_path(indptr, indices, edge_of, alive, path, length, consumed):
+    """
+    Consume the links along path[:length] (entanglement swapping), clearing alive[] for each of them.
+
+    Returns:
+    int: Number of edge ids written to `consumed`.
+    """
+    count = 0
+    for i in range(length - 1):
+        u = path[i]
+        v = path[i + 1]
+        for k in range(indptr[u], indptr[u + 1]):
+            if indices[k] == v and alive[edge_of[k]]:
+                alive[edge_of[k]] = False
+                consumed[count] = edge_of[k]
+                count += 1
+                break
+    return count
+
+
+class ArrayTopology:
+    """
+    CSR view of a NetworkX graph for the kernels.
+
+    Edges are numbered in G.edges() order and every node's adjacency lists its edges in that same order, which
+    is exactly the adjacency order of the entangled subgraph built by graph.get_entangled_subgraph. This is what
+    makes bidirectional_path pick the same path as nx.shortest_path.
+
+    Parameters:
+    G - Networkx graph G(V,E) whose topology does not change while the topology is in use
+    """
+
+    def __init__(self, G):
+        self.nodes = list(G.nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.edges = list(G.edges())
+        n = len(self.nodes)
+
+        neighbours = [[] for _ in range(n)]
+        for e, (u, v) in enumerate(self.edges):
+            iu, iv = self.index[u], self.index[v]
+            neighbours[iu].append((iv, e))
+            neighbours[iv].append((iu, e))
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum([len(adj) for adj in neighbours])
+        flat = [pair for adj in neighbours for pair in adj]
+        self.indices = np.array([w for w, _ in flat], dtype=np.int64)
+        self.edge_of = np.array([e for _, e in flat], dtype=np.int64)
+
+        self._edge_data = [d for _, _, d in G.edges(data=True)]  # G's own attribute dicts, in edge order
+        self.p_edge = np.array([d for _, _, d in G.edges(data="p_edge", default=0.0)], dtype=float)
+        self.Qc = np.array([d for _, _, d in G.edges(data="Qc", default=1)], dtype=np.int64)
+
+        # scratch buffers reused by every kernel call
+        self.pred = np.empty(n, dtype=np.int64)
+        self.succ = np.empty(n, dtype=np.int64)
+        self.fringes = np.empty((4, n), dtype=np.int64)
+        self.path = np.empty(n, dtype=np.int64)
+        self.consumed = np.empty(max(1, n), dtype=np.int64)
+
+    def entangled_mask(self, G):
+        """
+        Read the "entangled" edge attribute of G into a bool array (edge order of this topology).
+
+        G must be the graph the topology was built from: its edge attribute dicts are read directly, without
+        going through the edge view of G.
+        """
+        return np.fromiter((d["entangled"] for d in self._edge_data), dtype=bool, count=len(self._edge_data))
+
+    def live_edges(self, alive):
+        """Edges (u, v) currently holding a link, e.g. for tracing.TraceRecorder.record."""
+        return [self.edges[e] for e in np.flatnonzero(alive)]
+
+    def shortest_path(self, alive, source, target):
+        """Node indices of the shortest path over live links (empty array if none)."""
+        length = bidirectional_path(self.indptr, self.indices, self.edge_of, alive, source, target,
+                                    self.pred, self.succ, self.fringes, self.path)
+        return self.path[:length]
+
+    def consume(self, alive, path):
+        """Consume the links along `path` (node indices), returns the consumed edge ids."""
+        count = consume_path(self.indptr, self.indices, self.edge_of, alive, path, len(path), self.consumed)
+        return self.consumed[:count]
+
+
+@njit
+def advance_links(p_edge, Qc, alive, held, draws, t, head, next_key, prev_key, expiry):
+    """
+    One link-generation step on a timing wheel. Keys 0 .. E - 1 are edges, E + i the qubit of node i; each
+    scheduled key sits in the doubly linked list of bucket expiry % len(head) (head, next_key, prev_key).
+
+    Only the bucket of slot t is walked: links and qubits whose expiry has come decohere (alive / held cleared),
+    entries of a later round stay. Then every free edge generates a link when its uniform draw is below p_edge
+    and is scheduled to decohere at t + Qc. `draws` is supplied by the caller, so the step is reproducible and
+    the same draws can be reused (e.g. antithetic 1 - U).
+
+    Returns:
+    int: Number of new links.
+    """
+    size = head.shape[0]
+    num_edges = alive.shape[0]
+    slot = t % size
+    key = head[slot]
+    while key != NONE:
+        following = next_key[key]
+        if expiry[key] <= t:
+            if prev_key[key] == NONE:
+                head[slot] = following
+            else:
+                next_key[prev_key[key]] = following
+            if following != NONE:
+                prev_key[following] = prev_key[key]
+            expiry[key] = NONE
+            if key < num_edges:
+                alive[key] = False
+            else:
+                held[key - num_edges] = False
+        key = following
+
+    created = 0
+    for e in range(num_edges):
+        if draws[e] < p_edge[e] and not alive[e]:  # a free edge is never in the wheel
+            alive[e] = True
+            created += 1
+            due = max(t + Qc[e], t + 1)
+            expiry[e] = due
+            prev_key[e] = NONE
+            next_key[e] = head[due % size]
+            if next_key[e] != NONE:
+                prev_key[next_key[e]] = e
+            head[due % size] = e
+    return created
+
+
+@njit
+def cancel_keys(keys, count, head, next_key, prev_key, expiry):
+    """Take keys[:count] out of the timing wheel of advance_links (keys not scheduled are ignored)."""
+    size = head.shape[0]
+    for i in range(count):
+        key = keys[i]
+        if expiry[key] == NONE:
+            continue
+        if prev_key[key] == NONE:
+            head[expiry[key] % size] = next_key[key]
+        else:
+            next_key[prev_key[key]] = next_key[key]
+        if next_key[key] != NONE:
+            prev_key[next_key[key]] = prev_key[key]
+        expiry[key] = NONE
+
+
+@njit
+def schedule_key(key, due, head, next_key, prev_key, expiry):
+    """Put `key` into the timing wheel of advance_links to expire at timestep `due` (rescheduling it if needed)."""
+    size = head.shape[0]
+    if expiry[key] != NONE:
+        if prev_key[key] == NONE:
+            head[expiry[key] % size] = next_key[key]
+        else:
+            next_key[prev_key[key]] = next_key[key]
+        if next_key[key] != NONE:
+            prev_key[next_key[key]] = prev_key[key]
+    expiry[key] = due
+    prev_key[key] = NONE
+    next_key[key] = head[due % size]
+    if next_key[key] != NONE:
+        prev_key[next_key[key]] = key
+    head[due % size] = key
+
+
+class LinkState:
+    """
+    Link and memory state on an ArrayTopology, advanced one timestep at a time.
+
+    A link generated at timestep t decoheres at t + Qc of its edge and a qubit held at a node (hold) at t + Qc of
+    that node. Instead of ageing every edge each step, the expiries sit in a timing wheel bucketed by expiry slot
+    (advance_links): a step only visits the bucket of its own slot, so decoherence costs O(expiring links and
+    qubits) and consumed links leave the wheel in O(1) each. Given the same draws it reproduces per-edge ageing
+    against Qc exactly.
+
+    Parameters:
+    topology - ArrayTopology providing p_edge and Qc per edge
+    """
+
+    def __init__(self, topology):
+        self.topology = topology
+        num_edges, num_nodes = len(topology.edges), len(topology.nodes)
+        self.alive = np.zeros(num_edges, dtype=bool)
+        self.held = np.zeros(num_nodes, dtype=bool)  # node holds an entangled qubit
+        self.t = 0
+        size = int(topology.Qc.max()) + 1 if num_edges else 1  # no bucket holds links of two rounds
+        self.head = np.full(size, NONE, dtype=np.int64)
+        self.next_key = np.full(num_edges + num_nodes, NONE, dtype=np.int64)
+        self.prev_key = np.full(num_edges + num_nodes, NONE, dtype=np.int64)
+        self.expiry = np.full(num_edges + num_nodes, NONE, dtype=np.int64)
+
+    def step(self, draws):
+        """
+        Advance one timestep, see advance_links.
+
+        Returns:
+        int: Number of new links.
+        """
+        self.t += 1
+        return advance_links(self.topology.p_edge, self.topology.Qc, self.alive, self.held, draws, self.t,
+                             self.head, self.next_key, self.prev_key, self.expiry)
+
+    def consume(self, path):
+        """Consume the links along `path` (node indices), returns the consumed edge ids."""
+        consumed = self.topology.consume(self.alive, path)
+        cancel_keys(consumed, len(consumed), self.head, self.next_key, self.prev_key, self.expiry)
+        return consumed
+
+    def hold(self, node, Qc):
+        """Hold a qubit at `node` (index) until it decoheres Qc timesteps from now."""
+        if Qc > 0:
+            self.held[node] = True
+            schedule_key(len(self.alive) + node, self.t + Qc, self.head, self.next_key, self.prev_key,
+                         self.expiry)
+
+
+def compare_backends(graph_size=(4, 4), users=None, p=0.5, timesteps=200, reps=20, seed=42):
+    """
+    Run SP_protocol with the NetworkX and the array backend from the same seed and check the results agree.
+
+    Returns:
+    bool: True if rate, generation times and links used are identical.
+    """
+    import Initialisation
+    from simulation_NEW_1 import SP_protocol
+
+    results = []
+    for backend in ("networkx", "array"):
+        Initialisation.seed_rngs(seed)
+        G = Initialisation.initialize_quantum_network(*graph_size, p=p)
+        nodes = list(G.nodes)
+        request = users if users is not None else [nodes[len(nodes) // 2], nodes[0], nodes[-1], nodes[graph_size[1] - 1]]
+        results.append(SP_protocol(G, request, timesteps, reps, backend=backend))
+
+    (rate_a, times_a, links_a), (rate_b, times_b, links_b) = results
+    return rate_a == rate_b and np.array_equal(times_a, times_b) and links_a == links_b
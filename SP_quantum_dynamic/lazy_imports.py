@@ -0,0 +1,40 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    Return module `name` without executing it until one of its attributes is first used.
+
+    Importing NetworkX, NumPy or matplotlib costs far more than the simulation modules themselves, and a
+    short-lived pool worker often never touches some of them. The returned module is registered in
+    sys.modules straight away, so a later plain `import name` hands back the same (lazy) object.
+
+    Parameters:
+    name (str): Fully qualified module name, e.g. "networkx".
+
+    Returns:
+    module: The (possibly not yet executed) module object.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)  # only installs the lazy hook, the module body runs on first attribute access
+    return module
+
+
+def is_loaded(name):
+    """Return True if module `name` has actually been executed (not just registered lazily)."""
+    module = sys.modules.get(name)
+    if module is None:
+        return False
+    # LazyLoader swaps the module class back to ModuleType once the real module body has run
+    return not isinstance(module, importlib.util._LazyModule)
@@ -0,0 +1,137 @@
+import math
+
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+
+class StreamingHistogram:
+    """
+    Constant-memory histogram with log-spaced buckets (HDR-histogram style) for streaming quantiles.
+
+    Every value in [min_value, max_value] falls into a bucket whose width is at most 2 * relative_error of the
+    value, so any quantile is reported within `relative_error` of the true sample quantile. Values below
+    min_value (e.g. 0) are counted in a separate zero bucket. Histograms with the same parameters merge by
+    adding their counts, so per-worker histograms can be combined into one.
+
+    Parameters:
+    relative_error (float): Maximum relative error of the reported quantiles.
+    min_value (float): Smallest value resolved (smaller values count as 0).
+    max_value (float): Largest value resolved (larger values are clamped into the last bucket).
+    """
+
+    def __init__(self, relative_error=0.01, min_value=1e-3, max_value=1e9):
+        self.relative_error = relative_error
+        self.min_value = min_value
+        self.max_value = max_value
+        self._gamma = (1 + relative_error) / (1 - relative_error)
+        self._log_gamma = math.log(self._gamma)
+        self._size = int(math.ceil(math.log(max_value / min_value) / self._log_gamma)) + 1
+        self.counts = np.zeros(self._size, dtype=np.int64)
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value):
+        return min(self._size - 1, int(math.log(value / self.min_value) / self._log_gamma))
+
+    def add(self, value):
+        """Record one value."""
+        value = float(value)
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value < self.min_value:
+            self.zero_count += 1
+        else:
+            self.counts[self._index(value)] += 1
+
+    def add_many(self, values):
+        """Record an array of values with one vectorised bucket assignment."""
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return
+        self.count += values.size
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        small = values < self.min_value
+        self.zero_count += int(small.sum())
+        index = np.log(values[~small] / self.min_value) / self._log_gamma
+        index = np.minimum(index.astype(np.int64), self._size - 1)
+        self.counts += np.bincount(index, minlength=self._size)
+
+    def merge(self, other):
+        """Add the counts of another histogram with the same parameters (in place), returns self."""
+        if (other.relative_error, other.min_value, other.max_value) != (
+                self.relative_error, self.min_value, self.max_value):
+            raise ValueError("Only histograms with the same parameters can be merged")
+        self.counts += other.counts
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Value below which a fraction q of the recorded values lie (nan if empty)."""
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        cumulative = np.cumsum(self.counts) + self.zero_count
+        index = int(np.searchsorted(cumulative, rank, side="right"))
+        # geometric centre of the bucket, clamped to the observed range
+        lower = self.min_value * self._gamma ** index
+        value = 2 * lower * self._gamma / (1 + self._gamma)
+        return min(max(value, self.min), self.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+    def summary(self, quantiles=(0.5, 0.95, 0.99)):
+        """dict with count, mean and p50/p95/p99 (or the requested quantiles)."""
+        result = {"count": self.count, "mean": self.mean()}
+        for q in quantiles:
+            result[f"p{round(q * 100):d}"] = self.quantile(q)
+        return result
+
+    def to_dict(self):
+        """JSON-friendly representation (sparse counts), e.g. to send a worker's histogram to the coordinator."""
+        nonzero = np.flatnonzero(self.counts)
+        return {
+            "relative_error": self.relative_error, "min_value": self.min_value, "max_value": self.max_value,
+            "buckets": {int(i): int(self.counts[i]) for i in nonzero}, "zero_count": self.zero_count,
+            "count": self.count, "total": self.total,
+            "min": self.min if self.count else None, "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data["relative_error"], data["min_value"], data["max_value"])
+        for index, count in data["buckets"].items():
+            histogram.counts[int(index)] = count
+        histogram.zero_count = data["zero_count"]
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        if data["count"]:
+            histogram.min = data["min"]
+            histogram.max = data["max"]
+        return histogram
+
+
+def merge_histograms(histograms):
+    """Merge an iterable of StreamingHistogram (or their to_dict() forms) into a new histogram."""
+    merged = None
+    for histogram in histograms:
+        if isinstance(histogram, dict):
+            histogram = StreamingHistogram.from_dict(histogram)
+        if merged is None:
+            merged = StreamingHistogram(histogram.relative_error, histogram.min_value, histogram.max_value)
+        merged.merge(histogram)
+    return merged
@@ -0,0 +1,173 @@
+import math
+
+from kernels import ArrayTopology, LinkState
+from lazy_imports import lazy_import
+from simulation_NEW_1 import _get_star
+
+np = lazy_import("numpy")
+
+REDUCTIONS = ("none", "antithetic", "control", "both")
+
+
+def truncated_geometric_mean(q, timesteps):
+    """E[min(Y, timesteps)] for Y ~ Geometric(q) on {1, 2, ...}: sum over t < timesteps of (1 - q)^t."""
+    if q <= 0:
+        return float(timesteps)
+    return (1 - (1 - q) ** timesteps) / q
+
+
+class _Twin:
+    """Link and memory state of one repetition, advanced one timestep at a time."""
+
+    def __init__(self, topology, destinations, node_Qc):
+        self.topology = topology
+        self.destinations = destinations
+        self.node_Qc = node_Qc
+        self.links = LinkState(topology)  # links and destination qubits, expired through its timing wheel
+        self.gen_time = -1
+        self.control_time = -1
+
+    def step(self, t, draws, source, control_edges, control_p):
+        if self.control_time < 0 and np.all(draws[control_edges] < control_p):
+            self.control_time = t
+        if self.gen_time > 0:
+            return  # finished, only the control is still running
+
+        links = self.links
+        links.step(draws)
+        for d in self.destinations:
+            if not links.held[d]:  # no qubit held (or it decohered at t)
+                path = self.topology.shortest_path(links.alive, source, d)
+                if len(path):
+                    links.consume(path)
+                    links.hold(d, self.node_Qc[d])
+        if all(links.held[d] for d in self.destinations):
+            self.gen_time = t
+
+
+def estimate_rate(G, users, timesteps, precision=0.05, batch_size=16, min_batches=10, max_reps=100000,
+                  reduction="both", router=None, seed=None, z=1.96):
+    """
+    Estimate the SP protocol's entanglement rate to a requested relative precision with variance reduction.
+
+    Repetitions run on the array kernels (kernels.py) over the star (or router) graph of `users`, in
+    antithetic pairs: the twin of a repetition sees the link-generation uniforms 1 - U of the first one. As a
+    control variate each repetition also records the first timestep in which every link of the star is
+    generated; this is the analytical success time of a star whose links last one timestep, truncated-geometric
+    with known mean (1 - (1 - q)^timesteps) / q, q = product of p_edge over the star. Pairs are grouped into batches, the
+    successes and time of each batch are regressed on its control mean, and the run stops once the confidence
+    interval from the batch means is within `precision` of the estimate (relative).
+
+    Links decohere after Qc timesteps and destination qubits Qc timesteps after they were entangled, both
+    expired through the timing wheel of kernels.LinkState.
+
+    Parameters:
+    G (nx.Graph): Quantum network (see Initialisation.initialize_quantum_network).
+    users (list): users[0] is the centre of the star.
+    timesteps (int): Timeout of one repetition.
+    precision (float): Target relative half-width of the confidence interval.
+    batch_size (int): Repetition pairs per batch.
+    min_batches (int): Batches before the stopping rule is checked.
+    max_reps (int): Upper limit on repetitions.
+    reduction (str): "none", "antithetic", "control" or "both", to compare against plain averaging.
+    router (GHZRouter): Optional router for the star/Steiner graph, _get_star otherwise.
+    seed (int): Seed of the estimator's own NumPy generator.
+    z (float): Normal quantile of the interval.
+
+    Returns:
+    dict: rate, lower, upper, half_width, reps, converged, mean_gen_time (successful repetitions),
+          success_prob and control_mean (the known mean of the control).
+    """
+    if reduction not in REDUCTIONS:
+        raise ValueError(f"Unknown reduction {reduction!r}, expected one of {REDUCTIONS}")
+    antithetic = reduction in ("antithetic", "both")
+    control = reduction in ("control", "both")
+    rng = np.random.default_rng(seed)
+
+    J = router.route_graph(users) if router is not None else _get_star(G, users)
+    topology = ArrayTopology(J)
+    source = topology.index[users[0]]
+    destinations = [topology.index[u] for u in users[1:]]
+    node_Qc = {topology.index[u]: int(J.nodes[u].get("Qc", 1)) for u in users[1:]}
+
+    control_edges = np.arange(len(topology.edges))  # every link of the star / tree
+    control_p = topology.p_edge[control_edges]
+    control_mean = truncated_geometric_mean(float(np.prod(control_p)), timesteps)
+
+    twins_per_unit = 2 if antithetic else 1
+    batch_successes_list, batch_times, batch_controls = [], [], []
+    successes = 0
+    gen_time_total = 0.0
+    reps = 0
+    estimate, half_width, converged = 0.0, math.inf, False
+
+    while reps < max_reps:
+        batch_successes, batch_time, batch_control = 0, 0.0, 0.0
+        for _ in range(batch_size):
+            twins = [_Twin(topology, destinations, node_Qc) for _ in range(twins_per_unit)]
+            t = 0
+            while t < timesteps and any(twin.gen_time < 0 for twin in twins):
+                t += 1
+                draws = rng.random(len(topology.edges))
+                for k, twin in enumerate(twins):
+                    twin.step(t, draws if k == 0 else 1 - draws, source, control_edges, control_p)
+            for twin in twins:
+                # the control may still be running once the GHZ states are ready: finish it with fresh draws
+                u = t
+                while twin.control_time < 0 and u < timesteps:
+                    u += 1
+                    if np.all(rng.random(len(control_edges)) < control_p):
+                        twin.control_time = u
+                success = twin.gen_time > 0
+                batch_successes += success
+                batch_time += twin.gen_time if success else timesteps
+                batch_control += twin.control_time if twin.control_time > 0 else timesteps
+                gen_time_total += twin.gen_time if success else 0
+            reps += twins_per_unit
+
+        successes += batch_successes
+        batch_successes_list.append(batch_successes)
+        batch_times.append(batch_time)
+        batch_controls.append(batch_control / (batch_size * twins_per_unit))
+
+        estimate, half_width = _ratio_estimate(batch_successes_list, batch_times, batch_controls, control_mean,
+                                               control, z)
+        if len(batch_times) >= min_batches and estimate > 0 and half_width <= precision * estimate:
+            converged = True
+            break
+
+    return {
+        "rate": estimate,
+        "lower": max(0.0, estimate - half_width),
+        "upper": estimate + half_width,
+        "half_width": half_width,
+        "reps": reps,
+        "converged": converged,
+        "mean_gen_time": gen_time_total / successes if successes else math.nan,
+        "success_prob": successes / reps if reps else 0.0,
+        "control_mean": control_mean,
+    }
+
+
+def _ratio_estimate(successes, times, controls, control_mean, use_control, z):
+    """
+    Rate successes / time over all batches and the half-width of its confidence interval.
+
+    A ratio of totals, not a mean of per-batch ratios (which is biased for small batches). With the control,
+    both totals are adjusted by their regression on the batch control means; the interval comes from the batch
+    residuals successes - rate * time (delta method).
+    """
+    successes = np.asarray(successes, dtype=float)
+    times = np.asarray(times, dtype=float)
+    n = len(times)
+    if use_control and n > 2:
+        controls = np.asarray(controls) - control_mean
+        variance = controls.var(ddof=1)
+        if variance > 0:
+            successes = successes - np.cov(successes, controls)[0, 1] / variance * controls
+            times = times - np.cov(times, controls)[0, 1] / variance * controls
+    rate = successes.mean() / times.mean()
+    if n < 2:
+        return float(rate), math.inf
+    residuals = successes - rate * times
+    return float(rate), z * float(residuals.std(ddof=1)) / (math.sqrt(n) * times.mean())
@@ -0,0 +1,177 @@
+import argparse
+import csv
+import heapq
+
+import Initialisation
+from lazy_imports import lazy_import
+from routing import GHZRouter
+from simulation_NEW_1 import SP_protocol, MAX_CONCURRENT_REQUESTS, calculate_blocking_rate, release_resources
+
+np = lazy_import("numpy")
+
+MAX_LOG_USERS = 8  # users per request stored in the binary log (padded with -1)
+CHUNK = 65536  # requests converted to Python values at a time
+
+
+def request_dtype():
+    """Record layout of the binary request log: arrival time, centre, other users (-1 padded), holding time."""
+    return np.dtype([("time", "f8"), ("centre", "i4"), ("users", "i4", (MAX_LOG_USERS,)), ("holding", "f8")])
+
+
+def _csv_requests(f):
+    """Data rows of a CSV request log: the header and blank lines (e.g. a trailing newline) are skipped."""
+    rows = (row for row in csv.reader(f) if any(field.strip() for field in row))
+    next(rows, None)
+    return rows
+
+
+def convert_csv_log(csv_path, npy_path, chunk=CHUNK):
+    """
+    Convert a CSV request log to a binary .npy log that replay_simulation can memory-map.
+
+    The CSV has a header and columns timestamp, centre, users, holding_time. Nodes are grid indices
+    row * columns + column, and users is a ';'-separated list of the other users of the request.
+    The file is converted in chunks, so logs larger than memory are fine. Blank lines are ignored.
+
+    Returns:
+    int: Number of requests written.
+    """
+    with open(csv_path, newline="") as f:
+        count = sum(1 for _ in _csv_requests(f))
+
+    log = np.lib.format.open_memmap(npy_path, mode="w+", dtype=request_dtype(), shape=(count,))
+    buffer = np.zeros(chunk, dtype=request_dtype())
+    with open(csv_path, newline="") as f:
+        position = 0
+        filled = 0
+        for row in _csv_requests(f):
+            record = buffer[filled]
+            record["time"] = float(row[0])
+            record["centre"] = int(row[1])
+            users = [int(u) for u in row[2].split(";") if u]
+            if len(users) > MAX_LOG_USERS:
+                raise ValueError(f"Request with {len(users)} users, at most {MAX_LOG_USERS} supported")
+            record["users"] = users + [-1] * (MAX_LOG_USERS - len(users))
+            record["holding"] = float(row[3])
+            filled += 1
+            if filled == chunk:
+                log[position:position + filled] = buffer
+                position += filled
+                filled = 0
+        log[position:position + filled] = buffer[:filled]
+    log.flush()
+    return count
+
+
+def open_log(path):
+    """Memory-map a binary request log (a CSV log is converted to <path>.npy first)."""
+    if path.endswith(".csv"):
+        npy_path = path[:-4] + ".npy"
+        convert_csv_log(path, npy_path)
+        path = npy_path
+    return np.load(path, mmap_mode="r")
+
+
+def replay_simulation(log_path, graph_size=(3, 3), entanglement_prob=0.1, window=100.0, timesteps=1000,
+                      routing=None, max_requests=None, seed=None):
+    """
+    Drive the dynamic operation from a recorded request log instead of synthetic arrivals, as fast as possible.
+
+    Requests are read from the memory-mapped log in chunks, so tens of millions of requests never live in
+    memory at once. Each request is admitted under the same rules as dynamic_simulation (its users must be
+    free, at most MAX_CONCURRENT_REQUESTS active, SP_protocol must succeed within `timesteps`) and holds its
+    users for its recorded holding time. Departures are kept in a heap, and busy users in a set.
+
+    Parameters:
+        log_path (str): Binary (.npy) or CSV request log, see convert_csv_log.
+        graph_size (tuple): Dimensions of the quantum network grid (rows, cols).
+        entanglement_prob (float): Link generation probability p.
+        window (float): Length of the reporting windows, in log time units.
+        timesteps (int): SP_protocol timeout.
+        routing (str): Router mode for SP_protocol ("star"/"steiner"), None for _get_star.
+        max_requests (int): Stop after this many requests (None replays the whole log).
+        seed (int): Seed for Initialisation.seed_rngs.
+
+    Returns:
+        list: One dict per window: start, requests, successful, blocking_rate, mean_gen_time, max_gen_time.
+    """
+    if seed is not None:
+        Initialisation.seed_rngs(seed)
+
+    rows, columns = graph_size
+    G = Initialisation.initialize_quantum_network(rows, columns, p=entanglement_prob)
+    node_table = [(i // columns, i % columns) for i in range(rows * columns)]  # grid index -> node
+    router = GHZRouter(G, mode=routing) if routing is not None else None
+
+    log = open_log(log_path)
+    total = len(log) if max_requests is None else min(len(log), max_requests)
+
+    departures = []  # heap of (departure time, sequence number, users)
+    busy = set()
+    windows = []
+    current = None
+    sequence = 0
+
+    for start in range(0, total, CHUNK):
+        block = log[start:min(start + CHUNK, total)]
+        # one conversion per chunk instead of per-request NumPy scalar objects
+        times = block["time"].tolist()
+        centres = block["centre"].tolist()
+        user_rows = block["users"].tolist()
+        holdings = block["holding"].tolist()
+
+        for t, centre, user_row, holding in zip(times, centres, user_rows, holdings):
+            while departures and departures[0][0] <= t:
+                _, _, users = heapq.heappop(departures)
+                busy.difference_update(users)
+                release_resources(G, users)
+
+            window_start = (t // window) * window
+            if current is None or current["start"] != window_start:
+                if current is not None:
+                    windows.append(_close_window(current))
+                current = {"start": window_start, "requests": 0, "successful": 0, "gen_time_sum": 0.0,
+                           "max_gen_time": 0.0}
+            current["requests"] += 1
+
+            users = [node_table[centre]] + [node_table[u] for u in user_row if u >= 0]
+            if any(node in busy for node in users) or len(departures) >= MAX_CONCURRENT_REQUESTS:
+                continue
+
+            _, gen_time, _ = SP_protocol(G, users, timesteps=timesteps, reps=1, router=router)
+            gen_time = float(gen_time[0])
+            if gen_time > 0:
+                current["successful"] += 1
+                current["gen_time_sum"] += gen_time
+                current["max_gen_time"] = max(current["max_gen_time"], gen_time)
+                busy.update(users)
+                sequence += 1
+                heapq.heappush(departures, (t + holding, sequence, users))
+
+    if current is not None:
+        windows.append(_close_window(current))
+    return windows
+
+
+def _close_window(window):
+    successful = window.pop("successful")
+    gen_time_sum = window.pop("gen_time_sum")
+    window["successful"] = successful
+    window["blocking_rate"] = calculate_blocking_rate(window["requests"], successful)
+    window["mean_gen_time"] = gen_time_sum / successful if successful else 0.0
+    return window
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded request log through the dynamic operation")
+    parser.add_argument("log", help="request log (.npy or .csv)")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--columns", type=int, default=3)
+    parser.add_argument("--p", type=float, default=0.1, help="entanglement probability")
+    parser.add_argument("--window", type=float, default=100.0, help="reporting window length")
+    args = parser.parse_args()
+
+    Initialisation.seed_rngs()
+    for w in replay_simulation(args.log, (args.rows, args.columns), args.p, args.window):
+        print(f"t={w['start']:10.1f}  requests={w['requests']:8d}  blocking={w['blocking_rate']:.3f}  "
+              f"mean_gen_time={w['mean_gen_time']:.2f}  max_gen_time={w['max_gen_time']:.0f}")
@@ -0,0 +1,310 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import zlib
+from contextlib import contextmanager
+
+import Initialisation
+from Initialisation import RANDOM_SEED, initialize_quantum_network
+from lazy_imports import lazy_import
+from rate_estimation import estimate_rate
+from result_cache import code_version, sim_version
+from routing import GHZRouter
+from simulation_NEW_1 import SP_protocol, _get_star, dynamic_simulation
+
+np = lazy_import("numpy")
+
+# next to this module, so the CLI and the tests use the same committed file from any working directory
+DEFAULT_GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "outputs.json")
+
+# Configuration matrix: "protocol" runs one SP_protocol call (generation times and usage fractions),
+# "dynamic" runs dynamic_simulation with detailed_stats (blocking counts and quantiles). Both need the external
+# sim module. The kinds in IN_TREE_KINDS run on this tree alone: "route" records the routes of random requests
+# (_get_star, or a GHZRouter if "routing" is given), "rate" runs rate_estimation.estimate_rate on the array
+# link state and "scale" runs dynamic_simulation(mode="scale").
+IN_TREE_KINDS = ("route", "rate", "scale")
+CONFIGURATIONS = {
+    "protocol-3x3-p0.5": {"kind": "protocol", "graph_size": (3, 3), "p": 0.5, "Qc": 1, "timesteps": 200, "reps": 50},
+    "protocol-4x4-p0.3-Qc3": {"kind": "protocol", "graph_size": (4, 4), "p": 0.3, "Qc": 3, "timesteps": 200,
+                              "reps": 50},
+    "protocol-5x5-p0.8": {"kind": "protocol", "graph_size": (5, 5), "p": 0.8, "Qc": 1, "timesteps": 100, "reps": 50},
+    "dynamic-3x3-light": {"kind": "dynamic", "graph_size": (3, 3), "entanglement_prob": 0.5,
+                          "mean_interarrival": 10.0, "mean_service": 3.0, "max_requests": 200},
+    "dynamic-4x4-heavy": {"kind": "dynamic", "graph_size": (4, 4), "entanglement_prob": 0.3,
+                          "mean_interarrival": 2.0, "mean_service": 3.0, "max_requests": 200},
+    "dynamic-4x4-Qc2-loss": {"kind": "dynamic", "graph_size": (4, 4), "entanglement_prob": 0.6, "Qc": 2,
+                             "loss_dB": 0.5, "mean_interarrival": 5.0, "mean_service": 3.0, "max_requests": 200},
+    "route-6x6-get_star": {"kind": "route", "graph_size": (6, 6), "routing": None, "requests": 30},
+    "route-6x6-star": {"kind": "route", "graph_size": (6, 6), "routing": "star", "requests": 30},
+    "route-6x6-steiner": {"kind": "route", "graph_size": (6, 6), "routing": "steiner", "requests": 30},
+    "rate-4x4-p0.5-Qc2": {"kind": "rate", "graph_size": (4, 4), "p": 0.5, "Qc": 2, "timesteps": 100,
+                          "max_reps": 640},
+    "scale-20x20": {"kind": "scale", "graph_size": (20, 20), "entanglement_prob": 0.5, "Qc": 2,
+                    "mean_interarrival": 2.0, "mean_service": 3.0, "max_requests": 500},
+}
+
+# Engines under test: keyword arguments added to every sim-dependent run (the in-tree kinds have one engine).
+# "reference" produces the golden outputs.
+ENGINES = {
+    "reference": {},
+    "array": {"backend": "array"},
+}
+
+# Outputs compared as proportions in statistical mode: key -> key of the number of trials
+PROPORTIONS = {
+    "successful_requests": "total_requests",
+    "blocked_busy_nodes": "total_requests",
+    "blocked_capacity": "total_requests",
+    "blocked_protocol": "total_requests",
+}
+
+
+def config_seed(name, base_seed=RANDOM_SEED):
+    """Seed of a configuration, derived from its name so it does not depend on run order or process."""
+    return (base_seed * 1000003 + zlib.crc32(name.encode())) % 2 ** 32
+
+
+@contextmanager
+def pinned_rngs(seed):
+    """
+    Seed every RNG stream the simulation reads (random, np.random, traffic's default generator through
+    np.random) and the module state dynamic_simulation sets, and restore all of it on exit.
+
+    Parameters:
+    seed (int): Seed passed to Initialisation.seed_rngs.
+    """
+    saved = random.getstate(), np.random.get_state(), Initialisation.mean_interarrival
+    Initialisation.seed_rngs(seed)
+    try:
+        yield
+    finally:
+        random.setstate(saved[0])
+        np.random.set_state(saved[1])
+        Initialisation.mean_interarrival = saved[2]
+
+
+def run_configuration(name, config, engine="reference", base_seed=RANDOM_SEED):
+    """
+    Run one configuration with pinned RNGs.
+
+    Parameters:
+    name (str): Configuration name (its seed is derived from it).
+    config (dict): Entry of CONFIGURATIONS.
+    engine (str or dict): Name in ENGINES or the keyword arguments themselves.
+
+    Returns:
+    dict: JSON-compatible outputs.
+    """
+    options = ENGINES[engine] if isinstance(engine, str) else dict(engine)
+    seed = config_seed(name, base_seed)
+    with pinned_rngs(seed):
+        if config["kind"] == "route":
+            G = initialize_quantum_network(*config["graph_size"])
+            nodes = list(G.nodes)
+            router = GHZRouter(G, config["routing"]) if config["routing"] is not None else None
+            routes = []
+            for _ in range(config["requests"]):
+                users = random.sample(nodes, random.randint(3, 4))
+                J = router.route_graph(users) if router is not None else _get_star(G, users)
+                routes.append(sorted(sorted([list(u), list(v)]) for u, v in J.edges()))
+            return {"routes": routes}
+        if config["kind"] == "rate":
+            rows, cols = config["graph_size"]
+            G = initialize_quantum_network(rows, cols, p=config["p"], Qc=config["Qc"])
+            nodes = list(G.nodes)
+            users = [nodes[len(nodes) // 2], nodes[0], nodes[-1], nodes[cols - 1]]
+            result = estimate_rate(G, users, config["timesteps"], precision=0.0, max_reps=config["max_reps"],
+                                   seed=seed)
+            return {key: result[key] for key in ("rate", "half_width", "reps", "success_prob", "mean_gen_time")}
+        if config["kind"] == "scale":
+            params = {k: v for k, v in config.items() if k != "kind"}
+            stats = dynamic_simulation(mode="scale", **params)
+            return {key: stats[key] for key in ("total_requests", "successful_requests", "events", "sim_time")}
+        if config["kind"] == "protocol":
+            rows, cols = config["graph_size"]
+            G = initialize_quantum_network(rows, cols, p=config["p"], Qc=config.get("Qc", 1))
+            nodes = list(G.nodes)
+            users = [nodes[len(nodes) // 2], nodes[0], nodes[-1], nodes[cols - 1]]  # centre and three corners
+            rate, gen_times, links_used = SP_protocol(G, users, config["timesteps"], config["reps"], **options)
+            return {
+                "rate": float(rate),
+                "gen_times": [int(t) for t in gen_times],
+                "avg_links_used": float(links_used),
+                "usage_fraction": [float(G.nodes[n]["usage_fraction"]) for n in nodes],
+                "reps": config["reps"],
+            }
+        params = {k: v for k, v in config.items() if k != "kind"}
+        stats = dynamic_simulation(detailed_stats=True, **params, **options)
+        return {key: stats[key] for key in ("total_requests", "successful_requests", "blocked_busy_nodes",
+                                            "blocked_capacity", "blocked_protocol", "sim_time", "quantiles")}
+
+
+def _run_task(task):
+    return run_configuration(*task)
+
+
+def in_tree(name):
+    """True if configuration `name` runs without the external sim module."""
+    return CONFIGURATIONS[name]["kind"] in IN_TREE_KINDS
+
+
+def run_matrix(configurations=None, engine="reference", processes=1, base_seed=RANDOM_SEED):
+    """
+    Run every configuration, in this process (processes=1) or on a process pool. Each run pins its own
+    streams, so the outputs do not depend on the number of processes or the order of the runs.
+
+    Returns:
+    dict: {configuration name: outputs}
+    """
+    configurations = configurations or CONFIGURATIONS
+    tasks = [(name, config, engine, base_seed) for name, config in configurations.items()]
+    if processes == 1:
+        results = [_run_task(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_run_task, tasks)
+    return dict(zip(configurations, results))
+
+
+def environment():
+    """Versions a golden file was produced with, to tell code changes from library and sim changes."""
+    return {"code_version": code_version(), "sim": sim_version(), "python": platform.python_version(),
+            "numpy": np.__version__}
+
+
+def save_golden(path=DEFAULT_GOLDEN_PATH, configurations=None, processes=1, base_seed=RANDOM_SEED):
+    """Run the matrix with the reference engine and write the outputs as the golden file."""
+    golden = {"environment": environment(), "base_seed": base_seed,
+              "outputs": run_matrix(configurations, "reference", processes, base_seed)}
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(golden, f, indent=1, sort_keys=True)
+    return golden
+
+
+def load_golden(path=DEFAULT_GOLDEN_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(expected, actual, tolerance="exact", z=4.0):
+    """
+    Compare the outputs of one configuration.
+
+    In "exact" mode every value must be identical (compared in their JSON form, in which floats round-trip
+    exactly and NaN quantiles of empty histograms compare equal). In "statistical" mode,
+    for engines that draw their random numbers differently, only what can be tested against sampling noise is
+    compared: blocking counts as proportions of total_requests and usage fractions as proportions of reps
+    (two-proportion z-tests), generation times by success fraction and mean of the successful repetitions
+    (Welch z-test). A difference beyond `z` standard errors is a mismatch.
+
+    Returns:
+    list: Mismatch descriptions, empty if the outputs agree.
+    """
+    if tolerance == "exact":
+        return [f"{key}: expected {expected[key]!r}, got {actual.get(key)!r}"
+                for key in expected if _canonical(actual.get(key)) != _canonical(expected[key])]
+    if tolerance != "statistical":
+        raise ValueError(f"Unknown tolerance {tolerance!r}, expected 'exact' or 'statistical'")
+
+    mismatches = []
+    for key, trials in PROPORTIONS.items():
+        if key in expected:
+            score = _proportion_z(expected[key], expected[trials], actual[key], actual[trials])
+            if score > z:
+                mismatches.append(f"{key}: {expected[key]}/{expected[trials]} vs {actual[key]}/{actual[trials]} "
+                                  f"({score:.1f} standard errors)")
+    if "gen_times" in expected:
+        old, new = np.asarray(expected["gen_times"]), np.asarray(actual["gen_times"])
+        score = _proportion_z(int((old > 0).sum()), len(old), int((new > 0).sum()), len(new))
+        if score > z:
+            mismatches.append(f"gen_times success fraction differs by {score:.1f} standard errors")
+        old, new = old[old > 0], new[new > 0]
+        if len(old) > 1 and len(new) > 1:
+            error = math.sqrt(old.var(ddof=1) / len(old) + new.var(ddof=1) / len(new))
+            if abs(old.mean() - new.mean()) > z * error + 1e-12:
+                mismatches.append(f"gen_times mean {old.mean():.3f} vs {new.mean():.3f}")
+    if "usage_fraction" in expected:
+        reps = expected["reps"]
+        for i, (a, b) in enumerate(zip(expected["usage_fraction"], actual["usage_fraction"])):
+            if a <= 1 and b <= 1:  # a fraction of repetitions
+                score = _proportion_z(a * reps, reps, b * actual["reps"], actual["reps"])
+                if score > z:
+                    mismatches.append(f"usage_fraction of node {i}: {a:.3f} vs {b:.3f}")
+    return mismatches
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True)
+
+
+def _proportion_z(successes_a, trials_a, successes_b, trials_b):
+    """Two-proportion z statistic (0 if both proportions are 0 or 1)."""
+    if not trials_a or not trials_b:
+        return 0.0
+    pooled = (successes_a + successes_b) / (trials_a + trials_b)
+    error = math.sqrt(pooled * (1 - pooled) * (1 / trials_a + 1 / trials_b))
+    difference = abs(successes_a / trials_a - successes_b / trials_b)
+    return difference / error if error > 0 else (math.inf if difference > 1e-12 else 0.0)
+
+
+def check_engine(engine="reference", path=DEFAULT_GOLDEN_PATH, tolerance="exact", processes=1, z=4.0,
+                 names=None):
+    """
+    Run the golden configurations with `engine` and compare them to the golden file.
+
+    Parameters:
+    names (list): Only check these configurations (e.g. the in-tree ones), defaults to all in the golden file.
+
+    Returns:
+    dict: {configuration name: mismatches}, only configurations that do not match.
+    """
+    golden = load_golden(path)
+    configurations = {name: CONFIGURATIONS[name] for name in golden["outputs"]
+                      if name in CONFIGURATIONS and (names is None or name in names)}
+    outputs = run_matrix(configurations, engine, processes, golden["base_seed"])
+    failures = {}
+    for name, actual in outputs.items():
+        mismatches = compare(golden["outputs"][name], actual, tolerance, z)
+        if mismatches:
+            failures[name] = mismatches
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Golden-output regression check of the simulation engines")
+    parser.add_argument("--update", action="store_true", help="regenerate the golden file with the reference engine")
+    parser.add_argument("--engine", action="append", choices=sorted(ENGINES),
+                        help="engine to check (repeatable), defaults to all")
+    parser.add_argument("--tolerance", choices=("exact", "statistical"), default="exact")
+    parser.add_argument("--processes", type=int, default=1, help="run the configurations on a process pool")
+    parser.add_argument("--golden", default=DEFAULT_GOLDEN_PATH)
+    args = parser.parse_args()
+
+    if args.update:
+        golden = save_golden(args.golden, processes=args.processes)
+        print(f"Wrote {len(golden['outputs'])} golden outputs to {args.golden}")
+        sys.exit(0)
+
+    recorded = load_golden(args.golden)["environment"]
+    if recorded != environment():
+        print(f"Note: golden outputs were produced with {recorded}, this is {environment()}")
+    names = None
+    if sim_version() == "missing":
+        names = [name for name in CONFIGURATIONS if in_tree(name)]
+        print("Note: sim is not installed, only the in-tree configurations are checked")
+    failed = False
+    for engine in args.engine or sorted(ENGINES):
+        failures = check_engine(engine, args.golden, args.tolerance, args.processes, names=names)
+        print(f"{engine}: {'OK' if not failures else 'MISMATCH'}")
+        for name, mismatches in failures.items():
+            failed = True
+            for mismatch in mismatches:
+                print(f"  {name}: {mismatch}")
+    sys.exit(1 if failed else 0)
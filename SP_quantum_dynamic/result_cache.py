@@ -0,0 +1,214 @@
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+from Initialisation import RANDOM_SEED
+from simulation_NEW_1 import dynamic_simulation
+
+# Source files whose contents define the simulation results; editing any of them invalidates the cache.
+# The external entanglement physics (module `sim`) is hashed from wherever it is installed, see sim_version.
+CODE_FILES = ("simulation_NEW_1.py", "graph.py", "Initialisation.py", "routing.py", "kernels.py",
+              "traffic.py", "implicit_grid.py", "blocking_estimator.py", "rate_estimation.py", "quantiles.py",
+              "shared_topology.py")
+DEFAULT_CACHE_PATH = os.path.join("results", "cache.sqlite")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Arguments that change what is simulated, all of them enter the key
+KEY_PARAMETERS = ("graph_size", "mean_interarrival", "mean_service", "max_requests", "entanglement_prob", "routing",
+                  "Qc", "loss_dB", "mode", "backend", "arrivals", "user_selector")
+DEFAULTS = {"graph_size": (3, 3), "mean_interarrival": 10.0, "mean_service": 3.0, "max_requests": 100,
+            "entanglement_prob": 0.1, "routing": None, "Qc": 1, "loss_dB": None, "mode": "simulate",
+            "backend": "networkx", "arrivals": None, "user_selector": None}
+# Arguments that do not change the results (observers, and the shared topology the graph is built from)
+IGNORED_PARAMETERS = ("tracer", "telemetry", "topology")
+# Stateful objects (RNG state, callables) have no content address, runs using them are not cacheable
+UNCACHEABLE_PARAMETERS = ("arrivals", "user_selector")
+
+_code_version = None
+_sim_version = None
+_worker_cache = None  # ResultCache of a pool worker, opened by init_pool_worker
+
+
+def code_version():
+    """Hash of the simulation source files and of the installed sim module (computed once per process)."""
+    global _code_version
+    if _code_version is None:
+        here = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256()
+        for name in CODE_FILES:
+            path = os.path.join(here, name)
+            if os.path.exists(path):
+                digest.update(name.encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+        digest.update(sim_version().encode())
+        _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+
+def sim_version():
+    """
+    Hash of the source of the external `sim` module (every .py file if it is a package), located with
+    importlib without importing it. "missing" if sim is not installed.
+    """
+    global _sim_version
+    if _sim_version is None:
+        spec = importlib.util.find_spec("sim")
+        if spec is None or spec.origin is None:
+            _sim_version = "missing"
+            return _sim_version
+        if spec.submodule_search_locations:
+            paths = sorted(os.path.join(root, name) for location in spec.submodule_search_locations
+                           for root, _, files in os.walk(location) for name in files if name.endswith(".py"))
+        else:
+            paths = [spec.origin]
+        digest = hashlib.sha256()
+        for path in paths:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        _sim_version = digest.hexdigest()[:16]
+    return _sim_version
+
+
+def cache_key(params, seed):
+    """
+    Content address of a dynamic_simulation run: all result-relevant parameters, the seed and the code version.
+
+    Raises ValueError for a parameter that is neither in KEY_PARAMETERS nor in IGNORED_PARAMETERS (so a new
+    dynamic_simulation argument cannot silently share entries), and for custom arrival processes or user
+    selectors, which are not cacheable.
+    """
+    unknown = set(params) - set(KEY_PARAMETERS) - set(IGNORED_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Parameters {sorted(unknown)} are not part of the cache key, add them to KEY_PARAMETERS "
+                         f"or IGNORED_PARAMETERS")
+    for name in UNCACHEABLE_PARAMETERS:
+        if params.get(name) is not None:
+            raise ValueError(f"Runs with a custom {name} cannot be cached, call dynamic_simulation directly")
+    normalised = {}
+    for name in KEY_PARAMETERS:
+        value = params.get(name, DEFAULTS[name])
+        if name == "graph_size":
+            value = [int(v) for v in value]
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = int(value) if name in ("max_requests", "Qc") else float(value)
+        normalised[name] = value
+    blob = json.dumps({"params": normalised, "seed": seed, "code": code_version()}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest(), normalised
+
+
+class ResultCache:
+    """
+    Persistent, content-addressed cache of dynamic_simulation results in a SQLite file.
+
+    Entries hold the detailed statistics dict (zlib-compressed JSON) keyed by cache_key. Every hit refreshes
+    the entry's access time, and when the stored size exceeds `max_bytes` the least recently used entries
+    are evicted.
+
+    Parameters:
+    path (str): SQLite file.
+    max_bytes (int): Size cap of the stored (compressed) results.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(path, timeout=60)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, params TEXT, value BLOB, size INTEGER, last_access REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_lru ON results (last_access)")
+        self._db.commit()
+
+    def get(self, params, seed):
+        """Return the cached statistics dict for (params, seed), or None."""
+        key, _ = cache_key(params, seed)
+        row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._db.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, params, seed, stats):
+        """Store the statistics dict of a run and evict least recently used entries above the size cap."""
+        key, normalised = cache_key(params, seed)
+        value = zlib.compress(json.dumps(stats).encode())
+        self._db.execute(
+            "INSERT OR REPLACE INTO results (key, params, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, json.dumps({"params": normalised, "seed": seed}), value, len(value), time.time()),
+        )
+        self._evict()
+        self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY last_access").fetchall():
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def simulate(self, seed=RANDOM_SEED, collect_stats=False, detailed_stats=False, **params):
+        """
+        dynamic_simulation with the same signature, served from the cache when the run was done before.
+
+        Parameters:
+        seed (int): RNG seed of the run (part of the cache key).
+        collect_stats / detailed_stats: as for dynamic_simulation.
+        **params: Remaining dynamic_simulation arguments.
+
+        Returns:
+        dict if detailed_stats, (total_requests, successful_requests) if collect_stats, otherwise None.
+        """
+        stats = self.get(params, seed)
+        if stats is None:
+            stats = dynamic_simulation(seed=seed, detailed_stats=True, **params)
+            self.put(params, seed, stats)
+
+        if detailed_stats:
+            return stats
+        if collect_stats:
+            return stats["total_requests"], stats["successful_requests"]
+        return None
+
+    def close(self):
+        self._db.close()
+
+
+def init_pool_worker(cache_path=DEFAULT_CACHE_PATH):
+    """multiprocessing.Pool initializer: open one ResultCache per worker process (see cached_run)."""
+    global _worker_cache
+    _worker_cache = ResultCache(cache_path)
+
+
+def cached_run(task):
+    """
+    Pool task: one dynamic_simulation run, served from the worker's ResultCache when it was done before.
+
+    Parameters:
+    task (tuple): (params, seed), params being dynamic_simulation keyword arguments.
+
+    Returns:
+    tuple: (detailed statistics dict, cached)
+    """
+    params, seed = task
+    stats = _worker_cache.get(params, seed)
+    cached = stats is not None
+    if not cached:
+        stats = dynamic_simulation(seed=seed, detailed_stats=True, **params)
+        _worker_cache.put(params, seed, stats)
+    return stats, cached
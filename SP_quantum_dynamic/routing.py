@@ -0,0 +1,230 @@
+from collections import deque
+
+
+class GHZRouter:
+    """
+    Multi-user router for GHZ distribution that keeps its state between requests.
+
+    Replaces the per-request graph copies and repeated BFS of `_get_star`:
+    - BFS distance/predecessor labels are computed once per source node on the unmodified topology and reused by
+      every later request (they stay valid until the topology of G changes, e.g. after remove_nodes).
+    - In star mode the edge-disjoint paths of the previous request are kept; when a new request shares the centre
+      and a prefix of destinations with it, only the paths after the first changed destination are recomputed.
+    - A path is only searched for again (early-terminating BFS avoiding used edges) when the cached shortest
+      path collides with an edge already taken by the star, so the work is confined to the affected region.
+
+    Input Pararmeters:
+    G    - Networkx graph G(V,E) which defines the topology of the network. see graphs.py for more details
+    mode - "star" (edge-disjoint shortest paths from users[0], as _get_star) or "steiner" (approximate Steiner
+           tree over all users, Kou-Markowsky-Berman construction on the cached BFS labels)
+    """
+
+    def __init__(self, G, mode="star"):
+        if mode not in ("star", "steiner"):
+            raise ValueError(f"Unknown routing mode {mode!r}, expected 'star' or 'steiner'")
+        self.G = G
+        self.mode = mode
+        self._labels = {}  # source -> (dist, pred) of a BFS over G
+        self._order = None  # node -> position in G.nodes, for building J in G's node order
+        self._signature = None
+        self._last_users = []
+        self._last_paths = []  # paths of the previous star, aligned with _last_users[1:]
+        self._last_used = []  # used-edge set after each path of the previous star
+
+    def _check_topology(self):
+        signature = (self.G.number_of_nodes(), self.G.number_of_edges())
+        if signature != self._signature:
+            self.invalidate()
+            self._signature = signature
+
+    def invalidate(self):
+        """Drop all cached labels and routes, call after changing the topology of G in place."""
+        self._labels.clear()
+        self._order = None
+        self._last_users = []
+        self._last_paths = []
+        self._last_used = []
+
+    def labels(self, source):
+        """Return (dist, pred) BFS labels from `source`, computing them at most once per topology."""
+        if source not in self._labels:
+            adj = self.G.adj
+            dist = {source: 0}
+            pred = {source: None}
+            queue = deque([source])
+            while queue:
+                u = queue.popleft()
+                for v in adj[u]:
+                    if v not in dist:
+                        dist[v] = dist[u] + 1
+                        pred[v] = u
+                        queue.append(v)
+            self._labels[source] = (dist, pred)
+        return self._labels[source]
+
+    def shortest_path(self, source, target):
+        """Shortest path from the cached labels of `source`, or None if `target` is unreachable."""
+        _, pred = self.labels(source)
+        if target not in pred:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(pred[path[-1]])
+        path.reverse()
+        return path
+
+    def distance(self, source, target):
+        """Hop distance between source and target from the cached labels of `source` (inf if unreachable)."""
+        return self.labels(source)[0].get(target, float("inf"))
+
+    def _search_avoiding(self, source, target, used):
+        """BFS from source to target over edges not in `used`, stopping as soon as target is reached."""
+        adj = self.G.adj
+        pred = {source: None}
+        queue = deque([source])
+        while queue:
+            u = queue.popleft()
+            if u == target:
+                break
+            for v in adj[u]:
+                if v not in pred and edge_key(u, v) not in used:
+                    pred[v] = u
+                    queue.append(v)
+        if target not in pred:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(pred[path[-1]])
+        path.reverse()
+        return path
+
+    def star(self, users):
+        """
+        Edge-disjoint shortest paths from users[0] to every other user (shared edges are allowed when no
+        disjoint path is left, as in _get_star).
+
+        Returns:
+        list: One node path per destination user, in the order of users[1:].
+        """
+        self._check_topology()
+        source = users[0]
+        destinations = list(users[1:])
+
+        # reuse the longest common prefix with the previous request
+        keep = 0
+        if self._last_users and self._last_users[0] == source:
+            previous = self._last_users[1:]
+            while keep < min(len(previous), len(destinations)) and previous[keep] == destinations[keep]:
+                keep += 1
+        paths = self._last_paths[:keep]
+        used = set(self._last_used[keep - 1]) if keep else set()
+        history = self._last_used[:keep]
+
+        for destination in destinations[keep:]:
+            path = self.shortest_path(source, destination)
+            if path is None:
+                raise ValueError(f"No path between {source} and {destination}")
+            edges = [edge_key(u, v) for u, v in zip(path[:-1], path[1:])]
+            if any(e in used for e in edges):
+                disjoint = self._search_avoiding(source, destination, used)
+                if disjoint is not None:
+                    path = disjoint
+                    edges = [edge_key(u, v) for u, v in zip(path[:-1], path[1:])]
+            used.update(edges)
+            paths.append(path)
+            history.append(frozenset(used))
+
+        self._last_users = [source] + destinations
+        self._last_paths = paths
+        self._last_used = history
+        return list(paths)
+
+    def steiner(self, users):
+        """
+        Approximate Steiner tree spanning all users (at most twice the optimal number of edges).
+
+        Returns:
+        set: Edges (as sorted node pairs) of the tree.
+        """
+        self._check_topology()
+        terminals = list(dict.fromkeys(users))
+
+        # Prim's MST over the metric closure of the terminals, distances read from the cached BFS labels
+        best = {t: (self.distance(terminals[0], t), terminals[0]) for t in terminals[1:]}
+        union = set()
+        while best:
+            t = min(best, key=lambda x: best[x][0])
+            dist, parent = best.pop(t)
+            if dist == float("inf"):
+                raise ValueError(f"No path between {parent} and {t}")
+            path = self.shortest_path(parent, t)
+            union.update(edge_key(u, v) for u, v in zip(path[:-1], path[1:]))
+            for other in best:
+                d = self.distance(t, other)
+                if d < best[other][0]:
+                    best[other] = (d, t)
+
+        # the union of paths can contain cycles: keep a BFS spanning tree of it and prune non-terminal leaves
+        adj = {}
+        for u, v in union:
+            adj.setdefault(u, []).append(v)
+            adj.setdefault(v, []).append(u)
+        root = terminals[0]
+        tree = {root: None}
+        queue = deque([root])
+        while queue:
+            u = queue.popleft()
+            for v in adj.get(u, ()):
+                if v not in tree:
+                    tree[v] = u
+                    queue.append(v)
+        degree = {}
+        for v, u in tree.items():
+            if u is not None:
+                degree[u] = degree.get(u, 0) + 1
+                degree[v] = degree.get(v, 0) + 1
+        terminal_set = set(terminals)
+        leaves = [v for v, d in degree.items() if d == 1 and v not in terminal_set]
+        removed = set()
+        while leaves:
+            v = leaves.pop()
+            removed.add(v)
+            u = tree[v]  # a pruned leaf is never the root (a terminal), so its only neighbour left is its parent
+            degree[u] -= 1
+            if degree[u] == 1 and u not in terminal_set:
+                leaves.append(u)
+        return {edge_key(v, u) for v, u in tree.items() if u is not None and v not in removed and u not in removed}
+
+    def route_graph(self, users):
+        """
+        Build the reduced graph J used by SP_protocol: only the users and the nodes and edges of the route (with
+        their data). Nodes are added in G's order, so J.edges() lists the edges in the same order as a J holding
+        every node of G.
+
+        Input Pararmeters:
+        users  - List of nodes in G which between which a GHZ should be shared. users[0] is the centre of the star
+        Outputs:
+        J      - Networkx graph J(V',E') with the star or Steiner-tree edges
+        """
+        if self.mode == "star":
+            edges = set()
+            for path in self.star(users):
+                edges.update(edge_key(u, v) for u, v in zip(path[:-1], path[1:]))
+        else:
+            edges = self.steiner(users)
+
+        G = self.G
+        if self._order is None:
+            self._order = {node: i for i, node in enumerate(G)}
+        route_nodes = set(users)
+        for u, v in edges:
+            route_nodes.update((u, v))
+        J = G.__class__()
+        J.add_nodes_from((node, G.nodes[node]) for node in sorted(route_nodes, key=self._order.__getitem__))
+        J.add_edges_from((u, v, G.edges[u, v]) for u, v in edges)
+        return J
+
+
+def edge_key(u, v):
+    """Canonical (order independent) key of an undirected edge."""
+    return (u, v) if u <= v else (v, u)
@@ -0,0 +1,42 @@
+import argparse
+import time
+import tracemalloc
+
+from implicit_grid import scale_simulation
+
+
+def benchmark(graph_size=(1000, 1000), max_requests=2000, entanglement_prob=0.9, radius=5, timesteps=1000, seed=42):
+    """
+    Run scale_simulation once and measure peak Python memory and event throughput.
+
+    Returns:
+    dict: The simulation statistics plus peak_memory_mb, elapsed_s and events_per_s.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    stats = scale_simulation(graph_size, mean_interarrival=1.0, mean_service=3.0, max_requests=max_requests,
+                             entanglement_prob=entanglement_prob, timesteps=timesteps, radius=radius, seed=seed)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats["peak_memory_mb"] = peak / 2 ** 20
+    stats["elapsed_s"] = elapsed
+    stats["events_per_s"] = stats["events"] / elapsed if elapsed > 0 else float("inf")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory and throughput of the implicit-grid scale mode")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--columns", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--p", type=float, default=0.9, help="entanglement probability")
+    parser.add_argument("--radius", type=int, default=5, help="max distance of users from the centre (-1: any)")
+    args = parser.parse_args()
+
+    result = benchmark((args.rows, args.columns), args.requests, args.p, None if args.radius < 0 else args.radius)
+    print(f"Grid {args.rows}x{args.columns} ({args.rows * args.columns} nodes), {result['total_requests']} requests")
+    print(f"Blocking rate: {result['blocking_rate']:.3f}")
+    print(f"Peak memory: {result['peak_memory_mb']:.2f} MB")
+    print(f"Events/sec: {result['events_per_s']:.0f} ({result['events']} events in {result['elapsed_s']:.2f} s)")
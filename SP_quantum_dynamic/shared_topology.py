@@ -0,0 +1,364 @@
+from collections import deque
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import Initialisation
+from kernels import ArrayTopology, bidirectional_path, consume_path
+from lazy_imports import lazy_import
+from routing import GHZRouter
+
+nx = lazy_import("networkx")
+np = lazy_import("numpy")
+
+ALIGNMENT = 64  # byte alignment of every array inside the shared block
+# Largest topology that gets the all-pairs dist/next_hop tables: they take 8 * n^2 bytes (50 MB at 2500
+# nodes, 800 MB at 10^4), so larger grids publish only the O(E) adjacency and the routers use BFS labels
+MAX_TABLE_NODES = 2500
+
+_attached = {}  # (rows, columns) -> SharedTopology attached by init_worker in this process
+
+
+class SharedTopology:
+    """
+    Read-only grid topology and routing tables in one multiprocessing.shared_memory block.
+
+    Arrays:
+    coords   - (n, 2) node labels (row, column), in G.nodes order
+    edges    - (m, 2) node indices of the edges, in an insertion order that reproduces G's adjacency order
+    star_indptr, star_indices, star_edge_of
+             - CSR adjacency in the order of _get_star's working copy of G (edges numbered in G.edges() order)
+    adj_indptr, adj_indices, adj_edge_of
+             - CSR adjacency in G's own adjacency order, same edge numbers
+    dist     - (n, n) hop distance between nodes, -1 if unreachable
+    next_hop - (n, n) next_hop[u, s] is the next node from u towards s on the BFS tree of s, -1 if none;
+               the same predecessors GHZRouter.labels(s) computes, so routes are identical
+    dist and next_hop are only published for up to MAX_TABLE_NODES nodes (has_tables).
+
+    The publishing process creates the block with publish_topology and passes `spec` (a small picklable dict)
+    to the workers, which attach zero-copy with attach_topology. The publisher must unlink() it when done.
+    """
+
+    def __init__(self, spec, block, owner):
+        self.spec = spec
+        self.shape = tuple(spec["shape"])
+        self._block = block
+        self._owner = owner
+        self.arrays = {}
+        for name, (offset, dtype, shape) in spec["arrays"].items():
+            array = np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)
+            if not owner:
+                array.flags.writeable = False
+            self.arrays[name] = array
+        self.nodes = [tuple(c) for c in self.arrays["coords"].tolist()]
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.has_tables = "dist" in self.arrays
+
+    def __getattr__(self, name):
+        arrays = self.__dict__.get("arrays", {})
+        if name in arrays:
+            return arrays[name]
+        raise AttributeError(name)
+
+    def close(self):
+        """Detach from the shared block (arrays of this object must not be used afterwards)."""
+        self.arrays.clear()
+        self._block.close()
+
+    def unlink(self):
+        """Close and free the shared block, publisher only."""
+        self.close()
+        if self._owner:
+            self._block.unlink()
+
+
+def _edge_insertion_order(G):
+    """
+    Order the edges of G so that adding them to an empty graph reproduces the neighbour order of every node.
+
+    The adjacency order of each node gives precedence constraints between its edges; the order in which G was
+    built satisfies all of them, so a topological sort of the constraints always exists.
+    """
+    edge_ids = {}
+    edges = []
+    for u, v in G.edges():
+        edge_ids[(u, v)] = edge_ids[(v, u)] = len(edges)
+        edges.append((u, v))
+
+    successors = [[] for _ in edges]
+    indegree = [0] * len(edges)
+    for u in G.nodes:
+        incident = [edge_ids[(u, v)] for v in G.adj[u]]
+        for a, b in zip(incident[:-1], incident[1:]):
+            successors[a].append(b)
+            indegree[b] += 1
+
+    order = []
+    queue = deque(e for e in range(len(edges)) if indegree[e] == 0)
+    while queue:
+        e = queue.popleft()
+        order.append(edges[e])
+        for f in successors[e]:
+            indegree[f] -= 1
+            if indegree[f] == 0:
+                queue.append(f)
+    return order
+
+
+def _routing_tables(G, nodes, index):
+    """All-pairs BFS in adjacency order: (dist, next_hop) tables, see SharedTopology."""
+    n = len(nodes)
+    dist = np.full((n, n), -1, dtype=np.int32)
+    next_hop = np.full((n, n), -1, dtype=np.int32)
+    adj = [[index[v] for v in G.adj[u]] for u in nodes]
+    for s in range(n):
+        dist[s, s] = 0
+        queue = deque([s])
+        while queue:
+            u = queue.popleft()
+            for v in adj[u]:
+                if dist[s, v] < 0:
+                    dist[s, v] = dist[s, u] + 1
+                    next_hop[v, s] = u
+                    queue.append(v)
+    return dist, next_hop
+
+
+def _adjacency_csr(G, nodes, index, edge_ids):
+    """CSR adjacency of G in its own neighbour order, with the given edge numbers."""
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(G.adj[u]) for u in nodes])
+    indices = np.array([index[v] for u in nodes for v in G.adj[u]], dtype=np.int64)
+    edge_of = np.array([edge_ids[(u, v)] for u in nodes for v in G.adj[u]], dtype=np.int64)
+    return indptr, indices, edge_of
+
+
+def publish_topology(graph_size, routing_tables=None):
+    """
+    Build the grid topology, its adjacency arrays and (for small grids) its routing tables once and place them in
+    shared memory.
+
+    Parameters:
+    graph_size (tuple): Dimensions of the grid (rows, cols), as for initialize_quantum_network.
+    routing_tables (bool): Publish dist/next_hop; None does so up to MAX_TABLE_NODES nodes, True raises ValueError
+                           above that.
+
+    Returns:
+    SharedTopology: Owner handle; pass its .spec to the workers and call .unlink() when they are done.
+    """
+    G = nx.grid_2d_graph(*graph_size)  # same topology (and node/adjacency order) as initialize_quantum_network
+    nodes = list(G.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    if routing_tables is None:
+        routing_tables = len(nodes) <= MAX_TABLE_NODES
+    elif routing_tables and len(nodes) > MAX_TABLE_NODES:
+        raise ValueError(f"Routing tables of {len(nodes)} nodes would take {8 * len(nodes) ** 2 / 2 ** 20:.0f} MB, "
+                         f"the limit is MAX_TABLE_NODES = {MAX_TABLE_NODES} nodes")
+
+    star = ArrayTopology(G)  # the adjacency order of the copy of G that _get_star routes on
+    edge_ids = {}
+    for e, (u, v) in enumerate(star.edges):
+        edge_ids[(u, v)] = edge_ids[(v, u)] = e
+    adj_indptr, adj_indices, adj_edge_of = _adjacency_csr(G, nodes, index, edge_ids)
+    arrays = {
+        "coords": np.array(nodes, dtype=np.int32).reshape(len(nodes), 2),
+        "edges": np.array([(index[u], index[v]) for u, v in _edge_insertion_order(G)], dtype=np.int32),
+        "star_indptr": star.indptr,
+        "star_indices": star.indices,
+        "star_edge_of": star.edge_of,
+        "adj_indptr": adj_indptr,
+        "adj_indices": adj_indices,
+        "adj_edge_of": adj_edge_of,
+    }
+    if routing_tables:
+        arrays["dist"], arrays["next_hop"] = _routing_tables(G, nodes, index)
+
+    layout = {}
+    size = 0
+    for name, array in arrays.items():
+        size = -(-size // ALIGNMENT) * ALIGNMENT
+        layout[name] = (size, array.dtype.str, array.shape)
+        size += array.nbytes
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for name, array in arrays.items():
+        offset, dtype, shape = layout[name]
+        np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)[...] = array
+    spec = {"name": block.name, "shape": list(graph_size), "arrays": layout}
+    return SharedTopology(spec, block, owner=True)
+
+
+def attach_topology(spec):
+    """Attach to a published topology without copying (use from processes started by the publisher)."""
+    try:
+        block = shared_memory.SharedMemory(name=spec["name"], track=False)
+    except TypeError:  # Python < 3.13 has no track argument
+        block = shared_memory.SharedMemory(name=spec["name"])
+    return SharedTopology(spec, block, owner=False)
+
+
+def graph_from_topology(topology, p=0.1, Qc=1):
+    """
+    Quantum network graph equal to Initialisation.initialize_quantum_network(*topology.shape, p, Qc), built from
+    the shared arrays (same node, edge and adjacency order, so routing and results are identical).
+    """
+    nodes = topology.nodes
+    G = nx.Graph()
+    G.add_nodes_from(nodes)
+    G.add_edges_from((nodes[u], nodes[v]) for u, v in topology.edges.tolist())
+    nx.set_edge_attributes(G, 1, "length")
+    Initialisation.update_graph_params(G, p=p, Qc=Qc)
+    Initialisation.reset_graph_state(G)
+    Initialisation.reset_graph_usage(G)
+    return G
+
+
+class SharedRouter(GHZRouter):
+    """
+    GHZRouter answering shortest paths and distances from the shared tables instead of per-process BFS labels.
+
+    The tables describe the unmodified grid; once the topology of G changes (e.g. remove_nodes), or if the
+    topology was published without tables (more than MAX_TABLE_NODES nodes), the router uses the BFS labels of
+    GHZRouter.
+
+    Input Pararmeters:
+    G        - graph built by graph_from_topology(topology)
+    topology - attached SharedTopology
+    mode     - "star" or "steiner", see GHZRouter
+    """
+
+    def __init__(self, G, topology, mode="star"):
+        super().__init__(G, mode)
+        self.topology = topology
+        self._table_signature = (len(topology.nodes), len(topology.edges))
+        self._use_tables = True
+
+    def _check_topology(self):
+        super()._check_topology()
+        self._use_tables = self.topology.has_tables and self._signature == self._table_signature
+
+    def distance(self, source, target):
+        if not self._use_tables:
+            return super().distance(source, target)
+        d = self.topology.dist[self.topology.index[source], self.topology.index[target]]
+        return float("inf") if d < 0 else int(d)
+
+    def shortest_path(self, source, target):
+        if not self._use_tables:
+            return super().shortest_path(source, target)
+        nodes, index, next_hop = self.topology.nodes, self.topology.index, self.topology.next_hop
+        s, u = index[source], index[target]
+        if self.topology.dist[s, u] < 0:
+            return None
+        path = [target]
+        while u != s:
+            u = int(next_hop[u, s])
+            path.append(nodes[u])
+        path.reverse()
+        return path
+
+
+class SharedStar:
+    """
+    _get_star on the shared adjacency: the same edge-disjoint star from users[0], routed with
+    kernels.bidirectional_path (which reproduces nx.shortest_path step by step) over the star_* arrays, with the
+    edges taken by earlier destinations masked out instead of removed from a copy of G, and over the adj_*
+    arrays for the shared-edge fallback on G itself. route_graph returns the same J as _get_star(G, users)
+    without copying G into a new graph for every request.
+
+    Input Pararmeters:
+    G        - graph built by graph_from_topology(topology), its topology must not change
+    topology - attached SharedTopology
+    """
+
+    def __init__(self, G, topology):
+        self.G = G
+        self.topology = topology
+        n, m = len(topology.nodes), len(topology.star_indices) // 2
+        self.free = np.ones(m, dtype=bool)  # edges of the working copy not used by the star yet
+        self.every = np.ones(m, dtype=bool)
+        self.pred = np.empty(n, dtype=np.int64)
+        self.succ = np.empty(n, dtype=np.int64)
+        self.fringes = np.empty((4, n), dtype=np.int64)
+        self.path = np.empty(n, dtype=np.int64)
+        self.consumed = np.empty(n, dtype=np.int64)
+
+    def _path(self, indptr, indices, edge_of, alive, source, target):
+        length = bidirectional_path(indptr, indices, edge_of, alive, source, target, self.pred, self.succ,
+                                    self.fringes, self.path)
+        return self.path[:length]
+
+    def route_graph(self, users):
+        """
+        Build the reduced graph J used by SP_protocol, see _get_star.
+
+        Input Pararmeters:
+        users  - List of nodes in G which between which a GHZ should be shared. users[0] is the centre of the star
+        Outputs:
+        J      - Networkx graph J(V,E') with edges of the star-path connecting each destination user with the source
+        """
+        G, topology = self.G, self.topology
+        nodes, index = topology.nodes, topology.index
+        self.free[:] = True
+        J = G.__class__()
+        J.add_nodes_from(G.nodes(data=True))
+        source = index[users[0]]
+        for destination in users[1:]:
+            path = self._path(topology.star_indptr, topology.star_indices, topology.star_edge_of, self.free, source,
+                              index[destination])
+            if not len(path):  # no edge-disjoint path left, share edges
+                path = self._path(topology.adj_indptr, topology.adj_indices, topology.adj_edge_of, self.every,
+                                  source, index[destination])
+                if not len(path):
+                    raise nx.NetworkXNoPath(f"No path between {users[0]} and {destination}.")
+            consume_path(topology.star_indptr, topology.star_indices, topology.star_edge_of, self.free, path,
+                         len(path), self.consumed)  # remove the path from the working copy
+            route = [nodes[i] for i in path.tolist()]
+            J.add_edges_from(zip(route[:-1], route[1:]))
+        for u, v in J.edges():
+            J[u][v].update(G.get_edge_data(u, v))  # add edge data to edge in J from G
+        return J
+
+
+def init_worker(specs):
+    """Pool/Process initializer: attach every published topology in `specs` once per worker."""
+    for spec in specs:
+        _attached[tuple(spec["shape"])] = attach_topology(spec)
+
+
+def attached_topology(graph_size):
+    """Topology attached by init_worker for this grid size, or None."""
+    return _attached.get(tuple(graph_size))
+
+
+class SharedSimulate:
+    """
+    Picklable wrapper of a simulate function (dynamic_simulation signature) for worker processes: passes the
+    attached topology of the job's grid size, if any, as topology=... so the worker skips building it (not in
+    "estimate" or "scale" mode, which build no graph).
+    """
+
+    def __init__(self, simulate):
+        self.simulate = simulate
+
+    def __call__(self, **params):
+        topology = attached_topology(params.get("graph_size", (3, 3)))
+        if topology is not None and params.get("mode", "simulate") == "simulate":
+            params["topology"] = topology
+        return self.simulate(**params)
+
+
+@contextmanager
+def shared_topologies(graph_sizes):
+    """
+    Publish the topologies of `graph_sizes` for the duration of the block and unlink them afterwards.
+
+    Yields:
+    list: Their specs, e.g. for multiprocessing.Pool(initializer=init_worker, initargs=(specs,)).
+    """
+    published = []
+    try:
+        for graph_size in dict.fromkeys(tuple(size) for size in graph_sizes):
+            published.append(publish_topology(graph_size))
+        yield [topology.spec for topology in published]
+    finally:
+        for topology in published:
+            topology.unlink()
@@ -1,15 +1,13 @@
-import networkx as nx
-import numpy as np
-import random
-from Dynamic_Time_Advanced import initialize, timing, arrive, depart, update_time_avg_stats, expon
 import random
+
 import Initialisation
-from networkx.algorithms.approximation.steinertree import steiner_tree
+from Initialisation import initialize, expon
+from lazy_imports import lazy_import
 
-# Set seed for reproducibility
-RANDOM_SEED = 42  # You can change this value if needed
-random.seed(RANDOM_SEED)
-np.random.seed(RANDOM_SEED)
+# Heavy modules are loaded on first use so that importing this module (e.g. in a pool worker) stays cheap.
+# Seeding is done explicitly with Initialisation.seed_rngs() instead of at import time.
+nx = lazy_import("networkx")
+np = lazy_import("numpy")
 
 from graph import (
     reset_graph_usage,
@@ -17,10 +15,13 @@ from graph import (
     update_usage_from_subgraph,
     reset_graph_state,
     get_entangled_subgraph,
+    set_p_edge,
 )
-from sim import run_entanglement_step
+from quantiles import StreamingHistogram
+from routing import GHZRouter
 
-def SP_protocol(G, users, timesteps, reps, count_fusion=False):
+def SP_protocol(G, users, timesteps, reps, count_fusion=False, router=None, tracer=None, histogram=None,
+                backend="networkx"):
     """
     Shortest Path protocol taken from [SPsource] The protocol attempts to generate bell pairs between a central node and a set of users.
     This is done by attmepting entanglement along a set of edge disjoint paths, all connected to the centre node. The protocol
@@ -32,44 +33,90 @@ def SP_protocol(G, users, timesteps, reps, count_fusion=False):
     users     - List of nodes in G which between which a GHZ should be shared. users[0] is the centre of the star which should be calculated before sending to SP_protocol
     timesteps - number of timesteps the protocol will run for before terminating without a successful GHZ generation,
     reps      - number of repetions the protocol will run for the imput parameters to generate a dataset.
+    router    - optional routing.GHZRouter built on G; reuses routing state between calls (star or Steiner tree).
+                If None the route is computed from scratch with _get_star
+    tracer    - optional tracing.TraceRecorder, records per-timestep link-state deltas and keeps the traces of
+                slow repetitions
+    histogram - optional quantiles.StreamingHistogram, the generation time of every successful repetition is added
+    backend   - "networkx" routes on the entangled subgraph with NetworkX, "array" runs routing and edge consumption
+                in the kernels of kernels.py (Numba-compiled if available); both give identical results
 
     Outputs:
     rate                   -  entanglement rate (ER) (average GHZs generated per timeslot)
     multipartite_gen_time  -  array (length of reps)  array of timesteps until successful GHZ generated, if no successful GHZ generated value is -1
     avg_links_used         -  number of entanglement links used per repetition for successful GHZ generation
     """
-    J = _get_star(
-        G, users
-    )  # get the shortest star in G, which connects all destination_nodes to the source_node
+    if router is not None:
+        J = router.route_graph(users)  # star / Steiner tree from the router's cached labels and routes
+    else:
+        J = _get_star(
+            G, users
+        )  # get the shortest star in G, which connects all destination_nodes to the source_node
 
     er, multipartite_gen_time, avg_links_used = _run_protocol(
-        J, users, timesteps, reps, _SD_protocol, nodes=True, count_fusion=count_fusion
+        J, users, timesteps, reps, _SD_protocol, nodes=True, count_fusion=count_fusion, tracer=tracer,
+        histogram=histogram, backend=backend
     )
     update_usage_from_subgraph(G, J)
     return er, multipartite_gen_time, avg_links_used
 
-def _run_protocol(G, users, timesteps, reps, success_protocol, nodes=False, count_fusion=False):
+def _run_protocol(G, users, timesteps, reps, success_protocol, nodes=False, count_fusion=False, tracer=None,
+                  histogram=None, backend="networkx"):
+    if backend not in ("networkx", "array"):
+        raise ValueError(f"Unknown backend {backend!r}, expected 'networkx' or 'array'")
+    if backend == "array" and success_protocol is not _SD_protocol:
+        raise ValueError("The array backend only implements _SD_protocol")
+    # the external entanglement physics is only needed once a protocol runs, routing and the modes that
+    # build no graph work without it
+    from sim import run_entanglement_step
     reset_graph_usage(G)
     links_used = 0
 
     # Track entanglement generation times
     multipartite_gen_time = -1 * np.ones(reps)  # Initialize as -1 for all reps
 
+    topology = None
+    if backend == "array":
+        from kernels import ArrayTopology  # imported on demand, keeps numba out of the default import path
+
+        topology = ArrayTopology(G)  # G's topology is fixed during the run
+
     for i in range(reps):
         reset_graph_state(G)
         used_nodes = []
         t = 0
+        if tracer is not None:
+            tracer.start(users)
 
         while t < timesteps and multipartite_gen_time[i] == -1:  # Run for timesteps or until success
             t += 1
             run_entanglement_step(G, used_nodes, nodes)
-            H = get_entangled_subgraph(G)
-            success = success_protocol(G, H, users, used_nodes, count_fusion)
+            if topology is not None:
+                # link state as a bool array instead of a copied subgraph
+                alive = topology.entangled_mask(G)
+                if tracer is not None:
+                    tracer.record(t, "generate", topology.live_edges(alive))
+                success = _SD_protocol_array(G, topology, alive, users, used_nodes)
+                if tracer is not None:
+                    tracer.record(t, "swap", topology.live_edges(alive))
+            else:
+                H = get_entangled_subgraph(G)
+                if tracer is not None:
+                    tracer.record(t, "generate", H.edges)
+                success = success_protocol(G, H, users, used_nodes, count_fusion)
+                if tracer is not None:
+                    tracer.record(t, "swap", H.edges)
 
             if success:
                 multipartite_gen_time[i] = t  # Record success time
                 links_used += sum(path["edge_count"] for path in used_nodes)
 
+        if tracer is not None:
+            tracer.finish(multipartite_gen_time[i])
+
+    if histogram is not None:  # constant-memory record of the generation-time distribution
+        histogram.add_many(multipartite_gen_time[multipartite_gen_time != -1])
+
     rate = _multipartite_rate(multipartite_gen_time, timesteps)
     update_graph_usage(G, reps)
     avg_links_used = links_used / reps if reps > 0 else 0
@@ -89,7 +136,25 @@ def _SD_protocol(G, H, users, used_nodes, count_fusion=False):
     return all([G.nodes[x]["entangled"] for x in destination_nodes])
 
 
-def _create_bell_pair(G, H, path, used_nodes):
+def _SD_protocol_array(G, topology, alive, users, used_nodes):
+    """
+    _SD_protocol on the array backend: routes with kernels.bidirectional_path over the link-state array `alive`
+    (which plays the role of H) and writes the consumed links and the entangled destinations back to G.
+    """
+    source = topology.index[users[0]]
+    destination_nodes = users[1:]
+
+    for destination_node in destination_nodes:
+        if not G.nodes[destination_node]["entangled"]:
+            path = topology.shortest_path(alive, source, topology.index[destination_node])
+            if len(path):
+                consumed = topology.consume(alive, path)
+                _create_bell_pair(G, None, [topology.nodes[i] for i in path], used_nodes,
+                                  [topology.edges[e] for e in consumed])
+    return all([G.nodes[x]["entangled"] for x in destination_nodes])
+
+
+def _create_bell_pair(G, H, path, used_nodes, edges=None):
     """
     create Bell pair between source node and destination node, record as value "entangled" in destination node in graph G. This is done by performing entanglement swapping at all nodes in the shortest path
 
@@ -98,10 +163,15 @@ def _create_bell_pair(G, H, path, used_nodes):
     H                - Networkx graph G'(V,E') which defines the topology of the links.
     route            - path of nodes selected to perform entanglement swapping between route[0]=source route[-1] = destination
     used_nodes       - list of paths of the nodes that performed entanglement swapping to be updated
+    edges            - edges along the path as stored in G, given by the array backend (which has already removed
+                       them from its link state, H is None then)
 
     """
-    for u, v in zip(path[:-1], path[1:]):  # node - next_node pairs
-        H.remove_edge(u, v)
+    if edges is None:
+        edges = list(zip(path[:-1], path[1:]))  # node - next_node pairs
+    for u, v in edges:
+        if H is not None:
+            H.remove_edge(u, v)
         edge = G.edges[u, v]
         edge["entangled"] = False
         edge["age"] = 0
@@ -191,10 +261,10 @@ def _get_star(G, users):
     ]  # add edge data to edge in J from G
     return J
 
-initialize()
 mean_interarrival = 5.0  # Example values
 mean_service = 3.0
 num_delays_required = 0
+MAX_CONCURRENT_REQUESTS = 5  # Defines the maximum number of concurrent entangled requests allowed
 
 
 def calculate_blocking_rate(total_requests, successful_requests):
@@ -248,7 +318,10 @@ def release_resources(G, users):
 
 
 def dynamic_simulation(graph_size=(3, 3), mean_interarrival=10.0, mean_service=3.0,
-                       max_requests=100, collect_stats=False, entanglement_prob=0.1):
+                       max_requests=100, collect_stats=False, entanglement_prob=0.1, mode="simulate",
+                       routing=None, tracer=None, seed=None, detailed_stats=False, arrivals=None,
+                       user_selector=None, backend="networkx", topology=None, Qc=1, loss_dB=None,
+                       telemetry=None):
     """
     Simulates a dynamic quantum network using the SP_protocol with dynamic event management.
 
@@ -259,9 +332,42 @@ def dynamic_simulation(graph_size=(3, 3), mean_interarrival=10.0, mean_service=3
         max_requests (int): Maximum number of requests to process before stopping the simulation.
         collect_stats (bool): If True, returns total and successful requests; otherwise, only prints results.
         entanglement_prob (float): Probability of entanglement between nodes in the quantum network.
+        mode (str): "simulate" runs the event-driven simulation, "estimate" returns the analytical
+                    approximation from blocking_estimator.estimate_blocking_rate instead (milliseconds,
+                    with error bounds and a flag saying whether full simulation is needed), "scale" runs
+                    implicit_grid.scale_simulation (no NetworkX graph, for grids up to ~10^6 nodes) on the
+                    global RNG streams; it raises ValueError for routing, tracer, arrivals, user_selector,
+                    topology, telemetry and a backend other than "networkx", which it does not support.
+        routing (str): None uses _get_star for every request, "star" or "steiner" route through a
+                       routing.GHZRouter that keeps its BFS labels and routes between requests.
+        tracer (TraceRecorder): Optional tracing.TraceRecorder shared by all requests; slow requests' link
+                                traces end up in tracer.retained.
+        seed (int): If given, the global RNGs are seeded with Initialisation.seed_rngs(seed) before the run.
+        detailed_stats (bool): If True, returns a dict of statistics instead (see below).
+        arrivals (ArrivalProcess): Optional traffic.ArrivalProcess (non-homogeneous Poisson, MMPP, trace replay,
+                                   ...) replacing the Poisson arrivals of rate 1/mean_interarrival.
+        user_selector (UserSelector): Optional traffic.UserSelector (e.g. hotspot weights) replacing the
+                                      uniform choice of 3 or 4 users.
+        backend (str): SP_protocol backend, "networkx" or "array" (compiled kernels, see kernels.py).
+        topology (SharedTopology): Optional shared_topology.SharedTopology of this grid size; the graph is built
+                                   from its arrays, routing=None finds the _get_star routes on its shared
+                                   adjacency (SharedStar) and the "star"/"steiner" routers read its shared
+                                   distance/next-hop tables. Results are the same as without it.
+        Qc (int): Decoherence time of links and qubits, in timesteps.
+        loss_dB (float): Fibre attenuation in dB/km; if given, every edge (1 km) generates links with probability
+                         entanglement_prob * 10^(-loss_dB / 10) (graph.set_p_edge). "estimate" mode uses Qc = 1.
+        telemetry (Telemetry): Optional telemetry.Telemetry; gets a rate-limited progress update per request
+                               (simulated time, requests, events/sec, blocking rate, active requests, RSS).
 
     Returns:
         tuple: (total_requests, successful_requests) if collect_stats is True, otherwise None.
+        dict: if detailed_stats is True: total_requests, successful_requests, blocking_rate, blocked_busy_nodes
+              (users already in use), blocked_capacity (MAX_CONCURRENT_REQUESTS reached), blocked_protocol
+              (SP_protocol timed out), sim_time, and for generation_time (timesteps of every SP_protocol
+              attempt, timeouts counted as the timeout), time_to_admission (timesteps until the GHZ state of
+              admitted requests was ready) and holding_time: "quantiles" (count/mean/p50/p95/p99) and
+              "histograms" (StreamingHistogram.to_dict(), mergeable across workers with merge_histograms).
+        In "estimate" mode its result dict is always returned, in "scale" mode unless collect_stats is True.
 
     The simulation follows these steps:
     1. Initializes the quantum network and simulation parameters.
@@ -269,62 +375,151 @@ def dynamic_simulation(graph_size=(3, 3), mean_interarrival=10.0, mean_service=3
     3. Tracks entanglement request successes and failures.
     4. Calculates the blocking rate at the end of the simulation.
     """
-    MAX_CONCURRENT_REQUESTS = 5  # Defines the maximum number of concurrent entangled requests allowed
+    if seed is not None:
+        Initialisation.seed_rngs(seed)
+
+    # link generation probability of a 1 km edge, for the modes that take a single p
+    edge_prob = entanglement_prob if loss_dB is None else entanglement_prob * 10 ** (-loss_dB / 10)
+
+    if mode == "estimate":
+        from blocking_estimator import estimate_blocking_rate
+
+        estimate = estimate_blocking_rate(graph_size, mean_interarrival, mean_service, edge_prob,
+                                          max_concurrent=MAX_CONCURRENT_REQUESTS)
+        print(f"Estimated Blocking Rate: {estimate['blocking_rate']:.2f} "
+              f"[{estimate['lower']:.2f}, {estimate['upper']:.2f}]")
+        return estimate
+    if mode == "scale":
+        from implicit_grid import scale_simulation
+
+        unsupported = [name for name, value in (("routing", routing), ("tracer", tracer), ("arrivals", arrivals),
+                                                ("user_selector", user_selector), ("topology", topology),
+                                                ("telemetry", telemetry)) if value is not None]
+        if backend != "networkx":
+            unsupported.append("backend")
+        if unsupported:
+            raise ValueError(f"mode='scale' does not support {', '.join(unsupported)}")
+        stats = scale_simulation(graph_size, mean_interarrival, mean_service, max_requests, edge_prob, Qc=Qc,
+                                 max_concurrent=MAX_CONCURRENT_REQUESTS)  # streams from the seeded global RNGs
+        print(f"Blocking Rate: {stats['blocking_rate']:.2f}")
+        if collect_stats:
+            return stats["total_requests"], stats["successful_requests"]
+        return stats
+    if mode != "simulate":
+        raise ValueError(f"Unknown mode {mode!r}, expected 'simulate', 'estimate' or 'scale'")
 
     # Set the global mean interarrival time for request generation
     Initialisation.mean_interarrival = mean_interarrival
 
     # Initialize the quantum network graph with given dimensions and entanglement probability
-    G = Initialisation.initialize_quantum_network(*graph_size, p=entanglement_prob)
+    if topology is not None:
+        from shared_topology import graph_from_topology, SharedRouter, SharedStar
+
+        if tuple(topology.shape) != tuple(graph_size):
+            raise ValueError(f"Shared topology is {topology.shape}, simulation needs {tuple(graph_size)}")
+        G = graph_from_topology(topology, p=entanglement_prob, Qc=Qc)
+        router = SharedRouter(G, topology, mode=routing) if routing is not None else SharedStar(G, topology)
+    else:
+        G = Initialisation.initialize_quantum_network(*graph_size, p=entanglement_prob, Qc=Qc)
+        router = GHZRouter(G, mode=routing) if routing is not None else None
+    if loss_dB is not None:
+        set_p_edge(G, p_op=entanglement_prob, loss_dB=loss_dB)  # p_edge from the length of every edge
+
+    nodes = list(G.nodes)  # built once, not on every arrival
+    if user_selector is not None:
+        user_selector.bind(nodes)
 
     # Perform necessary initialization for simulation
     initialize()
 
     sim_clock = 0.0  # Simulation clock to track the current simulation time
-    next_arrival_time = expon(mean_interarrival)  # Schedule the first request arrival event
+    # Schedule the first request arrival event
+    next_arrival_time = arrivals.next_arrival() if arrivals is not None else expon(mean_interarrival)
     next_departure_time = float('inf')  # Initially, no departures are scheduled
 
     entangled_requests = []  # List to track ongoing entangled requests and their departure times
+    departures = 0  # Counter for processed departure events
     total_requests = 0  # Counter for total requests made in the simulation
     successful_requests = 0  # Counter for successfully completed requests
+    blocked_busy_nodes = 0  # Requests blocked because one of their users is already in use
+    blocked_capacity = 0  # Requests blocked because MAX_CONCURRENT_REQUESTS are active
+    blocked_protocol = 0  # Requests blocked because SP_protocol did not generate the GHZ state in time
+    protocol_timesteps = 1000  # SP_protocol timeout per request
+    # Constant-memory streaming histograms for latency quantiles
+    histograms = {name: StreamingHistogram() for name in ("generation_time", "time_to_admission", "holding_time")}
+    if telemetry is not None:
+        telemetry.start()
 
     # Continue the simulation until the maximum number of requests is reached
     while total_requests < max_requests:
         # Process departures before new arrivals if necessary
-        while next_departure_time <= next_arrival_time:
+        while next_departure_time <= next_arrival_time and next_departure_time != float('inf'):
             sim_clock = next_departure_time  # Advance the simulation clock to the next departure event
             if entangled_requests:  # If there are ongoing entangled requests, process one
                 completed_request = entangled_requests.pop(0)  # Remove the first completed request
                 release_resources(G, completed_request[0])  # Release network resources used by the request
+                departures += 1
             # Update next departure time to the soonest remaining request departure
             next_departure_time = min((req[1] for req in entangled_requests), default=float('inf'))
 
+        if next_arrival_time == float('inf'):  # a finite (trace) arrival process has run out of requests
+            break
+
         # Process a new request arrival event
         sim_clock = next_arrival_time  # Move simulation clock to next arrival event
-        next_arrival_time += expon(mean_interarrival)  # Schedule next request arrival
+        # Schedule next request arrival
+        if arrivals is not None:
+            next_arrival_time = arrivals.next_arrival()
+        else:
+            next_arrival_time += expon(mean_interarrival)
 
         # Select a random center node and users in the network
-        center_node = random.choice(list(G.nodes))  # Pick a random node as the central node
-        users = random.sample(list(G.nodes - {center_node}), k=random.randint(3, 4))  # Select 3 or 4 random user nodes
+        if user_selector is not None:
+            users = user_selector.next_users()
+        else:
+            center_node = random.choice(nodes)  # Pick a random node as the central node
+            k = random.randint(3, 4)  # Select 3 or 4 random user nodes other than the center node
+            users = random.sample(nodes, k=k + 1)  # sampling one extra avoids copying the node list without the centre
+            if center_node in users:
+                users.remove(center_node)
+            else:
+                users.pop()
 
         # Check if the selected nodes are available for entanglement
         if check_node_availability(G, users, entangled_requests):
             if len(entangled_requests) < MAX_CONCURRENT_REQUESTS:  # Enforce resource constraints
                 # Run the SP_protocol to attempt entanglement
                 rate, gen_time, avg_links_used = SP_protocol(
-                    G, users, timesteps=1000, reps=1, count_fusion=False
+                    G, users, timesteps=protocol_timesteps, reps=1, count_fusion=False, router=router,
+                    tracer=tracer, histogram=histograms["time_to_admission"],
+                    backend=backend
                 )
+                histograms["generation_time"].add(gen_time[0] if gen_time[0] > 0 else protocol_timesteps)
 
                 if gen_time > 0:  # If entanglement was successful
                     successful_requests += 1  # Increment successful request counter
-                    departure_time = sim_clock + expon(mean_service)  # Compute departure time for this request
+                    holding_time = expon(mean_service)
+                    histograms["holding_time"].add(holding_time)
+                    departure_time = sim_clock + holding_time  # Compute departure time for this request
                     entangled_requests.append((users, departure_time))  # Track the request and its departure time
                     next_departure_time = min(req[1] for req in entangled_requests)  # Update next departure event
+                else:
+                    blocked_protocol += 1
+            else:
+                blocked_capacity += 1
+        else:
+            blocked_busy_nodes += 1
 
         total_requests += 1  # Increment total request count
+        if telemetry is not None:
+            telemetry.update(sim_clock, total_requests, successful_requests, len(entangled_requests),
+                             total_requests + departures)
 
     # Compute the blocking rate (ratio of failed requests)
     blocking_rate = calculate_blocking_rate(total_requests, successful_requests)
+    if telemetry is not None:
+        telemetry.finish(sim_clock, total_requests, successful_requests, len(entangled_requests),
+                         total_requests + departures)
 
     # Print summary of simulation results
     print("\nSimulation Complete")
@@ -332,6 +527,19 @@ def dynamic_simulation(graph_size=(3, 3), mean_interarrival=10.0, mean_service=3
     print(f"Successful Requests: {successful_requests}")
     print(f"Blocking Rate: {blocking_rate:.2f}")
 
+    if detailed_stats:
+        return {
+            "total_requests": total_requests,
+            "successful_requests": successful_requests,
+            "blocking_rate": blocking_rate,
+            "blocked_busy_nodes": blocked_busy_nodes,
+            "blocked_capacity": blocked_capacity,
+            "blocked_protocol": blocked_protocol,
+            "sim_time": sim_clock,
+            "quantiles": {name: h.summary() for name, h in histograms.items()},
+            "histograms": {name: h.to_dict() for name, h in histograms.items()},
+        }
+
     # If statistics collection is enabled, return the total and successful requests
     if collect_stats:
         return total_requests, successful_requests
@@ -339,6 +547,7 @@ def dynamic_simulation(graph_size=(3, 3), mean_interarrival=10.0, mean_service=3
         return None
 
 if __name__ == "__main__":
+    Initialisation.seed_rngs()
     dynamic_simulation(graph_size=(3, 3), max_requests=1000)
 
 
@@ -1,9 +1,13 @@
-import numpy as np
-import matplotlib.pyplot as plt
-from simulation_NEW_1 import dynamic_simulation, calculate_blocking_rate
+import argparse
+import os
 
+from Initialisation import seed_rngs
+from result_cache import ResultCache
+from sweep_pipeline import compute_sweeps, load_dataset, plot_sweep, get_pyplot
 
-def generate_statistics():
+
+def generate_statistics(dataset_path="results/statistics_result.json", output_dir="figures/statistics_result",
+                        render_only=False, formats=("png", "pdf")):
     """
     Generates statistics for the quantum network simulation by varying different parameters
     and plotting the blocking rate against traffic load and entanglement probability.
@@ -15,12 +19,13 @@ def generate_statistics():
        Blocking Rate vs. Traffic Load (Bottom Graph).
     3. Varies entanglement probability while keeping both mean interarrival and
        mean service time fixed, and plots Blocking Rate vs. Probability in a
-       separate window.
+       separate figure.
 
-    The maximum number of requests for each test is fixed at 1000.
+    The maximum number of requests for each test is fixed at 10000. Results are cached in `dataset_path`
+    and the figures are saved to `output_dir` (no display needed).
 
     Returns:
-        None: The function generates plots but does not return any values.
+        list: Paths of the written figure files.
     """
     max_requests = 10000 # Fixed max requests for all simulations
     fixed_service_time = 3.0
@@ -28,130 +33,65 @@ def generate_statistics():
     fixed_probability = 0.5
     graph_Size = (3,3)
 
-    # Varying mean interarrival time (Top Graph)
-    interarrival_times = np.linspace(2, 15, 10)  #
-
-    blocking_rates_interarrival = []
-
-    for interarrival in interarrival_times:
-        total_requests, successful_requests = dynamic_simulation(
+    if not render_only:
+        compute_sweeps(
+            dataset_path,
             graph_size=graph_Size,
-            mean_interarrival=interarrival,
-            mean_service=fixed_service_time,
-            max_requests=max_requests,
-            collect_stats=True,
-            entanglement_prob=fixed_probability
+            request_values=[max_requests],
+            fixed_interarrival=fixed_interarrival_time,
+            fixed_service=fixed_service_time,
+            fixed_probability=fixed_probability,
+            simulate=ResultCache().simulate,  # identical runs from earlier scripts/sweeps are served from the cache
         )
 
-        blocking_rate = calculate_blocking_rate(total_requests, successful_requests)
-
+    records = load_dataset(dataset_path)
+    for r in records:
         print(
-            f"Interarrival Time: {interarrival}, Total: {total_requests}, Successful: {successful_requests}, Blocking Rate: {blocking_rate}")
-
-        if total_requests > 0:  # Ensure that simulation ran before appending
-            blocking_rates_interarrival.append(blocking_rate)
-        else:
-            print(f"⚠ Warning: No requests processed for Interarrival Time {interarrival}")
-
-    print(f"Final Blocking Rates Collected: {len(blocking_rates_interarrival)} expected: {len(interarrival_times)}")
+            f"{r['sweep']}: Interarrival Time: {r['mean_interarrival']}, Service Time: {r['mean_service']}, "
+            f"Probability: {r['entanglement_prob']}, Total: {r['total_requests']}, "
+            f"Successful: {r['successful_requests']}, Blocking Rate: {r['blocking_rate']}")
 
-    # Varying mean service time (Bottom Graph)
-    service_times = np.linspace(1, 10, 10)
-    blocking_rates_service = []
-
-    for service in service_times:
-        total_requests, successful_requests = dynamic_simulation(
-            graph_size=graph_Size,
-            mean_interarrival=fixed_interarrival_time,
-            mean_service=service,
-            max_requests=max_requests,
-            collect_stats=True,
-            entanglement_prob=fixed_probability
-        )
-
-        blocking_rate = calculate_blocking_rate(total_requests, successful_requests)
-
-        print(
-            f"Service Time: {service}, Total: {total_requests}, Successful: {successful_requests}, Blocking Rate: {blocking_rate}")
-
-        # Ensure only 10 values are added
-        if total_requests > 0 and len(blocking_rates_service) < len(service_times):
-            blocking_rates_service.append(blocking_rate)
-        else:
-            print(f"⚠ Warning: Service time loop may be running extra iterations.")
-
-    # Plot Blocking Rate vs. Traffic Load (First Window)
-    traffic_load_interarrival = [fixed_service_time / inter for inter in interarrival_times]
-    traffic_load_service = [serv for serv in service_times / fixed_interarrival_time]
-
-    # Testing
-    print(f"Interarrival: {interarrival}, Total: {total_requests}, Successful: {successful_requests}")
-
-    if not blocking_rates_interarrival:
+    if not any(r["sweep"] == "interarrival" and r["total_requests"] > 0 for r in records):
         print("Error: No data collected for Blocking Rate vs. Traffic Load (Interarrival Time).")
-        return
-
-    plt.figure(figsize=(10, 8))
-
-    # Top Graph: Varying Interarrival Time
-    plt.subplot(2, 1, 1)
-    plt.plot(traffic_load_interarrival, blocking_rates_interarrival, marker='o', linestyle='-')
-    plt.xscale("log")
-    plt.xlabel("Traffic Load (Service Time / Interarrival Time)",fontsize=18)
-    plt.ylabel("Blocking Rate",fontsize=18)
-    plt.title("Blocking Rate vs. Traffic Load (Varying Interarrival Time)",fontsize=20,fontweight='bold')
-    # Increase tick font size
-    plt.xticks(fontsize=14)
-    plt.yticks(fontsize=14)
-
-    # Bottom Graph: Varying Service Time
-    plt.subplot(2, 1, 2)
-    plt.plot(traffic_load_service, blocking_rates_service, marker='s', linestyle='-')
-    plt.xscale("log")
-    plt.xlabel("Traffic Load (Service Time / Interarrival Time )",fontsize=18)
-    plt.ylabel("Blocking Rate",fontsize=18)
-    plt.title("Blocking Rate vs. Traffic Load (Varying Service Time)",fontsize=20,fontweight='bold')
-    # Increase tick font size
-    plt.xticks(fontsize=14)
-    plt.yticks(fontsize=14)
-
-    plt.tight_layout()
-    plt.show()
-
-    # Varying Probability (Second Window)
-    probabilities = np.linspace(0.1, 1.0, 10)  # Example range
-
-    blocking_rates_probability = []
-
-    for prob in probabilities:
-        total_requests, successful_requests = dynamic_simulation(
-            graph_size=graph_Size,
-            mean_interarrival=fixed_interarrival_time,
-            mean_service=fixed_service_time,
-            max_requests=max_requests,
-            collect_stats=True,
-            entanglement_prob=prob
-        )
-
-        blocking_rate = calculate_blocking_rate(total_requests, successful_requests)
-
-        print(
-            f"Probability: {prob}, Total: {total_requests}, Successful: {successful_requests}, Blocking Rate: {blocking_rate}")
-
-        if total_requests > 0 and len(blocking_rates_probability) < len(probabilities):
-            blocking_rates_probability.append(blocking_rate)
-
-    # Plot Blocking Rate vs. Probability (Second Window)
-    plt.figure(figsize=(8, 6))
-    plt.plot(probabilities, blocking_rates_probability, marker='^', linestyle='-')
-    plt.xlabel("Entanglement Probability",fontsize=18)
-    plt.ylabel("Blocking Rate",fontsize=18)
-    plt.title("Blocking Rate vs. Entanglement Probability",fontsize=20,fontweight='bold')
-    # Increase tick font size
-    plt.xticks(fontsize=14)
-    plt.yticks(fontsize=14)
-    plt.show()
+        return []
+
+    plt = get_pyplot()
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+
+    # Blocking Rate vs. Traffic Load (First Figure): interarrival sweep on top, service sweep below
+    fig = plt.figure(figsize=(10, 8))
+    for position, sweep in ((1, "interarrival"), (2, "service")):
+        ax = fig.add_subplot(2, 1, position)
+        plot_sweep(ax, records, sweep)
+        ax.tick_params(labelsize=14)  # Increase tick font size
+    fig.tight_layout()
+    for fmt in formats:
+        path = os.path.join(output_dir, f"blocking_traffic_load.{fmt}")
+        fig.savefig(path)
+        written.append(path)
+    plt.close(fig)
+
+    # Blocking Rate vs. Probability (Second Figure)
+    fig, ax = plt.subplots(figsize=(8, 6))
+    plot_sweep(ax, records, "probability")
+    ax.tick_params(labelsize=14)
+    for fmt in formats:
+        path = os.path.join(output_dir, f"blocking_probability.{fmt}")
+        fig.savefig(path)
+        written.append(path)
+    plt.close(fig)
+
+    return written
 
 
 if __name__ == "__main__":
-    generate_statistics()
+    parser = argparse.ArgumentParser(description="Blocking rate sweeps for a 3x3 grid and 10000 requests")
+    parser.add_argument("--dataset", default="results/statistics_result.json", help="cached results dataset")
+    parser.add_argument("--output", default="figures/statistics_result", help="directory for figures")
+    parser.add_argument("--render-only", action="store_true", help="re-plot from the dataset without simulating")
+    args = parser.parse_args()
+
+    seed_rngs()
+    for path in generate_statistics(args.dataset, args.output, render_only=args.render_only):
+        print(f"Wrote {path}")
@@ -1,9 +1,13 @@
-import numpy as np
-import matplotlib.pyplot as plt
-from simulation_NEW_1 import dynamic_simulation, calculate_blocking_rate
+import argparse
 
+from Initialisation import seed_rngs
+from result_cache import ResultCache
+from adaptive_sweep import adaptive_sweeps
+from sweep_pipeline import compute_sweeps, render_report
 
-def generate_statistics():
+
+def generate_statistics(dataset_path="results/vary_request.json", output_dir="figures/vary_request",
+                        render_only=False, formats=("png", "pdf", "html"), adaptive=False, budget=2000000):
     """
     Generates statistics for the quantum network simulation by varying different parameters
     while considering different request numbers (1000, 10000, 100000) in a single diagram.
@@ -16,112 +20,62 @@ def generate_statistics():
     3. Varies entanglement probability while keeping both mean interarrival and
        mean service time fixed, and plots Blocking Rate vs. Probability.
 
+    Simulation results are cached in `dataset_path` (points already computed are skipped), and the figures
+    are written to `output_dir` with a non-interactive backend instead of being shown.
+
+    Parameters:
+        dataset_path (str): JSON dataset holding the simulation results.
+        output_dir (str): Directory for the rendered figures and HTML report.
+        render_only (bool): If True, only re-plot from the cached dataset without running any simulation.
+        formats (tuple): Output formats, any of "png", "pdf", "html".
+        adaptive (bool): If True, use adaptive_sweeps instead of the fixed 10-point grids: points are placed
+                         where the blocking rate changes fastest or is least certain, within `budget`.
+        budget (int): Total number of simulated requests of the adaptive sweep.
+
     Returns:
-        None: The function generates plots but does not return any values.
+        list: Paths of the written figure/report files.
     """
     request_values = [1000, 10000, 100000]  # Different max request numbers
-    colors = ['green', 'red', 'blue']  # Colors for each request scenario
-    labels = ['1000 requests', '10000 requests', '100000 requests']
-3
+
     fixed_service_time = 3.0
     fixed_interarrival_time = 5.0
     fixed_probability = 0.5
     graph_Size = (6, 6)
 
-    # === 1. Varying Mean Interarrival Time ===
-    interarrival_times = np.linspace(2, 15, 10)
-    plt.figure(figsize=(10, 6))
-
-    for i, max_requests in enumerate(request_values):
-        blocking_rates_interarrival = []
-
-        for interarrival in interarrival_times:
-            total_requests, successful_requests = dynamic_simulation(
-                graph_size=graph_Size,
-                mean_interarrival=interarrival,
-                mean_service=fixed_service_time,
-                max_requests=max_requests,
-                collect_stats=True,
-                entanglement_prob=fixed_probability
-            )
-
-            blocking_rate = calculate_blocking_rate(total_requests, successful_requests)
-            blocking_rates_interarrival.append(blocking_rate)
-
-        traffic_load_interarrival = [fixed_service_time / inter for inter in interarrival_times]
-        plt.plot(traffic_load_interarrival, blocking_rates_interarrival, marker='o', linestyle='-',
-                 color=colors[i], label=labels[i])
-
-    plt.xscale("log")
-    plt.xlabel("Traffic Load (Service Time / Interarrival Time)",fontsize=18)
-    plt.ylabel("Blocking Rate",fontsize=18)
-    plt.title("Blocking Rate vs. Traffic Load (Varying Interarrival Time)",fontsize=20,fontweight='bold')
-    plt.legend()
-    plt.grid()
-    plt.show()
-
-    # === 2. Varying Mean Service Time ===
-    service_times = np.linspace(1, 10, 10)
-    plt.figure(figsize=(10, 6))
-
-    for i, max_requests in enumerate(request_values):
-        blocking_rates_service = []
-
-        for service in service_times:
-            total_requests, successful_requests = dynamic_simulation(
-                graph_size=graph_Size,
-                mean_interarrival=fixed_interarrival_time,
-                mean_service=service,
-                max_requests=max_requests,
-                collect_stats=True,
-                entanglement_prob=fixed_probability
-            )
-
-            blocking_rate = calculate_blocking_rate(total_requests, successful_requests)
-            blocking_rates_service.append(blocking_rate)
-
-        traffic_load_service = [serv for serv in service_times / fixed_interarrival_time]
-        plt.plot(traffic_load_service, blocking_rates_service, marker='s', linestyle='-',
-                 color=colors[i], label=labels[i])
-
-    plt.xscale("log")
-    plt.xlabel("Traffic Load (Service Time / Interarrival Time)",fontsize=18)
-    plt.ylabel("Blocking Rate",fontsize=18)
-    plt.title("Blocking Rate vs. Traffic Load (Varying Service Time)",fontsize=20,fontweight='bold')
-    plt.legend()
-    plt.grid()
-    plt.show()
-
-    # === 3. Varying Entanglement Probability ===
-    probabilities = np.linspace(0.1, 1.0, 10)
-    plt.figure(figsize=(10, 6))
-
-    for i, max_requests in enumerate(request_values):
-        blocking_rates_probability = []
-
-        for prob in probabilities:
-            total_requests, successful_requests = dynamic_simulation(
-                graph_size=graph_Size,
-                mean_interarrival=fixed_interarrival_time,
-                mean_service=fixed_service_time,
-                max_requests=max_requests,
-                collect_stats=True,
-                entanglement_prob=prob
-            )
-
-            blocking_rate = calculate_blocking_rate(total_requests, successful_requests)
-            blocking_rates_probability.append(blocking_rate)
-
-        plt.plot(probabilities, blocking_rates_probability, marker='^', linestyle='-',
-                 color=colors[i], label=labels[i])
-
-    plt.xlabel("Entanglement Probability",fontsize=18)
-    plt.ylabel("Blocking Rate",fontsize=18)
-    plt.title("Blocking Rate vs. Entanglement Probability",fontsize=20,fontweight='bold')
-    plt.legend()
-    plt.grid()
-    plt.show()
+    if not render_only and adaptive:
+        adaptive_sweeps(
+            dataset_path,
+            graph_size=graph_Size,
+            request_values=request_values,
+            fixed_interarrival=fixed_interarrival_time,
+            fixed_service=fixed_service_time,
+            fixed_probability=fixed_probability,
+            budget=budget,
+        )
+    elif not render_only:
+        compute_sweeps(
+            dataset_path,
+            graph_size=graph_Size,
+            request_values=request_values,
+            fixed_interarrival=fixed_interarrival_time,
+            fixed_service=fixed_service_time,
+            fixed_probability=fixed_probability,
+            simulate=ResultCache().simulate,  # identical runs from earlier scripts/sweeps are served from the cache
+        )
+
+    return render_report(dataset_path, output_dir, formats=formats)
 
 
 if __name__ == "__main__":
-    generate_statistics()
+    parser = argparse.ArgumentParser(description="Blocking rate sweeps for 1000/10000/100000 requests")
+    parser.add_argument("--dataset", default="results/vary_request.json", help="cached results dataset")
+    parser.add_argument("--output", default="figures/vary_request", help="directory for figures")
+    parser.add_argument("--render-only", action="store_true", help="re-plot from the dataset without simulating")
+    parser.add_argument("--adaptive", action="store_true", help="refine the sweeps adaptively instead of fixed grids")
+    parser.add_argument("--budget", type=int, default=2000000, help="simulated requests of the adaptive sweep")
+    args = parser.parse_args()
+
+    seed_rngs()
+    for path in generate_statistics(args.dataset, args.output, render_only=args.render_only,
+                                    adaptive=args.adaptive, budget=args.budget):
+        print(f"Wrote {path}")
@@ -0,0 +1,235 @@
+import base64
+import json
+import os
+
+from lazy_imports import lazy_import
+from simulation_NEW_1 import dynamic_simulation, calculate_blocking_rate
+
+np = lazy_import("numpy")
+
+# Parameter swept by each sweep, and the marker used for it in the original figures
+SWEEP_PARAMETERS = {
+    "interarrival": "mean_interarrival",
+    "service": "mean_service",
+    "probability": "entanglement_prob",
+}
+SWEEP_MARKERS = {"interarrival": "o", "service": "s", "probability": "^"}
+SWEEP_TITLES = {
+    "interarrival": "Blocking Rate vs. Traffic Load (Varying Interarrival Time)",
+    "service": "Blocking Rate vs. Traffic Load (Varying Service Time)",
+    "probability": "Blocking Rate vs. Entanglement Probability",
+}
+
+
+def default_sweeps():
+    """Return the sweep grids used by generate_statistics (interarrival 2-15, service 1-10, probability 0.1-1.0)."""
+    return {
+        "interarrival": np.linspace(2, 15, 10),
+        "service": np.linspace(1, 10, 10),
+        "probability": np.linspace(0.1, 1.0, 10),
+    }
+
+
+def load_dataset(dataset_path):
+    """
+    Load the cached sweep results.
+
+    Parameters:
+    dataset_path (str): Path of the JSON dataset written by compute_sweeps.
+
+    Returns:
+    list: One dict per simulated sweep point (empty if the dataset does not exist yet).
+    """
+    if not os.path.exists(dataset_path):
+        return []
+    with open(dataset_path) as f:
+        return json.load(f)["records"]
+
+
+def save_dataset(dataset_path, records):
+    """Write the sweep records to `dataset_path`, replacing the file atomically."""
+    directory = os.path.dirname(os.path.abspath(dataset_path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = dataset_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"records": records}, f, indent=1)
+    os.replace(tmp_path, dataset_path)  # a crashed run never leaves a half-written dataset behind
+
+
+def _record_key(record):
+    return (
+        record["sweep"],
+        tuple(record["graph_size"]),
+        record["max_requests"],
+        round(record["mean_interarrival"], 9),
+        round(record["mean_service"], 9),
+        round(record["entanglement_prob"], 9),
+    )
+
+
+def compute_sweeps(dataset_path, graph_size=(6, 6), request_values=(1000, 10000, 100000),
+                   fixed_interarrival=5.0, fixed_service=3.0, fixed_probability=0.5, sweeps=None,
+                   simulate=dynamic_simulation):
+    """
+    Compute stage: run dynamic_simulation for every sweep point and store the results in a dataset.
+
+    Points already present in the dataset are not simulated again, so an interrupted run resumes where it stopped
+    and re-running with the same grid is free. The dataset is saved after every point.
+
+    Parameters:
+    dataset_path (str): JSON file the results are cached in.
+    graph_size (tuple): Dimensions of the quantum network grid (rows, cols).
+    request_values (iterable): max_requests values, one curve per value.
+    fixed_interarrival (float): Mean interarrival time used when another parameter is swept.
+    fixed_service (float): Mean service time used when another parameter is swept.
+    fixed_probability (float): Entanglement probability used when another parameter is swept.
+    sweeps (dict): {sweep name: values}, defaults to default_sweeps().
+    simulate (callable): Function with the dynamic_simulation signature returning (total, successful).
+
+    Returns:
+    list: All records in the dataset after the compute stage.
+    """
+    if sweeps is None:
+        sweeps = default_sweeps()
+
+    records = load_dataset(dataset_path)
+    done = {_record_key(r) for r in records}
+
+    for sweep, values in sweeps.items():
+        parameter = SWEEP_PARAMETERS[sweep]
+        for max_requests in request_values:
+            for value in values:
+                params = {
+                    "mean_interarrival": float(fixed_interarrival),
+                    "mean_service": float(fixed_service),
+                    "entanglement_prob": float(fixed_probability),
+                }
+                params[parameter] = float(value)
+                record = {"sweep": sweep, "graph_size": list(graph_size), "max_requests": int(max_requests), **params}
+                if _record_key(record) in done:
+                    continue
+
+                total_requests, successful_requests = simulate(
+                    graph_size=tuple(graph_size),
+                    max_requests=int(max_requests),
+                    collect_stats=True,
+                    **params
+                )
+                record["total_requests"] = total_requests
+                record["successful_requests"] = successful_requests
+                record["blocking_rate"] = calculate_blocking_rate(total_requests, successful_requests)
+
+                records.append(record)
+                done.add(_record_key(record))
+                save_dataset(dataset_path, records)
+
+    return records
+
+
+def _curves(records, sweep):
+    """Group the records of one sweep into {max_requests: (x, blocking_rates)} sorted by x."""
+    curves = {}
+    for r in records:
+        if r["sweep"] != sweep:
+            continue
+        if sweep == "probability":
+            x = r["entanglement_prob"]
+        else:
+            x = r["mean_service"] / r["mean_interarrival"]  # traffic load
+        curves.setdefault(r["max_requests"], []).append((x, r["blocking_rate"]))
+    return {k: tuple(zip(*sorted(v))) for k, v in sorted(curves.items())}
+
+
+def plot_sweep(ax, records, sweep, colors=("green", "red", "blue")):
+    """
+    Draw one sweep (one curve per max_requests value) onto matplotlib axes `ax`.
+
+    Parameters:
+    ax: matplotlib Axes to draw on.
+    records (list): Dataset records (see load_dataset).
+    sweep (str): "interarrival", "service" or "probability".
+    colors (tuple): Curve colours, cycled over the max_requests values.
+    """
+    curves = _curves(records, sweep)
+    for i, (max_requests, (x, y)) in enumerate(curves.items()):
+        ax.plot(x, y, marker=SWEEP_MARKERS[sweep], linestyle='-', color=colors[i % len(colors)],
+                label=f"{max_requests} requests")
+
+    if sweep == "probability":
+        ax.set_xlabel("Entanglement Probability", fontsize=18)
+    else:
+        ax.set_xscale("log")
+        ax.set_xlabel("Traffic Load (Service Time / Interarrival Time)", fontsize=18)
+    ax.set_ylabel("Blocking Rate", fontsize=18)
+    ax.set_title(SWEEP_TITLES[sweep], fontsize=20, fontweight='bold')
+    if len(curves) > 1:
+        ax.legend()
+    ax.grid()
+
+
+def get_pyplot():
+    """Import pyplot with the non-interactive Agg backend, so rendering works on display-less nodes."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def render_report(dataset_path, output_dir, formats=("png", "pdf", "html"), sweeps=None):
+    """
+    Render stage: write one figure per sweep from the cached dataset, no simulation is run.
+
+    Parameters:
+    dataset_path (str): JSON dataset written by compute_sweeps.
+    output_dir (str): Directory the figures (and report.html) are written to.
+    formats (tuple): Any of "png", "pdf", "html". "html" writes a single report embedding the PNG figures.
+    sweeps (iterable): Sweep names to render, defaults to every sweep present in the dataset.
+
+    Returns:
+    list: Paths of the written files.
+    """
+    plt = get_pyplot()
+    records = load_dataset(dataset_path)
+    if sweeps is None:
+        sweeps = [s for s in SWEEP_PARAMETERS if any(r["sweep"] == s for r in records)]
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    html_sections = []
+
+    for sweep in sweeps:
+        fig, ax = plt.subplots(figsize=(10, 6))
+        plot_sweep(ax, records, sweep)
+        fig.tight_layout()
+
+        base = os.path.join(output_dir, f"blocking_{sweep}")
+        for fmt in ("png", "pdf"):
+            if fmt in formats or (fmt == "png" and "html" in formats):
+                fig.savefig(f"{base}.{fmt}")
+                written.append(f"{base}.{fmt}")
+        plt.close(fig)
+
+        if "html" in formats:
+            with open(f"{base}.png", "rb") as f:
+                image = base64.b64encode(f.read()).decode("ascii")
+            rows = "".join(
+                f"<tr><td>{r['max_requests']}</td><td>{r['mean_interarrival']:.3f}</td><td>{r['mean_service']:.3f}</td>"
+                f"<td>{r['entanglement_prob']:.3f}</td><td>{r['total_requests']}</td><td>{r['successful_requests']}</td>"
+                f"<td>{r['blocking_rate']:.4f}</td></tr>"
+                for r in records if r["sweep"] == sweep
+            )
+            html_sections.append(
+                f"<h2>{SWEEP_TITLES[sweep]}</h2><img src=\"data:image/png;base64,{image}\">"
+                "<table><tr><th>Requests</th><th>Interarrival</th><th>Service</th><th>p</th>"
+                f"<th>Total</th><th>Successful</th><th>Blocking Rate</th></tr>{rows}</table>"
+            )
+
+    if "html" in formats:
+        path = os.path.join(output_dir, "report.html")
+        with open(path, "w") as f:
+            f.write("<html><head><title>Blocking rate sweeps</title></head><body>")
+            f.write("".join(html_sections))
+            f.write("</body></html>")
+        written.append(path)
+
+    return written
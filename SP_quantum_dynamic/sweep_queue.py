@@ -0,0 +1,449 @@
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+
+from Initialisation import seed_rngs
+from shared_topology import SharedSimulate, init_worker, shared_topologies
+from simulation_NEW_1 import dynamic_simulation, calculate_blocking_rate
+from sweep_pipeline import load_dataset, save_dataset
+from telemetry import Telemetry
+
+STATES = ("pending", "running", "done", "failed")
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_HEARTBEAT = 60.0  # seconds between touches of a running job's file by its worker
+
+
+def job_id_for(params):
+    """Content hash of the job parameters, so submitting the same sweep point twice gives the same job."""
+    blob = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+def jobs_from_grid(grid, fixed=None):
+    """
+    Expand a parameter grid into one job (dict of dynamic_simulation keyword arguments) per combination.
+
+    Parameters:
+    grid (dict): {parameter: list of values}, e.g. {"mean_interarrival": [2, 5, 10], "max_requests": [1000]}.
+    fixed (dict): Parameters shared by every job, e.g. {"graph_size": [6, 6]}.
+
+    Returns:
+    list: Job parameter dicts.
+    """
+    fixed = dict(fixed or {})
+    names = list(grid)
+    jobs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(fixed)
+        params.update({name: _plain(value) for name, value in zip(names, values)})
+        jobs.append(params)
+    return jobs
+
+
+def _plain(value):
+    """Convert NumPy scalars/tuples to JSON-friendly Python values."""
+    if isinstance(value, (tuple, list)):
+        return [_plain(v) for v in value]
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+class FileJobQueue:
+    """
+    Job queue stored in a directory, shared between hosts over a common file system (e.g. NFS).
+
+    Each job is a JSON file that moves between the pending/, running/, done/ and failed/ sub-directories.
+    Workers claim a job with an atomic os.rename from pending/ to running/, so a job is never run by two
+    workers at once. Results are written to results/<job_id>.json before the job is marked done. While a job
+    runs its worker touches the file in running/ every heartbeat, so requeue_stale only returns jobs whose
+    worker stopped.
+
+    Parameters:
+    root (str): Queue directory.
+    max_attempts (int): Number of times a job is tried before it is moved to failed/. It is stored in the queue's
+                        config.json, so workers that open the queue without it (on any host) apply the same limit;
+                        None keeps the stored value (DEFAULT_MAX_ATTEMPTS if there is none).
+    """
+
+    def __init__(self, root, max_attempts=None):
+        self.root = root
+        for state in STATES + ("results",):
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+        if max_attempts is not None:
+            self._write(os.path.join(root, "config.json"), {"max_attempts": int(max_attempts)})
+
+    @property
+    def max_attempts(self):
+        """Retry limit from the queue's config.json, re-read on every use so a running worker sees changes."""
+        try:
+            with open(os.path.join(self.root, "config.json")) as f:
+                return int(json.load(f)["max_attempts"])
+        except (FileNotFoundError, KeyError, ValueError):
+            return DEFAULT_MAX_ATTEMPTS
+
+    def _path(self, state, job_id):
+        return os.path.join(self.root, state, f"{job_id}.json")
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def submit(self, params, seed=None):
+        """
+        Add a job unless a job with the same parameters already exists in any state.
+
+        Returns:
+        str: The job id.
+        """
+        job_id = job_id_for(params)
+        if any(os.path.exists(self._path(state, job_id)) for state in STATES):
+            return job_id
+        if seed is None:
+            seed = int(job_id, 16) % (2 ** 31)  # reproducible per sweep point, independent of the worker
+        self._write(self._path("pending", job_id), {"id": job_id, "params": params, "seed": seed, "attempts": 0})
+        return job_id
+
+    def claim(self, worker_id):
+        """
+        Take the next pending job.
+
+        Returns:
+        dict: The job, or None if no job is pending.
+        """
+        for name in sorted(os.listdir(os.path.join(self.root, "pending"))):
+            if not name.endswith(".json"):
+                continue
+            job_id = name[:-5]
+            running = self._path("running", job_id)
+            try:
+                os.rename(self._path("pending", job_id), running)
+            except FileNotFoundError:
+                continue  # another worker claimed it first
+            with open(running) as f:
+                job = json.load(f)
+            job["worker"] = worker_id
+            job["attempts"] += 1
+            job["claimed_at"] = time.time()
+            self._write(running, job)
+            return job
+        return None
+
+    def owns(self, job):
+        """Whether the job's file in running/ is still this claim (not requeued, or claimed again elsewhere)."""
+        try:
+            with open(self._path("running", job["id"])) as f:
+                running = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        return running.get("worker") == job["worker"] and running.get("claimed_at") == job["claimed_at"]
+
+    def heartbeat(self, job):
+        """
+        Touch the running file of a claimed job so requeue_stale sees its worker is alive.
+
+        Returns:
+        bool: False if the job is no longer running (it was requeued).
+        """
+        try:
+            os.utime(self._path("running", job["id"]))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete(self, job, result):
+        """
+        Store the result of a job and mark it done.
+
+        A job that was requeued meanwhile (its worker looked stale) is taken out of pending/; one that another
+        worker claimed again is left to that worker, which stores the same result (the seed is part of the job).
+
+        Returns:
+        bool: True if this call marked the job done.
+        """
+        self._write(os.path.join(self.root, "results", f"{job['id']}.json"), result)
+        source = self._path("running", job["id"]) if self.owns(job) else self._path("pending", job["id"])
+        try:
+            os.replace(source, self._path("done", job["id"]))
+        except FileNotFoundError:
+            return False  # claimed again by another worker
+        return True
+
+    def fail(self, job, error):
+        """
+        Return a failed job to pending/, or move it to failed/ once max_attempts is reached.
+
+        Nothing is changed if the job was requeued or claimed elsewhere meanwhile; that run decides its state.
+        """
+        if not self.owns(job):
+            return
+        job["error"] = error
+        state = "failed" if job["attempts"] >= self.max_attempts else "pending"
+        self._write(self._path("running", job["id"]), job)
+        try:
+            os.replace(self._path("running", job["id"]), self._path(state, job["id"]))
+        except FileNotFoundError:
+            pass  # requeued between the check and the move
+
+    def requeue_stale(self, timeout):
+        """
+        Return running jobs whose worker has not sent a heartbeat within `timeout` seconds (e.g. the host died) to
+        pending/. The timeout should be several times the workers' heartbeat interval.
+
+        Returns:
+        int: Number of requeued jobs.
+        """
+        count = 0
+        now = time.time()
+        for name in os.listdir(os.path.join(self.root, "running")):
+            path = os.path.join(self.root, "running", name)
+            try:
+                if now - os.path.getmtime(path) > timeout:
+                    os.replace(path, os.path.join(self.root, "pending", name))
+                    count += 1
+            except FileNotFoundError:
+                continue  # finished in the meantime
+        return count
+
+    def retry_failed(self):
+        """Move every job in failed/ back to pending/ with a fresh attempt budget."""
+        count = 0
+        for name in os.listdir(os.path.join(self.root, "failed")):
+            path = os.path.join(self.root, "failed", name)
+            with open(path) as f:
+                job = json.load(f)
+            job["attempts"] = 0
+            self._write(os.path.join(self.root, "pending", name), job)
+            os.remove(path)
+            count += 1
+        return count
+
+    def status(self):
+        """Number of jobs in each state."""
+        return {state: len(os.listdir(os.path.join(self.root, state))) for state in STATES}
+
+
+def run_job(job, simulate=dynamic_simulation, telemetry=None):
+    """
+    Run one job through the collect_stats path of dynamic_simulation and build its result record.
+
+    If a telemetry.Telemetry is given it is labelled with the job id and passed to the simulation.
+    """
+    params = dict(job["params"])
+    if "graph_size" in params:
+        params["graph_size"] = tuple(params["graph_size"])
+    if telemetry is not None:
+        telemetry.start({"job": job["id"]})
+        params["telemetry"] = telemetry
+    seed_rngs(job["seed"])
+    total_requests, successful_requests = simulate(collect_stats=True, **params)
+    return {
+        "job_id": job["id"],
+        "seed": job["seed"],
+        **job["params"],
+        "total_requests": total_requests,
+        "successful_requests": successful_requests,
+        "blocking_rate": calculate_blocking_rate(total_requests, successful_requests),
+    }
+
+
+class _Heartbeat:
+    """Context manager touching a running job's file from a background thread every `interval` seconds."""
+
+    def __init__(self, queue, job, interval):
+        self.queue = queue
+        self.job = job
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+
+    def _beat(self):
+        while not self._stop.wait(self.interval):
+            if not self.queue.heartbeat(self.job):
+                break
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(queue_root, worker_id=None, simulate=dynamic_simulation, max_jobs=None, wait=0.0, poll_interval=1.0,
+               telemetry=None, heartbeat=DEFAULT_HEARTBEAT):
+    """
+    Worker loop: claim, run and complete jobs until the queue is empty.
+
+    Parameters:
+    queue_root (str): Queue directory (shared between hosts).
+    worker_id (str): Name recorded in claimed jobs, defaults to host:pid.
+    simulate (callable): Simulation function with the dynamic_simulation signature.
+    max_jobs (int): Stop after this many jobs (None for no limit).
+    wait (float): Keep polling for new jobs this many seconds after the queue ran empty.
+    poll_interval (float): Seconds between polls while waiting.
+    telemetry (Telemetry): Optional telemetry.Telemetry reporting the progress of every job, labelled with the
+                           worker id.
+    heartbeat (float): Seconds between touches of the running job's file (see FileJobQueue.requeue_stale).
+
+    Returns:
+    int: Number of jobs completed by this worker.
+    """
+    queue = FileJobQueue(queue_root)
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    completed = 0
+    idle_since = None
+    if telemetry is not None:
+        telemetry.labels["worker"] = worker_id
+
+    while max_jobs is None or completed < max_jobs:
+        job = queue.claim(worker_id)
+        if job is None:
+            idle_since = idle_since or time.time()
+            if time.time() - idle_since >= wait:
+                break
+            time.sleep(poll_interval)
+            continue
+        idle_since = None
+
+        try:
+            with _Heartbeat(queue, job, heartbeat):
+                result = run_job(job, simulate, telemetry)
+        except Exception:
+            queue.fail(job, traceback.format_exc())
+        else:
+            if queue.complete(job, result):
+                completed += 1
+
+    return completed
+
+
+def merge_results(queue_root, store_path):
+    """
+    Merge every result in the queue into the dataset at `store_path`.
+
+    Records are keyed by job id, so merging the same (or a partial) set of results repeatedly never
+    duplicates a sweep point.
+
+    Returns:
+    list: All records in the store after merging.
+    """
+    existing = load_dataset(store_path)
+    records = {r["job_id"]: r for r in existing if "job_id" in r}
+    others = [r for r in existing if "job_id" not in r]
+    results_dir = os.path.join(queue_root, "results")
+    for name in sorted(os.listdir(results_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(results_dir, name)) as f:
+                result = json.load(f)
+            records[result["job_id"]] = result
+    merged = others + [records[k] for k in sorted(records)]
+    save_dataset(store_path, merged)
+    return merged
+
+
+def run_local_workers(queue_root, num_workers=None, simulate=dynamic_simulation, shared_sizes=None):
+    """
+    Start `num_workers` worker processes on this host and wait until the queue is drained.
+
+    If shared_sizes (list of grid sizes) is given, those topologies and their routing tables are published once
+    in shared memory and every worker attaches to them instead of building its own (see shared_topology.py).
+    """
+    num_workers = num_workers or multiprocessing.cpu_count()
+    if shared_sizes:
+        with shared_topologies(shared_sizes) as specs:
+            _start_workers(queue_root, num_workers, SharedSimulate(simulate), specs)
+    else:
+        _start_workers(queue_root, num_workers, simulate, None)
+
+
+def _start_workers(queue_root, num_workers, simulate, specs):
+    processes = [
+        multiprocessing.Process(target=_worker_main,
+                                args=(queue_root, f"{socket.gethostname()}:local{i}", simulate, specs))
+        for i in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def _worker_main(queue_root, worker_id, simulate, specs):
+    if specs:
+        init_worker(specs)
+    run_worker(queue_root, worker_id, simulate)
+
+
+def coordinate_sweep(jobs, queue_root, store_path, num_workers=None, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                     simulate=dynamic_simulation, share_topology=False):
+    """
+    Submit a sweep, run it on local workers, retry failed jobs up to max_attempts and merge the results.
+
+    Workers on other hosts can join at any time with `python sweep_queue.py worker <queue_root>`.
+    With share_topology=True the local workers attach to shared-memory topologies of the sweep's grid sizes
+    (same results, see shared_topology.py).
+
+    Returns:
+    dict: Final queue status.
+    """
+    queue = FileJobQueue(queue_root, max_attempts=max_attempts)
+    for params in jobs:
+        queue.submit(params)
+
+    # failed jobs go straight back to pending/ until they run out of attempts, so one pass drains the queue
+    shared_sizes = [params.get("graph_size", (3, 3)) for params in jobs] if share_topology else None
+    run_local_workers(queue_root, num_workers, simulate, shared_sizes)
+    merge_results(queue_root, store_path)
+    return queue.status()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="File-based sweep queue for dynamic_simulation")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker = sub.add_parser("worker", help="run jobs from a (shared) queue directory")
+    worker.add_argument("queue")
+    worker.add_argument("--wait", type=float, default=0.0, help="seconds to keep polling once the queue is empty")
+    worker.add_argument("--telemetry", type=float, default=None, metavar="SECONDS",
+                        help="log progress of the running job every SECONDS")
+    worker.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics of the running job on localhost:PORT")
+    worker.add_argument("--heartbeat", type=float, default=DEFAULT_HEARTBEAT,
+                        help="seconds between heartbeats of the running job (keep well below the requeue timeout)")
+    merge = sub.add_parser("merge", help="merge finished results into a dataset")
+    merge.add_argument("queue")
+    merge.add_argument("store")
+    status = sub.add_parser("status", help="show job counts")
+    status.add_argument("queue")
+    requeue = sub.add_parser("requeue", help="requeue stale running jobs and failed jobs")
+    requeue.add_argument("queue")
+    requeue.add_argument("--timeout", type=float, default=3600.0,
+                         help="seconds without a heartbeat after which a running job is requeued")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        telemetry = None
+        if args.telemetry is not None or args.metrics_port is not None:
+            logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+            telemetry = Telemetry(interval=args.telemetry or 10.0, sink="log" if args.telemetry else "none")
+            if args.metrics_port is not None:
+                telemetry.serve(args.metrics_port)
+        print(f"Completed {run_worker(args.queue, wait=args.wait, telemetry=telemetry, heartbeat=args.heartbeat)} jobs")
+    elif args.command == "merge":
+        print(f"Store holds {len(merge_results(args.queue, args.store))} records")
+    elif args.command == "status":
+        print(FileJobQueue(args.queue).status())
+    elif args.command == "requeue":
+        queue = FileJobQueue(args.queue)
+        print(f"Requeued {queue.requeue_stale(args.timeout)} stale and {queue.retry_failed()} failed jobs")
@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("telemetry")
+
+METRICS = (
+    # (snapshot key, metric name, type, help)
+    ("sim_time", "quantum_sim_simulated_time", "gauge", "Simulation clock of the run"),
+    ("requests", "quantum_sim_requests_total", "counter", "Requests processed"),
+    ("successful", "quantum_sim_successful_requests_total", "counter", "Requests admitted"),
+    ("events", "quantum_sim_events_total", "counter", "Arrival and departure events processed"),
+    ("events_per_s", "quantum_sim_events_per_second", "gauge", "Events per wall-clock second since the last sample"),
+    ("blocking_rate", "quantum_sim_blocking_rate", "gauge", "Blocking rate so far"),
+    ("active", "quantum_sim_active_requests", "gauge", "Requests currently holding their users"),
+    ("rss_bytes", "quantum_sim_resident_memory_bytes", "gauge", "Resident set size of the process"),
+    ("wall_s", "quantum_sim_wall_seconds", "gauge", "Wall-clock seconds since the run started"),
+    ("updated", "quantum_sim_last_update_timestamp_seconds", "gauge",
+     "Unix time of the last sample; a stale value means a stalled worker"),
+)
+
+
+def current_rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # kB on Linux
+
+
+class Telemetry:
+    """
+    Opt-in progress telemetry for dynamic_simulation.
+
+    The simulation calls update() once per request. To keep the hot loop fast the clock is only read every
+    `check_every` calls, and a sample (events/sec, blocking rate, RSS, ...) is only taken and emitted once
+    `interval` wall-clock seconds have passed. Samples go to the "telemetry" logger, to a callable, and/or to a
+    Prometheus text endpoint on localhost (see serve()).
+
+    Parameters:
+    interval (float): Seconds between samples.
+    sink (str or callable): "log", "none" (endpoint only) or a function called with every snapshot dict.
+    labels (dict): Labels attached to every sample, e.g. {"worker": "host:3", "job": "ab12"}, so slow or
+                   stalled workers of a sweep can be told apart.
+    check_every (int): update() calls between clock reads.
+    """
+
+    def __init__(self, interval=10.0, sink="log", labels=None, check_every=64):
+        self.interval = interval
+        self.sink = sink
+        self.labels = dict(labels or {})
+        self.check_every = check_every
+        self.snapshot = {}
+        self.server = None
+        self._lock = threading.Lock()
+        self.start()
+
+    def start(self, labels=None):
+        """Reset the counters for a new run (labels, if given, are updated)."""
+        if labels:
+            self.labels.update(labels)
+        self._calls = 0
+        self._started = time.monotonic()
+        self._last_sample = self._started
+        self._last_events = 0
+
+    def update(self, sim_time, requests, successful, active, events):
+        """Cheap per-request hook; samples at most once per `interval`."""
+        self._calls += 1
+        if self._calls % self.check_every:
+            return
+        now = time.monotonic()
+        if now - self._last_sample >= self.interval:
+            self._sample(now, sim_time, requests, successful, active, events)
+
+    def finish(self, sim_time, requests, successful, active, events):
+        """Emit a final sample at the end of a run."""
+        self._sample(time.monotonic(), sim_time, requests, successful, active, events, final=True)
+
+    def _sample(self, now, sim_time, requests, successful, active, events, final=False):
+        elapsed = now - self._last_sample
+        snapshot = {
+            "sim_time": sim_time,
+            "requests": requests,
+            "successful": successful,
+            "events": events,
+            "events_per_s": (events - self._last_events) / elapsed if elapsed > 0 else 0.0,
+            "blocking_rate": 1 - successful / requests if requests else 0.0,
+            "active": active,
+            "rss_bytes": current_rss_bytes(),
+            "wall_s": now - self._started,
+            "updated": time.time(),
+            "final": final,
+        }
+        self._last_sample = now
+        self._last_events = events
+        with self._lock:
+            self.snapshot = snapshot
+        self._emit(snapshot)
+
+    def _emit(self, snapshot):
+        if callable(self.sink):
+            self.sink(dict(snapshot, **self.labels))
+        elif self.sink == "log":
+            label_text = " ".join(f"{k}={v}" for k, v in self.labels.items())
+            logger.info(
+                "%s%s t=%.1f requests=%d events/s=%.0f blocking=%.3f active=%d rss=%.1fMB",
+                f"{label_text} " if label_text else "", "done" if snapshot["final"] else "progress",
+                snapshot["sim_time"], snapshot["requests"], snapshot["events_per_s"], snapshot["blocking_rate"],
+                snapshot["active"], snapshot["rss_bytes"] / 2 ** 20,
+            )
+
+    def prometheus_text(self):
+        """The latest snapshot in the Prometheus text exposition format."""
+        with self._lock:
+            snapshot = dict(self.snapshot)
+        labels = dict(self.labels, pid=os.getpid())
+        label_text = ",".join(f'{k}="{str(v).replace(chr(34), "")}"' for k, v in sorted(labels.items()))
+        lines = []
+        for key, name, kind, help_text in METRICS:
+            if key not in snapshot:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{{{label_text}}} {float(snapshot[key])!r}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=0, host="127.0.0.1"):
+        """
+        Serve /metrics in the Prometheus text format from a daemon thread on localhost.
+
+        Parameters:
+        port (int): TCP port, 0 picks a free one.
+
+        Returns:
+        int: The port the endpoint listens on.
+        """
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # no per-scrape lines on stderr
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    def close(self):
+        """Stop the metrics endpoint, if any."""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+import reproducibility
+from result_cache import sim_version
+
+IN_TREE = [name for name in reproducibility.CONFIGURATIONS if reproducibility.in_tree(name)]
+NEEDS_SIM = [name for name in reproducibility.CONFIGURATIONS if not reproducibility.in_tree(name)]
+
+
+@pytest.fixture(scope="module")
+def golden():
+    if not os.path.exists(reproducibility.DEFAULT_GOLDEN_PATH):
+        pytest.fail(f"{reproducibility.DEFAULT_GOLDEN_PATH} is missing, write it with "
+                    f"`python reproducibility.py --update` and commit it")
+    return reproducibility.load_golden()
+
+
+@pytest.fixture
+def same_sim(golden):
+    """Skip unless sim is installed and is the module the golden outputs were produced with."""
+    pytest.importorskip("sim")
+    if golden["environment"].get("sim") != sim_version():
+        pytest.skip("golden outputs of the sim configurations come from another sim module, "
+                    "regenerate them with `python reproducibility.py --update`")
+
+
+def test_golden_covers_every_configuration(golden):
+    assert sorted(golden["outputs"]) == sorted(reproducibility.CONFIGURATIONS)
+
+
+def test_in_tree_configurations_match_golden(golden):
+    assert reproducibility.check_engine("reference", names=IN_TREE) == {}
+
+
+def test_reference_engine_matches_golden_on_a_pool(golden, same_sim):
+    assert reproducibility.check_engine("reference", processes=2, names=NEEDS_SIM) == {}
+
+
+def test_array_engine_matches_golden(golden, same_sim):
+    assert reproducibility.check_engine("array", names=NEEDS_SIM) == {}
+
+
+def test_compare_reports_mismatches(golden):
+    expected = golden["outputs"]["scale-20x20"]
+    changed = dict(expected, successful_requests=expected["successful_requests"] + 1)
+    assert reproducibility.compare(expected, changed)
+    assert not reproducibility.compare(expected, expected, tolerance="statistical")
@@ -0,0 +1,86 @@
+import os
+import time
+
+from sweep_queue import FileJobQueue, jobs_from_grid, merge_results, run_worker
+
+
+def fake_simulate(collect_stats, max_requests, **params):
+    """Stands in for dynamic_simulation: the first half of the requests succeed."""
+    return max_requests, max_requests // 2
+
+
+def failing_simulate(**params):
+    raise RuntimeError("simulation failed")
+
+
+def submit(root, max_attempts=None):
+    queue = FileJobQueue(str(root), max_attempts=max_attempts)
+    for params in jobs_from_grid({"max_requests": [10, 20, 30]}, {"graph_size": [3, 3]}):
+        queue.submit(params)
+    return queue
+
+
+def test_worker_runs_every_job_and_merge_keys_them(tmp_path):
+    queue = submit(tmp_path / "queue")
+    assert run_worker(queue.root, "w", fake_simulate) == 3
+    assert queue.status() == {"pending": 0, "running": 0, "done": 3, "failed": 0}
+
+    store = str(tmp_path / "store.json")
+    merge_results(queue.root, store)
+    records = merge_results(queue.root, store)
+    assert sorted(r["max_requests"] for r in records) == [10, 20, 30]
+    assert all(r["blocking_rate"] == 0.5 and r["graph_size"] == [3, 3] for r in records)
+
+
+def test_failing_jobs_end_in_failed_after_max_attempts(tmp_path):
+    queue = submit(tmp_path / "queue", max_attempts=2)
+    assert run_worker(queue.root, "w", failing_simulate) == 0
+    assert queue.status() == {"pending": 0, "running": 0, "done": 0, "failed": 3}
+    assert queue.retry_failed() == 3
+
+
+def test_heartbeat_keeps_a_long_job_from_being_requeued(tmp_path):
+    queue = submit(tmp_path / "queue")
+    requeued = []
+
+    def slow_simulate(**params):
+        time.sleep(0.5)
+        requeued.append(queue.requeue_stale(timeout=0.3))
+        return fake_simulate(**params)
+
+    assert run_worker(queue.root, "w", slow_simulate, max_jobs=1, heartbeat=0.05) == 1
+    assert requeued == [0]
+
+
+def test_complete_and_fail_tolerate_a_job_claimed_again(tmp_path):
+    queue = submit(tmp_path / "queue")
+    job = queue.claim("dead")
+    running = queue._path("running", job["id"])
+    os.utime(running, (0, 0))
+    assert queue.requeue_stale(timeout=60) == 1
+
+    # requeued but not claimed yet: the late result still completes the job
+    assert queue.complete(job, {"job_id": job["id"]})
+    assert not os.path.exists(queue._path("pending", job["id"]))
+
+    job = queue.claim("dead")
+    os.utime(queue._path("running", job["id"]), (0, 0))
+    queue.requeue_stale(timeout=60)
+    again = queue.claim("alive")
+    assert again["id"] == job["id"]
+    queue.fail(job, "late failure")
+    assert not queue.complete(job, {"job_id": job["id"]})
+    assert queue.owns(again) and queue.complete(again, {"job_id": again["id"]})
+
+
+def test_worker_survives_its_job_being_requeued(tmp_path):
+    queue = submit(tmp_path / "queue")
+
+    def requeued_simulate(**params):
+        for name in os.listdir(os.path.join(queue.root, "running")):
+            os.utime(os.path.join(queue.root, "running", name), (0, 0))
+        queue.requeue_stale(timeout=60)
+        return fake_simulate(**params)
+
+    assert run_worker(queue.root, "w", requeued_simulate, max_jobs=3) == 3
+    assert queue.status()["done"] == 3
@@ -0,0 +1,75 @@
+from collections import deque
+
+from routing import edge_key
+
+
+class TraceRecorder:
+    """
+    Memory-bounded recorder of per-timestep link-state deltas for the repetitions run by _run_protocol.
+
+    While a repetition runs, only the link changes of each timestep are recorded, into a ring buffer of fixed
+    `capacity` (older entries are overwritten). When the repetition ends, its trace is kept only if the
+    GHZ generation time exceeded `latency_threshold` timesteps (or it failed), and at most `max_retained`
+    such traces are kept (oldest dropped). Memory use is therefore bounded by capacity * max_retained deltas
+    regardless of the number of requests simulated.
+
+    Parameters:
+    capacity (int): Number of deltas kept for the repetition in progress.
+    latency_threshold (int): Generation time (timesteps) above which a trace is retained.
+    max_retained (int): Maximum number of slow-request traces kept.
+    """
+
+    def __init__(self, capacity=1000, latency_threshold=100, max_retained=100):
+        self.capacity = capacity
+        self.latency_threshold = latency_threshold
+        self.buffer = deque(maxlen=capacity)
+        self.retained = deque(maxlen=max_retained)
+        self.requests_seen = 0
+        self._previous = frozenset()
+        self._recorded = 0
+        self._users = None
+
+    def start(self, users):
+        """Begin the trace of a new repetition for `users` (users[0] is the centre)."""
+        self.buffer.clear()
+        self._previous = frozenset()
+        self._recorded = 0
+        self._users = list(users)
+
+    def record(self, t, phase, edges):
+        """
+        Record the change of the entangled link set at timestep t.
+
+        Parameters:
+        t (int): Current timestep.
+        phase (str): "generate" after link generation, "swap" after entanglement swapping consumed links.
+        edges (iterable): Edges (u, v) currently holding an entangled link.
+        """
+        current = frozenset(edge_key(u, v) for u, v in edges)
+        if current == self._previous:
+            return
+        self.buffer.append((t, phase, tuple(current - self._previous), tuple(self._previous - current)))
+        self._previous = current
+        self._recorded += 1
+
+    def finish(self, gen_time):
+        """
+        End the current repetition, retaining its trace if it was slow.
+
+        Parameters:
+        gen_time (float): Timesteps until successful GHZ generation, -1 if the protocol timed out.
+
+        Returns:
+        bool: True if the trace was retained.
+        """
+        self.requests_seen += 1
+        slow = gen_time == -1 or gen_time > self.latency_threshold
+        if slow:
+            self.retained.append({
+                "users": self._users,
+                "gen_time": gen_time,
+                "events": list(self.buffer),  # (t, phase, added_edges, removed_edges)
+                "dropped": self._recorded - len(self.buffer),  # deltas overwritten in the ring buffer
+            })
+        self.buffer.clear()
+        return slow
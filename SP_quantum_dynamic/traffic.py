@@ -0,0 +1,240 @@
+import abc
+import math
+
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+DEFAULT_BLOCK = 4096  # arrivals / requests generated per vectorised block
+
+
+def _default_rng(rng):
+    # derive the generator from the global NumPy state, so Initialisation.seed_rngs() pins it as well
+    return rng if rng is not None else np.random.default_rng(np.random.randint(2 ** 31))
+
+
+class ArrivalProcess(abc.ABC):
+    """
+    Base class of the arrival processes used by dynamic_simulation.
+
+    Subclasses implement _generate_block(), returning the next block of absolute arrival times as a NumPy array.
+    next_arrival() hands them out one at a time from a pre-converted list, so the per-request path does no
+    sampling and no array allocation; a new block is generated only when the current one is used up.
+    """
+
+    def __init__(self, rng=None, block_size=DEFAULT_BLOCK):
+        self.rng = _default_rng(rng)
+        self.block_size = block_size
+        self.t = 0.0  # time of the last generated arrival
+        self._block = []
+        self._index = 0
+
+    @abc.abstractmethod
+    def _generate_block(self):
+        """Return the next block of absolute arrival times (an empty array once the process is exhausted)."""
+
+    def next_arrival(self):
+        """Return the absolute time of the next arrival (float('inf') once a finite process is exhausted)."""
+        if self._index >= len(self._block):
+            block = self._generate_block()
+            if len(block) == 0:
+                return float("inf")
+            self.t = float(block[-1])
+            self._block = block.tolist()
+            self._index = 0
+        arrival = self._block[self._index]
+        self._index += 1
+        return arrival
+
+
+class PoissonArrivals(ArrivalProcess):
+    """Homogeneous Poisson arrivals with exponential interarrival times of mean `mean_interarrival`."""
+
+    def __init__(self, mean_interarrival, rng=None, block_size=DEFAULT_BLOCK):
+        super().__init__(rng, block_size)
+        self.mean_interarrival = mean_interarrival
+
+    def _generate_block(self):
+        return self.t + np.cumsum(self.rng.exponential(self.mean_interarrival, self.block_size))
+
+
+class NHPPArrivals(ArrivalProcess):
+    """
+    Non-homogeneous Poisson arrivals with intensity rate_fn(t), sampled by thinning (Lewis-Shedler).
+
+    Candidates are drawn in blocks from a homogeneous process of rate `rate_max` and each is kept with
+    probability rate_fn(t) / rate_max, evaluated for the whole block at once.
+
+    Parameters:
+    rate_fn (callable): Vectorised intensity, maps an array of times to an array of rates.
+    rate_max (float): Upper bound of rate_fn over the simulated horizon.
+    """
+
+    def __init__(self, rate_fn, rate_max, rng=None, block_size=DEFAULT_BLOCK):
+        super().__init__(rng, block_size)
+        self.rate_fn = rate_fn
+        self.rate_max = rate_max
+        self._cursor = 0.0  # last candidate time, later rejected candidates must not be redrawn
+
+    def _generate_block(self):
+        accepted = []
+        count = 0
+        t = self._cursor
+        while count < self.block_size:
+            candidates = t + np.cumsum(self.rng.exponential(1.0 / self.rate_max, self.block_size))
+            keep = self.rng.random(self.block_size) * self.rate_max < self.rate_fn(candidates)
+            accepted.append(candidates[keep])
+            count += int(keep.sum())
+            t = candidates[-1]
+        self._cursor = t
+        return np.concatenate(accepted)
+
+
+def diurnal_rate(mean_rate, amplitude=0.5, period=24.0, phase=0.0):
+    """
+    Sinusoidal (day/night) intensity for NHPPArrivals.
+
+    Returns:
+    tuple: (rate_fn, rate_max) with rate_fn(t) = mean_rate * (1 + amplitude * sin(2*pi*(t - phase)/period)).
+    """
+    def rate_fn(t):
+        return mean_rate * (1 + amplitude * np.sin(2 * math.pi * (t - phase) / period))
+    return rate_fn, mean_rate * (1 + abs(amplitude))
+
+
+class MMPPArrivals(ArrivalProcess):
+    """
+    Markov-modulated Poisson process: a hidden continuous-time Markov chain switches between states,
+    and arrivals occur at rate rates[state] while the chain is in that state (e.g. a quiet and a burst state).
+
+    Parameters:
+    rates (list): Arrival rate in each state.
+    mean_sojourn (list): Mean time spent in each state before switching.
+    transitions (list): Row-stochastic matrix of next-state probabilities (default: cycle to the next state).
+    """
+
+    def __init__(self, rates, mean_sojourn, transitions=None, rng=None, block_size=DEFAULT_BLOCK):
+        super().__init__(rng, block_size)
+        self.rates = np.asarray(rates, dtype=float)
+        self.mean_sojourn = np.asarray(mean_sojourn, dtype=float)
+        n = len(rates)
+        if transitions is None:
+            transitions = np.roll(np.eye(n), 1, axis=1)
+        self.transitions = np.asarray(transitions, dtype=float)
+        self.state = 0
+        self.state_end = self.rng.exponential(self.mean_sojourn[0])
+        self._cursor = 0.0  # time up to which the modulating chain and arrivals have been generated
+
+    def _generate_block(self):
+        arrivals = []
+        count = 0
+        t = self._cursor
+        while count < self.block_size:
+            rate = self.rates[self.state]
+            if rate > 0:
+                # arrivals of this sojourn, drawn as a vector and cut at the state change
+                expected = max(1, int(rate * (self.state_end - t) * 1.2) + 10)
+                times = t + np.cumsum(self.rng.exponential(1.0 / rate, min(expected, self.block_size)))
+                inside = times[times < self.state_end]
+                arrivals.append(inside)
+                count += len(inside)
+                if len(inside) == len(times):  # sojourn not finished yet, continue from the last arrival
+                    t = times[-1]
+                    continue
+            t = self.state_end
+            self.state = self.rng.choice(len(self.rates), p=self.transitions[self.state])
+            self.state_end = t + self.rng.exponential(self.mean_sojourn[self.state])
+        self._cursor = t
+        return np.concatenate(arrivals) if arrivals else np.empty(0)
+
+
+class TraceArrivals(ArrivalProcess):
+    """
+    Replays arrival timestamps recorded in a text file (first column, one arrival per line).
+
+    Parameters:
+    path (str): File of timestamps (CSV or whitespace separated; further columns are ignored).
+    loop (bool): Restart from the beginning, shifted by the trace duration, when the trace ends.
+    """
+
+    def __init__(self, path, loop=False, block_size=DEFAULT_BLOCK):
+        super().__init__(np.random.default_rng(0), block_size)
+        times = np.loadtxt(path, delimiter="," if path.endswith(".csv") else None, usecols=0, ndmin=1)
+        times = np.sort(times)
+        self.times = times - times[0]
+        self.loop = loop
+        self._offset = 0.0
+        self._position = 0
+
+    def _generate_block(self):
+        if self._position >= len(self.times):
+            if not self.loop or len(self.times) < 2:
+                return np.empty(0)
+            self._offset += self.times[-1] + (self.times[-1] - self.times[0]) / (len(self.times) - 1)
+            self._position = 0
+        block = self.times[self._position:self._position + self.block_size] + self._offset
+        self._position += len(block)
+        return block
+
+
+class UserSelector:
+    """
+    Weighted selection of request users, sampled in vectorised blocks.
+
+    Each request gets min_users..max_users distinct users (uniformly many), drawn without replacement with
+    probability proportional to the node weights (Gumbel-top-k trick on a whole block of requests at once).
+    users[0] is the star centre, as expected by SP_protocol.
+
+    Parameters:
+    weights (dict or callable): Node -> weight (e.g. hotspot nodes with a larger weight); None for uniform.
+    min_users (int), max_users (int): Range of the number of users per request.
+    """
+
+    def __init__(self, weights=None, min_users=3, max_users=4, rng=None, block_size=DEFAULT_BLOCK):
+        self.weights = weights
+        self.min_users = min_users
+        self.max_users = max_users
+        self.rng = _default_rng(rng)
+        self.block_size = block_size
+        self.nodes = None
+        self._block = []
+        self._index = 0
+
+    def bind(self, nodes):
+        """Fix the node list (called by dynamic_simulation with the nodes of its graph)."""
+        self.nodes = list(nodes)
+        if self.weights is None:
+            w = np.ones(len(self.nodes))
+        elif callable(self.weights):
+            w = np.array([self.weights(node) for node in self.nodes], dtype=float)
+        else:
+            w = np.array([self.weights.get(node, 0.0) for node in self.nodes], dtype=float)
+        if (w > 0).sum() < self.max_users:
+            raise ValueError("Need at least max_users nodes with a positive weight")
+        with np.errstate(divide="ignore"):
+            self._log_w = np.log(w)
+        # bound the (block x nodes) key matrix of the Gumbel-top-k draw
+        self._rows = max(1, min(self.block_size, 2_000_000 // max(1, len(self.nodes))))
+        self._block = []
+        self._index = 0
+
+    def _generate_block(self):
+        rows = self._rows
+        keys = self._log_w + self.rng.gumbel(size=(rows, len(self.nodes)))
+        top = np.argpartition(-keys, self.max_users - 1, axis=1)[:, :self.max_users]
+        order = np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1)  # random (weighted) order of the users
+        top = np.take_along_axis(top, order, axis=1)
+        k = self.rng.integers(self.min_users, self.max_users + 1, size=rows)
+        nodes = self.nodes
+        return [[nodes[i] for i in row[:n]] for row, n in zip(top.tolist(), k.tolist())]
+
+    def next_users(self):
+        """Return the users of the next request."""
+        if self.nodes is None:
+            raise RuntimeError("UserSelector.bind(nodes) must be called before sampling")
+        if self._index >= len(self._block):
+            self._block = self._generate_block()
+            self._index = 0
+        users = self._block[self._index]
+        self._index += 1
+        return users